@@ -1,14 +1,40 @@
+import time
+_PROCESS_START = time.perf_counter()
+
 import gradio as gr
+import uvicorn
+from fastapi import FastAPI, Request, WebSocket, WebSocketDisconnect
+from fastapi.responses import JSONResponse, PlainTextResponse
+from starlette.concurrency import run_in_threadpool
 import os
-import cv2
 import numpy as np
-import requests
-from PIL import Image
-import io
 from deepface import DeepFace
-from concurrent.futures import ThreadPoolExecutor, as_completed
-from functools import lru_cache
+import contextvars
 import hashlib
+import hmac
+import json
+import uuid
+from gallery_store import GalleryStore
+from matching import MatchingEngine, PrefilterConfig, assign_members, match_members, match_members_batch
+from face_pipeline import (detect_align_embed, detect_faces, embed_face, embed_faces, forward_batch,
+                           get_embedder, set_detector, set_embedder)
+from detector_cascade import DetectorCascade
+from embedders import create_embedder
+from batching import MicroBatcher
+from enrollment import Enroller, EnrollmentWorker
+from http_client import AsyncHTTP
+from roster_cache import InvalidationLog, RosterCache
+from executors import AdmissionController, Overloaded, create_executors
+from image_decode import DecodeCounters, decode_image_reduced
+from quality_gate import QualityGate, QualityThresholds
+from streaming import StreamSessionManager
+from result_cache import ResultCache, perceptual_hash
+from metrics import REGISTRY, Counter, bind_context, collect_timings, observe_stage, process_memory, stage
+import tracing
+from tracing import TRACER, current_span, span
+from profiler import SamplingProfiler
+from model_artifacts import StartupTimings, install_local_weights
+_IMPORTS_DONE = time.perf_counter()
 
 # --- 1. CONFIGURATION ---
 SUPABASE_URL = os.environ.get("SUPABASE_URL")
@@ -16,228 +42,500 @@ SUPABASE_KEY = os.environ.get("SUPABASE_KEY")
 
 # --- 2. MODELS ---
 MODEL_NAME = "Facenet512"
-DETECTOR = "opencv"
+DETECTOR = os.environ.get("DETECTOR", "cascade")  # "cascade" = fast proxy detector, DeepFace backend on failure
+HEAVY_DETECTOR = os.environ.get("HEAVY_DETECTOR", "opencv")  # DeepFace backend for the cascade's slow path (e.g. mtcnn)
 METRIC = "cosine"
 THRESHOLD = 0.40
+MIN_FACE_CONFIDENCE = 0.85
 
 # Performance settings
-MAX_WORKERS = 4  # Parallel verification threads
-EMBEDDING_CACHE_SIZE = 128  # Cache embeddings for frequently used photos
+EMBED_BATCH_SIZE = int(os.environ.get("EMBED_BATCH_SIZE", "8"))  # Max crops per forward pass
+EMBED_BATCH_WAIT_MS = float(os.environ.get("EMBED_BATCH_WAIT_MS", "5"))  # Max wait to fill a batch
+GALLERY_DIR = os.environ.get("GALLERY_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), "gallery_data"))
+GALLERY_QUANTIZATION = os.environ.get("GALLERY_QUANTIZATION", "float16")  # float32 | float16 | int8 (per-vector scale)
+GALLERY_KEEP_EXACT = os.environ.get("GALLERY_KEEP_EXACT", "1") == "1"  # Keep a float32 copy on disk for re-ranking
+RERANK_TOP_K = int(os.environ.get("RERANK_TOP_K", "4"))  # Members re-scored in float32 after quantized matching (0 = off)
+MODEL_ARTIFACT_DIR = os.environ.get("MODEL_ARTIFACT_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), "artifacts"))
+EMBEDDER_BACKEND = os.environ.get("EMBEDDER_BACKEND", "keras")  # keras | tflite | onnx (model file in MODEL_ARTIFACT_DIR)
+EMBEDDER_THREADS = int(os.environ.get("EMBEDDER_THREADS", str(min(4, os.cpu_count() or 1))))  # tflite/onnx intra-op threads
+CASCADE_FAST = os.environ.get("CASCADE_FAST", "yunet")  # yunet (needs model file) | haar
+CASCADE_PROXY_SIDE = int(os.environ.get("CASCADE_PROXY_SIDE", "320"))  # Long side of the fast detector's proxy
+CASCADE_MIN_CONFIDENCE = float(os.environ.get("CASCADE_MIN_CONFIDENCE", str(MIN_FACE_CONFIDENCE)))  # Below this the heavy detector runs
+YUNET_MODEL = os.environ.get("YUNET_MODEL", os.path.join(MODEL_ARTIFACT_DIR, "face_detection_yunet_2023mar.onnx"))
+IO_WORKERS = int(os.environ.get("IO_WORKERS", "8"))  # Shared pool for blocking I/O
+CPU_WORKERS = int(os.environ.get("CPU_WORKERS", str(min(4, os.cpu_count() or 1))))  # Shared pool for decode + embed
+MAX_IN_FLIGHT = int(os.environ.get("MAX_IN_FLIGHT", "4"))  # Recognitions running at once
+MAX_QUEUED = int(os.environ.get("MAX_QUEUED", "16"))  # Recognitions waiting for a slot
+QUEUE_TIMEOUT = float(os.environ.get("QUEUE_TIMEOUT", "10"))  # Seconds a queued recognition may wait
+HTTP_MAX_CONNECTIONS = int(os.environ.get("HTTP_MAX_CONNECTIONS", "32"))  # Pooled keep-alive connections
+HTTP_PER_HOST_LIMIT = int(os.environ.get("HTTP_PER_HOST_LIMIT", "8"))  # Concurrent requests per host
+HTTP_TIMEOUT = 5.0
+DECODE_MAX_SIDE = int(os.environ.get("DECODE_MAX_SIDE", "640"))  # ~2x detector working size; 0 = full resolution
+QUALITY_MIN_BLUR = float(os.environ.get("QUALITY_MIN_BLUR", "40"))  # Laplacian variance on the 160px proxy
+QUALITY_MIN_BRIGHTNESS = float(os.environ.get("QUALITY_MIN_BRIGHTNESS", "30"))
+QUALITY_MAX_BRIGHTNESS = float(os.environ.get("QUALITY_MAX_BRIGHTNESS", "225"))
+PREFILTER_TOP_K = int(os.environ.get("PREFILTER_TOP_K", "8"))  # Members scored photo-by-photo after the centroid stage (0 = off)
+PREFILTER_MIN_MEMBERS = int(os.environ.get("PREFILTER_MIN_MEMBERS", "16"))  # Smaller rosters are always searched exhaustively
+PREFILTER_FALLBACK_DISTANCE = float(os.environ.get("PREFILTER_FALLBACK_DISTANCE", "0.7"))  # No centroid this close -> exhaustive
+STREAM_IDLE_SECONDS = float(os.environ.get("STREAM_IDLE_SECONDS", "30"))  # Drop stream sessions after this much silence
+STREAM_EMBEDDING_TTL = float(os.environ.get("STREAM_EMBEDDING_TTL", "5"))  # Re-embed a tracked face after this many seconds
+STREAM_DETECT_EVERY = int(os.environ.get("STREAM_DETECT_EVERY", "1"))  # Run the detector on every Nth frame
+RESULT_CACHE_TTL = float(os.environ.get("RESULT_CACHE_TTL", "30"))  # Seconds a result answers near-identical re-scans (0 = off)
+RESULT_CACHE_MAX_DISTANCE = int(os.environ.get("RESULT_CACHE_MAX_DISTANCE", "2"))  # dHash bits that may differ (of 64); more risks another person's result
+RESPONSE_TIMINGS = os.environ.get("RESPONSE_TIMINGS", "0") == "1"  # Attach timings_ms to every response (HTTP: ?timing=1)
+TRACE_SAMPLE_RATE = float(os.environ.get("TRACE_SAMPLE_RATE", "0"))  # Fraction of requests traced (0 = off, ~free)
+TRACE_EXPORT = os.environ.get("TRACE_EXPORT", "jsonl:" + os.path.join(os.path.dirname(os.path.abspath(__file__)), "traces", "spans.jsonl"))  # jsonl:<path> | otlp:<url>
+PROFILE_INTERVAL_MS = float(os.environ.get("PROFILE_INTERVAL_MS", "0"))  # Stack sampling period (0 = profiler off; start via /admin)
+PROFILE_SLOW_MS = float(os.environ.get("PROFILE_SLOW_MS", "2000"))  # Slower recognitions are tagged and keep their samples
+ADMIN_TOKEN = os.environ.get("ADMIN_TOKEN", "")  # Bearer token for /admin/*, /v1/enroll, /v1/invalidate; unset = those disabled
+ROSTER_TTL_SECONDS = float(os.environ.get("ROSTER_TTL_SECONDS", "300"))  # Family rosters change rarely
+ROSTER_COLUMNS = "id,name,relationship,photoUrls,updatedAt"
+ENROLLMENT_POLL_SECONDS = float(os.environ.get("ENROLLMENT_POLL_SECONDS", "60"))  # 0 disables polling
+ENROLLMENT_BATCH_LIMIT = 200  # Rows per watermark poll
+
+# Detector: cascade registered under DETECTOR so every detect_faces call goes through it
+CASCADE = DetectorCascade(
+    heavy_fn=lambda image: detect_faces(image, HEAVY_DETECTOR),
+    fast=CASCADE_FAST,
+    yunet_model_path=YUNET_MODEL,
+    proxy_side=CASCADE_PROXY_SIDE,
+    min_confidence=CASCADE_MIN_CONFIDENCE
+)
+if DETECTOR == "cascade":
+    set_detector(DETECTOR, CASCADE)
 
-# Warmup 
+# Warmup: verified local weights -> build -> trace -> first inference -> detector
+STARTUP = StartupTimings(started_at=_PROCESS_START)
+STARTUP.record("imports", _IMPORTS_DONE - _PROCESS_START)
 try:
     print(f"⏳ Warming up {MODEL_NAME}...")
-    DeepFace.build_model(MODEL_NAME)
-    print(f"✅ {MODEL_NAME} Loaded Successfully")
+    STARTUP.notes["embedder_backend"] = EMBEDDER_BACKEND
+    if EMBEDDER_BACKEND == "keras":
+        with STARTUP.phase("verify_artifacts"):
+            STARTUP.notes["weights_source"] = install_local_weights(MODEL_ARTIFACT_DIR, MODEL_NAME)
+        with STARTUP.phase("weights"):
+            DeepFace.build_model(MODEL_NAME)
+    with STARTUP.phase("trace"):
+        try:
+            set_embedder(create_embedder(EMBEDDER_BACKEND, MODEL_NAME, MODEL_ARTIFACT_DIR, EMBEDDER_THREADS))
+        except (ImportError, OSError, ValueError) as e:
+            print(f"⚠️ {EMBEDDER_BACKEND} embedder unavailable ({e}); falling back to keras")
+            STARTUP.notes["embedder_backend"] = "keras"
+            STARTUP.notes["weights_source"] = install_local_weights(MODEL_ARTIFACT_DIR, MODEL_NAME)
+            set_embedder(create_embedder("keras", MODEL_NAME))
+    with STARTUP.phase("first_inference"):
+        input_shape = get_embedder(MODEL_NAME).input_shape
+        dummy = np.zeros((input_shape[1], input_shape[0], 3), dtype=np.float32)
+        forward_batch([dummy], MODEL_NAME)
+    with STARTUP.phase("detector"):
+        detect_faces(np.zeros((160, 160, 3), dtype=np.uint8), DETECTOR, enforce_detection=False)
+    print(f"✅ {MODEL_NAME} Loaded Successfully ({STARTUP.notes['embedder_backend']} backend, "
+          f"phases ms: {STARTUP.phases})")
 except Exception as e:
     print(f"⚠️ Model Warmup Warning: {e}")
 
-# --- 3. EMBEDDING CACHE ---
-# Cache database photo embeddings to avoid reprocessing same images
-
-@lru_cache(maxsize=EMBEDDING_CACHE_SIZE)
-def get_cached_embedding(photo_url_hash):
-    """Cached wrapper - actual computation happens in compute_embedding"""
-    # This is just for LRU mechanism, actual work in compute_embedding
-    return None
+# --- 3. EMBEDDING ---
+# Photo embeddings persist in the gallery store; this computes one when it is missing
 
 def compute_embedding(image_array):
-    """Extract embedding from image (core computation)"""
+    """Extract embedding from image (core computation, on the configured embedder backend)"""
     try:
-        embedding_objs = DeepFace.represent(
-            img_path=image_array,
-            model_name=MODEL_NAME,
-            detector_backend=DETECTOR,
-            enforce_detection=False,
-            align=True
-        )
-        if embedding_objs and len(embedding_objs) > 0:
-            return np.array(embedding_objs[0]['embedding'])
+        # Like DeepFace.represent(enforce_detection=False): falls back to the whole image
+        faces = detect_faces(image_array, DETECTOR, enforce_detection=False)
+        if faces:
+            return embed_face(faces[0], MODEL_NAME).embedding
         return None
     except Exception as e:
         print(f"Embedding extraction error: {e}")
         return None
 
-# Global cache for embeddings
-_embedding_cache = {}
+# Process-wide pools, created once; requests never spawn their own threads
+IO_EXECUTOR, CPU_EXECUTOR = create_executors(IO_WORKERS, CPU_WORKERS)
+ADMISSION = AdmissionController(MAX_IN_FLIGHT, MAX_QUEUED, QUEUE_TIMEOUT)
 
-def get_or_compute_embedding(photo_url, image_array):
-    """Get embedding from cache or compute if not cached"""
-    # Create hash of URL for cache key
-    url_hash = hashlib.md5(photo_url.encode()).hexdigest()
-    
-    if url_hash in _embedding_cache:
-        return _embedding_cache[url_hash]
+# Shared keep-alive connection pool for Supabase REST + storage
+HTTP = AsyncHTTP(
+    max_connections=HTTP_MAX_CONNECTIONS,
+    per_host_limit=HTTP_PER_HOST_LIMIT,
+    timeout=HTTP_TIMEOUT,
+    executor=IO_EXECUTOR
+)
+
+# Persistent gallery: one memory-mapped float32 matrix per patient, shared by all workers
+GALLERY = GalleryStore(GALLERY_DIR, quantization=GALLERY_QUANTIZATION, keep_exact=GALLERY_KEEP_EXACT)
+MATCHER = MatchingEngine()
+PREFILTER = PrefilterConfig(
+    top_k=PREFILTER_TOP_K,
+    min_members=PREFILTER_MIN_MEMBERS,
+    fallback_distance=PREFILTER_FALLBACK_DISTANCE
+)
+DECODE_COUNTERS = DecodeCounters()
+tracing.configure(TRACE_SAMPLE_RATE, TRACE_EXPORT)
+PROFILER = SamplingProfiler(interval_s=(PROFILE_INTERVAL_MS or 10) / 1000.0, slow_threshold_s=PROFILE_SLOW_MS / 1000.0)
+if PROFILE_INTERVAL_MS > 0:
+    PROFILER.start()
+RESULTS = ResultCache(ttl_seconds=RESULT_CACHE_TTL, max_distance=RESULT_CACHE_MAX_DISTANCE)
+RECOGNITIONS = REGISTRY.counter("memora_recognitions", "Recognition outcomes by mode and error_type",
+                                ["mode", "error_type", "cached"])
+SLOW_RECOGNITIONS = REGISTRY.counter("memora_slow_recognitions", "Recognitions slower than PROFILE_SLOW_MS", ["mode"])
+DOWNLOAD_BYTES = REGISTRY.counter("memora_download_bytes", "Bytes downloaded from Supabase storage", ["kind"])
+# Caches without their own counters; exported together with the others by cache_metrics()
+CACHE_EVENTS = Counter("memora_cache_lookups", "Cache lookups by cache and outcome", ["cache", "outcome"])
+STREAMS = StreamSessionManager(
+    idle_timeout=STREAM_IDLE_SECONDS,
+    embedding_ttl=STREAM_EMBEDDING_TTL,
+    detect_every=STREAM_DETECT_EVERY
+)
+QUALITY_GATE = QualityGate(QualityThresholds(
+    min_blur=QUALITY_MIN_BLUR,
+    min_brightness=QUALITY_MIN_BRIGHTNESS,
+    max_brightness=QUALITY_MAX_BRIGHTNESS
+))
+ROSTER = RosterCache(lambda patient_id: fetch_roster(patient_id), ttl_seconds=ROSTER_TTL_SECONDS)
+
+# Query crops from concurrent requests share one Facenet512 forward pass
+EMBED_BATCHER = MicroBatcher(
+    lambda crops: forward_batch(crops, MODEL_NAME),
+    max_batch_size=EMBED_BATCH_SIZE,
+    max_wait_ms=EMBED_BATCH_WAIT_MS,
+    name="facenet512"
+)
+
+def content_hash(data):
+    """Hash of the downloaded photo bytes, recorded next to each gallery row"""
+    return hashlib.md5(data).hexdigest()
+
+def get_or_compute_embedding(photo_url, image_array, patient_id=None, member_id=None, pending=None,
+                             raw=None, etag=None):
+    """Get embedding from the gallery store or compute it if not enrolled yet"""
+    if patient_id:
+        stored = GALLERY.lookup(patient_id, photo_url, MODEL_NAME)
+        CACHE_EVENTS.inc(cache="gallery_embedding", outcome="hit" if stored is not None else "miss")
+        current_span().set_attribute("cache", "hit" if stored is not None else "miss")
+        if stored is not None:
+            return stored
     
     # Compute new embedding
     embedding = compute_embedding(image_array)
     
-    # Store in cache if successful
-    if embedding is not None:
-        _embedding_cache[url_hash] = embedding
-        
-        # Limit cache size (keep most recent)
-        if len(_embedding_cache) > EMBEDDING_CACHE_SIZE:
-            # Remove oldest item
-            oldest_key = next(iter(_embedding_cache))
-            del _embedding_cache[oldest_key]
+    # Queue for the gallery; callers flush once per request with GALLERY.put_many
+    if embedding is not None and patient_id and pending is not None:
+        pending.append({
+            "member_id": member_id,
+            "photo_url": photo_url,
+            "content_hash": content_hash(raw if raw is not None else np.ascontiguousarray(image_array)),
+            "etag": etag,
+            "model": MODEL_NAME,
+            "embedding": embedding,
+        })
     
     return embedding
 
 # --- 4. HELPER FUNCTIONS ---
 
+QUALITY_SUGGESTIONS = {
+    "too_small": "Please move closer so the face fills more of the frame",
+    "too_blurry": "Hold the camera steady and make sure the face is in focus",
+    "too_dark": "Please use better lighting",
+    "too_bright": "Please avoid strong backlight or direct glare",
+}
+
 def check_image_quality(image_array):
-    """Check if image has sufficient quality (optimized version)"""
-    if isinstance(image_array, np.ndarray):
-        img = image_array
-    else:
-        img = np.array(image_array)
-    
-    height, width = img.shape[:2]
-    
-    if width < 100 or height < 100:
-        return False, "Image too small (min 100x100)"
-    
-    # Fast quality checks
-    gray = cv2.cvtColor(img, cv2.COLOR_RGB2GRAY)
-    
-    # Blur check (Laplacian variance)
-    blur_score = cv2.Laplacian(gray, cv2.CV_64F).var()
-    if blur_score < 100:
-        return False, f"Image too blurry (score: {blur_score:.1f})"
-    
-    # Brightness check
-    brightness = np.mean(gray)
-    if brightness < 30 or brightness > 225:
-        return False, f"Poor lighting (brightness: {brightness:.1f})"
-    
-    return True, "OK"
+    """Check if image has sufficient quality (sub-millisecond proxy gate) -> (ok, reason, metrics)"""
+    with stage("quality_gate"):
+        return QUALITY_GATE.check(image_array)
+
+def supabase_headers():
+    """Auth headers for Supabase REST"""
+    return {
+        "apikey": SUPABASE_KEY,
+        "Authorization": f"Bearer {SUPABASE_KEY}",
+        "Content-Type": "application/json"
+    }
+
+def fetch_roster(patient_id):
+    """Fetch the roster columns the matcher needs (raises on failure so the cache can serve stale)"""
+    url = f"{SUPABASE_URL}/rest/v1/FamilyMember"
+    params = {"select": ROSTER_COLUMNS, "patientId": f"eq.{patient_id}"}
+    current_span().set_attribute("cache", "miss")  # the enclosing "roster" span
+    with stage("roster_fetch"):
+        rows = HTTP.get_json(url, headers=supabase_headers(), params=params)
+    if rows is None:
+        raise IOError(f"Roster fetch failed for patient {patient_id}")
+    return rows
 
 def fetch_family_members(patient_id):
-    """Fetch family members from Supabase"""
+    """Fetch family members from Supabase (TTL cached, single-flight)"""
     if not SUPABASE_URL or not SUPABASE_KEY:
         print("❌ Supabase credentials missing")
         return []
 
-    headers = {
-        "apikey": SUPABASE_KEY,
-        "Authorization": f"Bearer {SUPABASE_KEY}",
-        "Content-Type": "application/json"
-    }
+    try:
+        with span("roster", cache="hit"):
+            return ROSTER.get(patient_id)
+    except Exception as e:
+        print(f"Fetch Error: {e}")
+        return []
+
+def fetch_family_member(member_id):
+    """Fetch a single family member by id"""
+    if not SUPABASE_URL or not SUPABASE_KEY:
+        print("❌ Supabase credentials missing")
+        return None
 
     try:
-        url = f"{SUPABASE_URL}/rest/v1/FamilyMember?select=*&patientId=eq.{patient_id}"
-        response = requests.get(url, headers=headers, timeout=5)
-        if response.status_code == 200:
-            return response.json()
+        url = f"{SUPABASE_URL}/rest/v1/FamilyMember?select=*&id=eq.{member_id}"
+        rows = HTTP.get_json(url, headers=supabase_headers())
+        return rows[0] if rows else None
+    except Exception as e:
+        print(f"Fetch Error: {e}")
+        return None
+
+def fetch_updated_family_members(since):
+    """Fetch family members updated after the enrollment watermark (oldest first)"""
+    if not SUPABASE_URL or not SUPABASE_KEY:
         return []
+
+    params = {"select": "*", "order": "updatedAt.asc", "limit": str(ENROLLMENT_BATCH_LIMIT)}
+    if since:
+        params["updatedAt"] = f"gt.{since}"
+
+    try:
+        url = f"{SUPABASE_URL}/rest/v1/FamilyMember"
+        return HTTP.get_json(url, headers=supabase_headers(), params=params) or []
     except Exception as e:
         print(f"Fetch Error: {e}")
         return []
 
+def decode_image(data):
+    """Decode image bytes to an RGB numpy array at reduced resolution"""
+    with stage("decode"):
+        image_array, stats = decode_image_reduced(data, DECODE_MAX_SIDE)
+    DECODE_COUNTERS.record(stats)
+    return image_array
+
 def download_image_as_array(url):
     """Download image to numpy array"""
-    try:
-        resp = requests.get(url, timeout=5)
-        if resp.status_code == 200:
-            img = Image.open(io.BytesIO(resp.content)).convert('RGB')
-            return np.array(img)
-    except:
-        return None
+    result = record_download(HTTP.get(url))
+    if result.ok:
+        return decode_image(result.content)
     return None
 
-def calculate_cosine_distance(embedding1, embedding2):
-    """Fast cosine distance calculation"""
-    # Normalize embeddings
-    embedding1_norm = embedding1 / np.linalg.norm(embedding1)
-    embedding2_norm = embedding2 / np.linalg.norm(embedding2)
-    
-    # Cosine similarity
-    similarity = np.dot(embedding1_norm, embedding2_norm)
-    
-    # Convert to distance (0 = identical, 1 = completely different)
-    distance = 1 - similarity
-    
-    return distance
+def record_download(result, member_id=None):
+    """Per-photo latency, bytes and ETag revalidation outcome (metrics + span)"""
+    observe_stage("photo_download", result.elapsed, url=result.url, memberId=member_id or "",
+                  status=result.status, cache="etag_hit" if result.not_modified else "miss",
+                  bytes=len(result.content) if result.content is not None else 0)
+    if result.content is not None:
+        DOWNLOAD_BYTES.inc(len(result.content), kind="photo")
+    if result.not_modified:
+        CACHE_EVENTS.inc(cache="photo_etag", outcome="hit")
+    return result
 
-def verify_single_photo(input_embedding, photo_url, member_name, photo_idx):
-    """Verify against a single photo (for parallel processing)"""
-    try:
-        db_img_arr = download_image_as_array(photo_url)
+def fetch_photos(requests_with_etags, member_ids=None):
+    """Download many (url, etag) pairs concurrently over the shared pool"""
+    results = HTTP.get_many(requests_with_etags)
+    for result, member_id in zip(results, member_ids or [None] * len(results)):
+        record_download(result, member_id)
+    return results
+
+def embed_missing_photos(candidates, gallery, patient_id):
+    """
+    Download and embed roster photos that are not in the gallery yet.
+
+    These have no stored ETag, so the downloads are unconditional; photos
+    already in the gallery are revalidated by enrollment, not here.
+    """
+    missing = [
+        (member, url)
+        for member in candidates
+        for url in (member.get('photoUrls') or [])
+        if gallery is None or (url, MODEL_NAME) not in gallery.url_to_row
+    ]
+    if not missing:
+        return gallery
+
+    print(f"📥 Embedding {len(missing)} photos not yet in gallery...")
+    pending = []  # New gallery rows computed during this request
+
+    # All downloads in flight at once on the shared connection pool (no validator to send)
+    results = fetch_photos([(url, None) for _, url in missing],
+                           member_ids=[member.get('id') for member, _ in missing])
+
+    def embed_one(member, url, result):
+        with span("embed_photo", memberId=member.get('id') or "", url=url):
+            embed_downloaded(member, url, result)
+
+    def embed_downloaded(member, url, result):
+        if not result.ok:
+            print(f"Photo download failed for {member.get('name', 'Unknown')}: {result.error or result.status}")
+            return
+        db_img_arr = decode_image(result.content)
         if db_img_arr is None:
-            return None
-        
-        # Get or compute cached embedding for this photo
-        db_embedding = get_or_compute_embedding(photo_url, db_img_arr)
-        if db_embedding is None:
-            return None
-        
-        # Fast distance calculation
-        distance = calculate_cosine_distance(input_embedding, db_embedding)
-        
-        return distance
-        
-    except Exception as e:
-        print(f"Photo verification error for {member_name} (photo {photo_idx}): {e}")
-        return None
+            return
+        get_or_compute_embedding(url, db_img_arr, patient_id, member.get('id'), pending,
+                                 raw=result.content, etag=result.etag)
 
-def verify_candidate_parallel(input_embedding, member):
-    """Enhanced multi-photo verification with parallel processing"""
-    name = member.get('name', 'Unknown')
-    photo_urls = member.get('photoUrls', [])
-    
-    if not photo_urls:
-        print(f"No photos for {name}")
-        return None
+    # Decode + embed on the shared CPU pool
+    for _ in CPU_EXECUTOR.map(bind_context(lambda job: embed_one(*job)),
+                              [(member, url, result) for (member, url), result in zip(missing, results)]):
+        pass
 
-    distances = []
-    
-    # Parallel verification of all photos
-    with ThreadPoolExecutor(max_workers=MAX_WORKERS) as executor:
-        future_to_url = {
-            executor.submit(verify_single_photo, input_embedding, url, name, idx): idx
-            for idx, url in enumerate(photo_urls)
-        }
-        
-        for future in as_completed(future_to_url):
-            distance = future.result()
-            if distance is not None:
-                distances.append(distance)
-    
-    if not distances:
-        return None
-    
-    # Use best (minimum) distance
-    best_distance = min(distances)
-    
-    return {
-        "member": member,
-        "distance": best_distance,
-        "photos_checked": len(distances)
-    }
+    # Persist newly computed embeddings in one write
+    if pending:
+        try:
+            gallery = GALLERY.put_many(patient_id, pending)
+            print(f"💾 Stored {len(pending)} new embeddings in gallery")
+        except Exception as e:
+            print(f"Gallery write error: {e}")
+    return gallery
+
+# (roster version, gallery version) the current recognition matched against; see remember_result
+MATCHED_VERSION = contextvars.ContextVar("matched_version", default=None)
+
+def load_gallery_matrix(candidates, patient_id):
+    """Pre-normalized gallery matrix for the roster, embedding any missing photos first"""
+    with stage("gallery_load"):
+        gallery = GALLERY.load(patient_id)
+    gallery = embed_missing_photos(candidates, gallery, patient_id)
+    MATCHED_VERSION.set((ROSTER.version(patient_id), gallery.version if gallery is not None else 0))
+    with stage("gallery_load"):
+        return MATCHER.get(patient_id, gallery, candidates, MODEL_NAME)
+
+def verify_all_candidates(input_embedding, candidates, patient_id):
+    """Score the query against the family photos (centroid shortlist first on large rosters)"""
+    gallery_matrix = load_gallery_matrix(candidates, patient_id)
+    with stage("matching"):
+        distances = match_members(gallery_matrix, input_embedding, PREFILTER, RERANK_TOP_K)
 
-def verify_all_candidates_parallel(input_embedding, candidates):
-    """Verify against all family members in parallel"""
+    members_by_id = {member.get('id'): member for member in candidates}
     results = []
-    
-    # Parallel verification across all family members
-    with ThreadPoolExecutor(max_workers=MAX_WORKERS) as executor:
-        future_to_member = {
-            executor.submit(verify_candidate_parallel, input_embedding, member): member
-            for member in candidates
-        }
-        
-        for future in as_completed(future_to_member):
-            res = future.result()
-            if res:
-                results.append(res)
-                name = res['member']['name']
-                dist = res['distance']
-                print(f" - Checked {name}: Distance {dist:.4f}")
+    for member_id, distance, photos in zip(gallery_matrix.member_ids, distances, gallery_matrix.photo_counts):
+        if not np.isfinite(distance):
+            continue  # not shortlisted by the centroid stage
+        member = members_by_id[member_id]
+        results.append({
+            "member": member,
+            "distance": float(distance),
+            "photos_checked": int(photos)
+        })
+        print(f" - Checked {member.get('name', 'Unknown')}: Distance {distance:.4f}")
     
     return results
 
-def recognize_face(input_image, patient_id):
+def result_version(patient_id):
+    """Changes whenever the roster or the gallery a cached result was computed from changes"""
+    gallery = GALLERY.loaded(patient_id)
+    return (ROSTER.version(patient_id), gallery.version if gallery is not None else 0)
+
+def valid_input(input_image, patient_id):
+    return input_image is not None and bool(patient_id) and bool(patient_id.strip())
+
+def cached_result(mode, input_image, patient_id):
+    """(cached result or None, phash) for a validated query; phash is None when caching does not apply"""
+    if not RESULTS.enabled:
+        return None, None
+    try:
+        phash = perceptual_hash(input_image)
+    except Exception:
+        return None, None
+    patient_id = patient_id.strip()
+    return RESULTS.get(patient_id, phash, result_version(patient_id), mode), phash
+
+def remember_result(mode, phash, patient_id, result):
+    """Cache decisive outcomes only (matches and unknown persons), never transient errors"""
+    # Keyed by the roster + gallery the result was matched against, known only once they were loaded
+    version = MATCHED_VERSION.get()
+    if (phash is not None and version is not None and 'error' not in result
+            and result.get('error_type') in (None, 'unknown_person')):
+        RESULTS.put(patient_id.strip(), phash, version, mode, result)
+
+def count_outcome(mode, result, cached=False):
+    """memora_recognitions_total by error_type ("none" for a match)"""
+    RECOGNITIONS.inc(mode=mode, error_type=result.get('error_type') or ("error" if 'error' in result else "none"),
+                     cached="true" if cached else "false")
+
+def with_timings(result, timings, include_timings=None):
+    """Attach the per-stage breakdown when asked (never mutates cached results)"""
+    if include_timings is None:
+        include_timings = RESPONSE_TIMINGS
+    if not include_timings or not isinstance(result, dict):
+        return result
+    return {**result, "timings_ms": timings.as_dict()}
+
+def admitted_recognition(mode, fn, input_image, patient_id):
+    """Input check -> result cache -> admission control -> fn, with outcome counting"""
+    if not valid_input(input_image, patient_id):
+        result = fn(input_image, patient_id)  # answers with its own validation error, no model work
+        count_outcome(mode, result)
+        return result
+    cached, phash = cached_result(mode, input_image, patient_id)
+    if cached is not None:
+        count_outcome(mode, cached, cached=True)
+        return cached
+    token = MATCHED_VERSION.set(None)  # request threads are reused
+    try:
+        with ADMISSION.admit():
+            result = fn(input_image, patient_id)
+    except Overloaded as e:
+        result = overloaded_response(e)
+    else:
+        if 'error' not in result and result.get('error_type') in (None, 'unknown_person'):
+            STARTUP.mark_first_recognition()
+        remember_result(mode, phash, patient_id, result)
+    finally:
+        MATCHED_VERSION.reset(token)
+    count_outcome(mode, result)
+    return result
+
+def traced_recognition(name, mode, fn, input_image, patient_id):
+    """Root span + profiler capture for one recognition, tagged with the outcome (and slow)"""
+    patient_id_tag = (patient_id or "").strip()
+    with TRACER.trace(name, patientId=patient_id_tag, mode=mode) as root:
+        with PROFILER.capture(name, patientId=patient_id_tag, mode=mode) as capture:
+            result = admitted_recognition(mode, fn, input_image, patient_id)
+        root.set_attributes(error_type=result.get('error_type') or "none",
+                            match=bool(result.get('match')),
+                            result_cache="hit" if result.get('cached') else "miss",
+                            slow=capture.slow)
+    if capture.slow:
+        SLOW_RECOGNITIONS.inc(mode=mode)
+        print(f"🐢 Slow {name}: {capture.duration_s * 1000:.0f}ms "
+              f"(patient {patient_id_tag}, profile #{capture.id}, {sum(capture.samples.values())} samples)")
+    return result
+
+def recognize_face(input_image, patient_id, include_timings=None):
+    """Admission-controlled entry point (see _recognize_face); re-scans are answered from RESULTS"""
+    with collect_timings() as timings:
+        result = traced_recognition("recognize_face", "single", _recognize_face, input_image, patient_id)
+    return with_timings(result, timings, include_timings)
+
+def overloaded_response(e):
+    """Response for requests the AdmissionController turned away"""
+    print(f"🚦 Rejected recognition: {e}")
+    return {
+        "error": "Server is busy",
+        "match": False,
+        "error_type": "overloaded",
+        "suggestion": "Please try again in a few seconds"
+    }
+
+def quality_rejection(input_image):
+    """Error response if the frame fails the quality gate, else None"""
+    quality_ok, quality_reason, quality_metrics = check_image_quality(input_image)
+    if quality_ok:
+        return None
+    print(f"🚫 Quality gate: {quality_reason}")
+    return {
+        "error": quality_reason,
+        "match": False,
+        "error_type": "low_quality_face",
+        "quality": quality_metrics,
+        "suggestion": QUALITY_SUGGESTIONS.get(quality_metrics.get("failed_check"),
+                                              "Please use a clearer image with better lighting")
+    }
+
+def _recognize_face(input_image, patient_id):
     """
     Optimized recognition with clear error states:
     1. No face in image → "No face detected"
@@ -250,18 +548,23 @@ def recognize_face(input_image, patient_id):
     if not patient_id or patient_id.strip() == "":
         return {"error": "Patient ID is required", "match": False}
     
-    # STEP 1: Extract face and embedding from input (ONCE)
+    # STEP 0: Cheap quality gate - blurry/dark frames never reach the model
+    rejection = quality_rejection(input_image)
+    if rejection:
+        return rejection
+    
+    # STEP 1: Detect, align and embed the query face in a single pass
     print("🔍 Detecting face and extracting embedding...")
     try:
-        # Extract face with alignment
-        face_objs = DeepFace.extract_faces(
-            img_path=input_image,
+        best_face = detect_align_embed(
+            input_image,
+            model_name=MODEL_NAME,
             detector_backend=DETECTOR,
-            enforce_detection=True,
-            align=True
+            min_confidence=MIN_FACE_CONFIDENCE,
+            batcher=EMBED_BATCHER
         )
         
-        if not face_objs or len(face_objs) == 0:
+        if best_face is None:
             return {
                 "error": "No face detected in the image",
                 "match": False,
@@ -270,12 +573,11 @@ def recognize_face(input_image, patient_id):
             }
         
         # Check face detection confidence
-        best_face = max(face_objs, key=lambda x: x['confidence'])
-        face_confidence = best_face['confidence']
+        face_confidence = best_face.confidence
         
         print(f"✅ Face detected with confidence: {face_confidence:.2f}")
         
-        if face_confidence < 0.85:
+        if face_confidence < MIN_FACE_CONFIDENCE:
             return {
                 "error": "Face detected but quality too low",
                 "match": False,
@@ -284,8 +586,8 @@ def recognize_face(input_image, patient_id):
                 "suggestion": "Please use a clearer image with better lighting"
             }
         
-        # Extract embedding ONCE for input image
-        input_embedding = compute_embedding(input_image)
+        # Embedding was computed from the aligned crop (no second detection)
+        input_embedding = best_face.embedding
         if input_embedding is None:
             return {
                 "error": "Failed to extract face features",
@@ -321,10 +623,10 @@ def recognize_face(input_image, patient_id):
             "message": "No family members found for this patient"
         }
 
-    print(f"🚀 Verifying against {len(candidates)} family members (parallel mode)...")
+    print(f"🚀 Verifying against {len(candidates)} family members (vectorized)...")
 
-    # STEP 3: Compare against all family members in parallel
-    results = verify_all_candidates_parallel(input_embedding, candidates)
+    # STEP 3: Compare against all family members in one pass
+    results = verify_all_candidates(input_embedding, candidates, patient_id)
 
     # STEP 4: Analyze results
     if not results:
@@ -374,12 +676,279 @@ def recognize_face(input_image, patient_id):
             "closest_distance": round(best_distance, 4)
         }
 
-# --- 5. GRADIO INTERFACE ---
+def identify_embeddings(embeddings, candidates, gallery_matrix):
+    """One identity dict per embedding: single matrix-matrix product + one-to-one assignment"""
+    with stage("matching"):
+        distances = match_members_batch(gallery_matrix, embeddings, PREFILTER, RERANK_TOP_K)
+        assignment = assign_members(distances, THRESHOLD)
+    members_by_id = {member.get('id'): member for member in candidates}
+    
+    identities = []
+    for face_distances, member_idx in zip(distances, assignment):
+        if member_idx is not None:
+            member = members_by_id[gallery_matrix.member_ids[member_idx]]
+            distance = float(face_distances[member_idx])
+            identities.append({
+                "id": member['id'],
+                "name": member['name'],
+                "relationship": member['relationship'],
+                "confidence": round(max(0.0, min(1.0, 1.0 - distance)), 2),
+                "distance": round(distance, 4),
+                "match": True
+            })
+        else:
+            closest_idx = int(np.argmin(face_distances))
+            closest = members_by_id[gallery_matrix.member_ids[closest_idx]]
+            distance = float(face_distances[closest_idx])
+            identities.append({
+                "name": "Unknown",
+                "relationship": "",
+                "confidence": round(max(0.0, min(1.0, 1.0 - distance)), 2),
+                "distance": round(distance, 4),
+                "match": False,
+                "closest_match": closest['name'],
+                "closest_distance": round(distance, 4)
+            })
+    return identities
+
+def recognize_faces(input_image, patient_id, include_timings=None):
+    """Multi-face mode: name every face in the frame (admission-controlled)"""
+    with collect_timings() as timings:
+        result = traced_recognition("recognize_faces", "multi", _recognize_faces, input_image, patient_id)
+    return with_timings(result, timings, include_timings)
+
+def _recognize_faces(input_image, patient_id):
+    """
+    Recognize all faces in one image (family gatherings):
+    every crop is embedded in one batched forward pass and scored against the
+    gallery with a single matrix-matrix product.
+    """
+    if input_image is None:
+        return {"error": "No image provided", "match": False, "faces": []}
+    
+    if not patient_id or patient_id.strip() == "":
+        return {"error": "Patient ID is required", "match": False, "faces": []}
+    
+    rejection = quality_rejection(input_image)
+    if rejection:
+        return {**rejection, "faces": []}
+    
+    # STEP 1: Detect once, keep every confident face, embed them all together
+    print("🔍 Detecting all faces...")
+    try:
+        faces = detect_faces(input_image, DETECTOR)
+    except ValueError:
+        return {
+            "error": "No face detected in the image",
+            "match": False,
+            "faces": [],
+            "error_type": "no_face",
+            "suggestion": "Please upload an image containing a human face"
+        }
+    except Exception as e:
+        print(f"Face detection error: {e}")
+        return {
+            "error": f"Face detection failed: {str(e)}",
+            "match": False,
+            "faces": [],
+            "error_type": "detection_error"
+        }
+    
+    faces = [face for face in faces if face.confidence >= MIN_FACE_CONFIDENCE]
+    if not faces:
+        return {
+            "error": "Faces detected but quality too low",
+            "match": False,
+            "faces": [],
+            "error_type": "low_quality_face",
+            "suggestion": "Please use a clearer image with better lighting"
+        }
+    
+    faces = [face for face in embed_faces(faces, MODEL_NAME) if face.embedding is not None]
+    if not faces:
+        return {
+            "error": "Failed to extract face features",
+            "match": False,
+            "faces": [],
+            "error_type": "embedding_error"
+        }
+    print(f"✅ {len(faces)} faces embedded in one batch")
+    
+    # STEP 2: Roster + gallery
+    candidates = fetch_family_members(patient_id)
+    if not candidates:
+        return {
+            "match": False,
+            "faces": [],
+            "error_type": "no_family_data",
+            "message": "No family members found for this patient"
+        }
+    
+    gallery_matrix = load_gallery_matrix(candidates, patient_id)
+    if len(gallery_matrix) == 0:
+        return {
+            "match": False,
+            "faces": [],
+            "error_type": "processing_error",
+            "message": "Failed to process family member photos"
+        }
+    
+    # STEP 3: (faces x members) distances, one-to-one assignment under THRESHOLD
+    identities = identify_embeddings(np.stack([face.embedding for face in faces]), candidates, gallery_matrix)
+    results = []
+    for face, identity in zip(faces, identities):
+        results.append({"bbox": face.bbox, "face_confidence": round(face.confidence, 2), **identity})
+        print(f" - Face at {face.bbox}: {identity['name']} ({identity['distance']:.4f})")
+    
+    matched = sum(1 for r in results if r['match'])
+    return {
+        "faces": results,
+        "face_count": len(results),
+        "matched_count": matched,
+        "match": matched > 0,
+        "error_type": None if matched else "unknown_person"
+    }
+
+def recognize_stream_frame(frame, patient_id, session_id):
+    """
+    Streaming mode: track faces across frames and only embed new or stale tracks.
+    Frames arriving while the session is still busy, or while every
+    recognition slot is taken, are dropped (latest wins).
+    """
+    if frame is None or not patient_id or not session_id:
+        return {"faces": [], "match": False}
+    
+    session = STREAMS.get(session_id, patient_id.strip())
+    if not session.lock.acquire(blocking=False):
+        session.stats["frames_dropped"] += 1
+        return {"faces": session.last_results, "match": any(f['match'] for f in session.last_results), "dropped": True}
+    
+    try:
+        # Frames share the recognition slots; a frame that finds none is dropped
+        # rather than queued, since the next frame supersedes it anyway
+        with ADMISSION.admit(wait=False):
+            return process_stream_frame(session, frame)
+    except Overloaded:
+        session.stats["frames_dropped"] += 1
+        session.stats["frames_overloaded"] += 1
+        return {"faces": session.last_results, "match": any(f['match'] for f in session.last_results),
+                "dropped": True, "error_type": "overloaded"}
+    finally:
+        session.lock.release()
+
+def process_stream_frame(session, frame):
+    """One admitted stream frame: detect, embed new/stale tracks, identify"""
+    try:
+        def detect(image):
+            try:
+                return [face for face in detect_faces(image, DETECTOR) if face.confidence >= MIN_FACE_CONFIDENCE]
+            except ValueError:
+                return []
+        
+        def identify(embeddings):
+            candidates = fetch_family_members(session.patient_id)
+            gallery_matrix = load_gallery_matrix(candidates, session.patient_id) if candidates else None
+            if gallery_matrix is None or len(gallery_matrix) == 0:
+                return [{"name": "Unknown", "relationship": "", "match": False,
+                         "error_type": "no_family_data"} for _ in embeddings]
+            return identify_embeddings(embeddings, candidates, gallery_matrix)
+        
+        faces = session.process(frame, detect, lambda fs: embed_faces(fs, MODEL_NAME), identify)
+        return {"faces": faces, "match": any(f['match'] for f in faces), "session": dict(session.stats)}
+    except Exception as e:
+        print(f"Stream frame error: {e}")
+        return {"faces": [], "match": False, "error": str(e), "error_type": "detection_error"}
+
+# --- 5. ENROLLMENT ---
+# Photos are embedded once when a member is added or changed, not per scan
+
+ENROLLER = Enroller(
+    GALLERY,
+    model_name=MODEL_NAME,
+    fetch_many_fn=fetch_photos,
+    decode_fn=decode_image,
+    embed_fn=compute_embedding,
+    hash_fn=content_hash
+)
+
+# Invalidations made here, replayed on sibling workers by serve_multiprocess.py's router
+INVALIDATIONS = InvalidationLog()
+
+def invalidate_patient(patient_id, record=True):
+    """Forget a patient's roster, cached results and open gallery (all patients if None)"""
+    ROSTER.invalidate(patient_id)
+    RESULTS.invalidate(patient_id)
+    GALLERY.forget(patient_id)
+    if record:
+        INVALIDATIONS.record(patient_id)
+
+ENROLLMENT_WORKER = EnrollmentWorker(
+    ENROLLER,
+    fetch_member_fn=fetch_family_member,
+    fetch_updated_fn=fetch_updated_family_members,
+    watermark_path=os.path.join(GALLERY_DIR, "enrollment_watermark.json"),
+    poll_seconds=ENROLLMENT_POLL_SECONDS,
+    on_enrolled=invalidate_patient
+)
+
+if SUPABASE_URL and SUPABASE_KEY:
+    ENROLLMENT_WORKER.start()
+
+def enroll_family_member(member_id, force=False):
+    """Embed a family member's photos into the gallery (call after add/edit)"""
+    if not member_id or member_id.strip() == "":
+        return {"error": "Family member ID is required"}
+    return ENROLLMENT_WORKER.enroll_by_id(member_id.strip(), force=bool(force))
+
+def get_stats():
+    """Runtime counters for the inference Space"""
+    return {
+        "embedding_batcher": EMBED_BATCHER.stats(),
+        "enrollment": dict(ENROLLMENT_WORKER.stats),
+        "roster_cache": ROSTER.stats(),
+        "admission": ADMISSION.stats(),
+        "decode": DECODE_COUNTERS.snapshot(),
+        "quality_gate": QUALITY_GATE.stats(),
+        "streaming": STREAMS.stats(),
+        "matching": MATCHER.stats(),
+        "result_cache": RESULTS.stats(),
+        "tracing": TRACER.stats(),
+        "profiler": PROFILER.stats(),
+        "startup": STARTUP.snapshot(),
+        "detector": CASCADE.stats() if DETECTOR == "cascade" else {"backend": DETECTOR},
+        "embedder": get_embedder(MODEL_NAME).describe() if get_embedder(MODEL_NAME) else None,
+        "memory": process_memory(),
+    }
+
+@REGISTRY.collector
+def cache_metrics():
+    """Every cache's hits and misses as one memora_cache_lookups_total family"""
+    samples = list(next(iter(CACHE_EVENTS.collect()))[3])
+    roster, results, matcher = ROSTER.stats(), RESULTS.stats(), MATCHER.stats()
+    for cache, stats in (("roster", roster), ("result", results), ("gallery_matrix", matcher)):
+        samples.append(({"cache": cache, "outcome": "hit"}, stats["hits"]))
+        samples.append(({"cache": cache, "outcome": "miss"}, stats["misses"]))
+    samples.append(({"cache": "roster", "outcome": "stale"}, roster["stale"]))
+    yield "memora_cache_lookups_total", "counter", "Cache lookups by cache and outcome", samples
+
+@REGISTRY.collector
+def runtime_metrics():
+    """Numeric fields of get_stats() as gauges (queue depths, in-flight, sessions, bytes...)"""
+    samples = []
+    for section, values in get_stats().items():
+        if not isinstance(values, dict):
+            continue
+        for key, value in values.items():
+            if isinstance(value, (int, float)) and not isinstance(value, bool):
+                samples.append(({"section": section, "key": key}, value))
+    yield "memora_runtime", "gauge", "Numeric runtime counters from /v1/stats", samples
+
+# --- 6. GRADIO INTERFACE ---
 
 with gr.Blocks(title="Memora Face Recognition Enhanced") as demo:
     gr.Markdown("# Memora Face Recognition (Optimized)")
-    gr.Markdown(f"**Model:** {MODEL_NAME} | **Detector:** {DETECTOR} | **Parallel Processing Enabled**")
-    gr.Markdown(f"**Performance:** Embedding cache active | {MAX_WORKERS} parallel workers")
+    gr.Markdown(f"**Model:** {MODEL_NAME} | **Detector:** {DETECTOR} | **Vectorized Matching**")
+    gr.Markdown("**Performance:** Persistent gallery store | single-GEMM matching")
     
     with gr.Row():
         with gr.Column():
@@ -394,8 +963,245 @@ with gr.Blocks(title="Memora Face Recognition Enhanced") as demo:
         fn=recognize_face,
         inputs=[img_input, id_input],
         outputs=json_output,
-        api_name="predict"
+        api_name="predict",
+        concurrency_limit=None  # AdmissionController decides what runs
     )
+    
+    with gr.Accordion("Recognize Everyone (multi-face)", open=False):
+        multi_btn = gr.Button("Recognize All Faces")
+        multi_output = gr.JSON(label="Faces")
+    
+    multi_btn.click(
+        fn=recognize_faces,
+        inputs=[img_input, id_input],
+        outputs=multi_output,
+        api_name="predict_multi",
+        concurrency_limit=None
+    )
+    
+    with gr.Accordion("Live Camera (streaming)", open=False):
+        stream_session = gr.State(lambda: uuid.uuid4().hex)
+        with gr.Row():
+            webcam_input = gr.Image(sources=["webcam"], type="numpy", streaming=True, label="Camera")
+            stream_output = gr.JSON(label="Tracked Faces")
+    
+    webcam_input.stream(
+        fn=recognize_stream_frame,
+        inputs=[webcam_input, id_input, stream_session],
+        outputs=stream_output,
+        api_name="stream",
+        concurrency_limit=None
+    )
+    
+    with gr.Accordion("Enroll Family Member", open=False):
+        member_input = gr.Textbox(label="Family Member ID", placeholder="Enter UUID")
+        force_input = gr.Checkbox(label="Re-embed all photos", value=False)
+        enroll_btn = gr.Button("Enroll")
+        enroll_output = gr.JSON(label="Enrollment")
+    
+    enroll_btn.click(
+        fn=enroll_family_member,
+        inputs=[member_input, force_input],
+        outputs=enroll_output,
+        api_name="enroll"
+    )
+    
+    with gr.Accordion("Runtime Stats", open=False):
+        stats_btn = gr.Button("Refresh")
+        stats_output = gr.JSON(label="Stats")
+    
+    stats_btn.click(fn=get_stats, inputs=[], outputs=stats_output, api_name="stats")
+
+# --- 7. HTTP API ---
+# Plain endpoints next to Gradio: no queue, no client handshake, same model and caches
+
+api = FastAPI(title="Memora Face Recognition API")
+
+async def read_upload(request):
+    """Image bytes + patientId from multipart form or a raw image body"""
+    content_type = request.headers.get("content-type", "")
+    if content_type.startswith("multipart/form-data"):
+        form = await request.form()
+        upload = form.get("image") or form.get("file")
+        data = await upload.read() if hasattr(upload, "read") else None
+        patient_id = form.get("patientId") or request.query_params.get("patientId")
+    else:
+        data = await request.body()
+        patient_id = request.query_params.get("patientId") or request.headers.get("x-patient-id")
+    return data, patient_id
+
+def recognize_upload(fn, data, patient_id, include_timings=None):
+    """Decode + recognize under one timing breakdown and trace; None if the bytes are not an image"""
+    with collect_timings() as timings, TRACER.trace("http." + fn.__name__, patientId=patient_id.strip(),
+                                                    bytes=len(data or b"")):
+        input_image = decode_image(data) if data else None
+        if data and input_image is None:
+            return None
+        result = fn(input_image, patient_id, include_timings=False)
+    return with_timings(result, timings, include_timings)
+
+def recognition_response(result):
+    """JSON response; a shed request is a 503 with Retry-After, so callers back off instead of retrying elsewhere"""
+    if result.get("error_type") == "overloaded":
+        return JSONResponse(result, status_code=503, headers={"retry-after": "2"})
+    return JSONResponse(result)
+
+def timing_requested(request):
+    """?timing=1 asks for timings_ms on this response"""
+    flag = request.query_params.get("timing")
+    return None if flag is None else flag.lower() in ("1", "true", "yes")
+
+@api.post("/v1/recognize")
+async def recognize_http(request: Request):
+    """Same JSON schema as the Gradio "predict" endpoint"""
+    data, patient_id = await read_upload(request)
+    result = await run_in_threadpool(recognize_upload, recognize_face, data, patient_id or "",
+                                     timing_requested(request))
+    if result is None:
+        return JSONResponse({"error": "Could not decode image", "match": False, "error_type": "detection_error"})
+    return recognition_response(result)
+
+@api.post("/v1/recognize/multi")
+async def recognize_multi_http(request: Request):
+    """Same JSON schema as the Gradio "predict_multi" endpoint"""
+    data, patient_id = await read_upload(request)
+    result = await run_in_threadpool(recognize_upload, recognize_faces, data, patient_id or "",
+                                     timing_requested(request))
+    if result is None:
+        return JSONResponse({"error": "Could not decode image", "match": False, "faces": [], "error_type": "detection_error"})
+    return recognition_response(result)
+
+@api.websocket("/v1/stream")
+async def stream_ws(websocket: WebSocket):
+    """
+    Camera stream: first message {"patientId": "..."}, then binary JPEG frames.
+    Each frame is answered with the tracked faces as JSON.
+    """
+    await websocket.accept()
+    session_id = uuid.uuid4().hex
+    try:
+        hello = await websocket.receive_json()
+        patient_id = (hello or {}).get("patientId", "")
+        if not patient_id:
+            await websocket.send_json({"error": "Patient ID is required", "match": False})
+            return
+        while True:
+            data = await websocket.receive_bytes()
+            frame = await run_in_threadpool(decode_image, data)
+            result = await run_in_threadpool(recognize_stream_frame, frame, patient_id, session_id)
+            await websocket.send_json(result)
+    except WebSocketDisconnect:
+        pass
+    finally:
+        STREAMS.close(session_id)
+
+def admin_allowed(request):
+    """Bearer ADMIN_TOKEN (or x-admin-token); admin is off when no token is configured"""
+    supplied = request.headers.get("x-admin-token") or request.headers.get("authorization", "").removeprefix("Bearer ")
+    return bool(ADMIN_TOKEN) and hmac.compare_digest(supplied.encode(), ADMIN_TOKEN.encode())
+
+def admin_denied():
+    return JSONResponse({"error": "Admin token required"}, status_code=403)
+
+def bad_request(message):
+    return JSONResponse({"error": message}, status_code=400)
+
+async def json_object(request):
+    """Parsed JSON object body, or None when it is missing or malformed"""
+    try:
+        body = await request.json()
+    except (json.JSONDecodeError, UnicodeDecodeError):
+        return None
+    return body if isinstance(body, dict) else None
+
+@api.post("/v1/enroll")
+async def enroll_http(request: Request):
+    """Enroll a family member (admin): {"memberId": "...", "force": false}"""
+    if not admin_allowed(request):
+        return admin_denied()
+    body = await json_object(request)
+    if body is None:
+        return bad_request("Expected a JSON object body")
+    member_id = body.get("memberId")
+    if not isinstance(member_id, str) or not member_id.strip():
+        return bad_request("memberId is required")
+    result = await run_in_threadpool(enroll_family_member, member_id, bool(body.get("force", False)))
+    return JSONResponse(result)
+
+@api.post("/v1/invalidate")
+async def invalidate_http(request: Request):
+    """Replay of a sibling worker's invalidation (admin): {"patientId": "..."} or {"all": true}"""
+    if not admin_allowed(request):
+        return admin_denied()
+    body = await json_object(request)
+    if body is None:
+        return bad_request("Expected a JSON object body")
+    patient_id = body.get("patientId")
+    if body.get("all") is True:
+        patient_id = None
+    elif not isinstance(patient_id, str) or not patient_id.strip():
+        return bad_request("patientId (or all: true) is required")
+    invalidate_patient(patient_id, record=False)
+    return JSONResponse({"invalidated": patient_id if patient_id is not None else "all"})
+
+@api.get("/v1/stats")
+async def stats_http():
+    return JSONResponse(get_stats())
+
+@api.get("/v1/health")
+async def health_http():
+    """Cheap liveness + load probe (used by serve_multiprocess.py's router)"""
+    return JSONResponse({
+        "ready": STARTUP.ready_s is not None,
+        "pid": os.getpid(),
+        "worker": os.environ.get("WORKER_INDEX"),
+        "admission": ADMISSION.stats(),
+        "embed_queue_depth": EMBED_BATCHER.stats()["queue_depth"],
+        "memory": process_memory(),
+        "invalidations": INVALIDATIONS.snapshot(),
+    })
+
+@api.get("/metrics")
+async def metrics_http():
+    """Prometheus text format: stage histograms, cache lookups, bytes, outcomes, runtime gauges"""
+    return PlainTextResponse(REGISTRY.render(), media_type="text/plain; version=0.0.4")
+
+@api.get("/admin/profile")
+async def profile_http(request: Request):
+    """Collapsed stacks (flamegraph.pl / speedscope input); ?request=<id> for one slow recognition"""
+    if not admin_allowed(request):
+        return admin_denied()
+    capture_id = request.query_params.get("request")
+    text = PROFILER.collapsed(int(capture_id) if capture_id and capture_id.isdigit() else None)
+    if text is None:
+        return JSONResponse({"error": f"No slow request {capture_id} retained"}, status_code=404)
+    name = f"memora-request-{capture_id}.folded" if capture_id else "memora-profile.folded"
+    return PlainTextResponse(text, headers={"content-disposition": f'attachment; filename="{name}"'})
+
+@api.get("/admin/profile/slow")
+async def profile_slow_http(request: Request):
+    """Retained slow recognitions, newest first"""
+    if not admin_allowed(request):
+        return admin_denied()
+    return JSONResponse({"profiler": PROFILER.stats(), "slow_requests": PROFILER.slow_requests()})
+
+@api.post("/admin/profile/{action}")
+async def profile_control_http(action: str, request: Request):
+    """start | stop | reset the sampling profiler"""
+    if not admin_allowed(request):
+        return admin_denied()
+    controls = {"start": PROFILER.start, "stop": PROFILER.stop, "reset": PROFILER.reset}
+    if action not in controls:
+        return JSONResponse({"error": f"Unknown action {action!r}"}, status_code=404)
+    controls[action]()
+    return JSONResponse(PROFILER.stats())
+
+app = gr.mount_gradio_app(api, demo, path="/")
+STARTUP.mark_ready()
 
 if __name__ == "__main__":
-    demo.launch()
+    uvicorn.run(
+        app,
+        host=os.environ.get("GRADIO_SERVER_NAME", "0.0.0.0"),
+        port=int(os.environ.get("GRADIO_SERVER_PORT", "7860"))
+    )
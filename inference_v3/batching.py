@@ -0,0 +1,129 @@
+"""
+Memora Micro-Batching
+Collects work items from concurrent requests and runs them as one batch.
+
+A single scheduler thread waits for the first item, then keeps collecting for
+at most max_wait_ms (or until max_batch_size items are queued) and hands the
+whole batch to batch_fn. Each caller gets its own result through a Future.
+"""
+
+import queue
+import threading
+import time
+from collections import Counter
+from concurrent.futures import Future
+from typing import Any, Callable, Dict, List
+
+
+def _bucket(n: int) -> str:
+    """Power-of-two bucket label for queue depth histograms."""
+    if n <= 0:
+        return "0"
+    upper = 1
+    while upper < n:
+        upper *= 2
+    return f"<={upper}"
+
+
+class MicroBatcher:
+    """Cross-request batching scheduler around a batch function."""
+
+    def __init__(self, batch_fn: Callable[[List[Any]], List[Any]],
+                 max_batch_size: int = 8, max_wait_ms: float = 5.0, name: str = "batcher"):
+        self.batch_fn = batch_fn
+        self.max_batch_size = max(1, int(max_batch_size))
+        self.max_wait = max(0.0, float(max_wait_ms)) / 1000.0
+        self.name = name
+
+        self._queue: "queue.Queue" = queue.Queue()
+        self._stats_lock = threading.Lock()
+        self._batch_sizes: Counter = Counter()
+        self._queue_depths: Counter = Counter()
+        self._items = 0
+        self._errors = 0
+        self._closed = False
+
+        self._thread = threading.Thread(target=self._run, name=f"{name}-scheduler", daemon=True)
+        self._thread.start()
+
+    def submit(self, item: Any) -> Future:
+        """Queue one item; the Future resolves to its own result."""
+        if self._closed:
+            raise RuntimeError(f"{self.name} is closed")
+        future: Future = Future()
+        self._queue.put((item, future))
+        return future
+
+    def __call__(self, item: Any, timeout: float = None) -> Any:
+        return self.submit(item).result(timeout=timeout)
+
+    def _collect(self) -> List[tuple]:
+        first = self._queue.get()
+        if first is None:
+            return []
+        batch = [first]
+        deadline = time.monotonic() + self.max_wait
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.monotonic()
+            try:
+                nxt = self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if nxt is None:
+                self._closed = True
+                break
+            batch.append(nxt)
+        return batch
+
+    def _run(self) -> None:
+        while True:
+            batch = self._collect()
+            if not batch:
+                return
+            depth = self._queue.qsize()
+            items = [item for item, _ in batch]
+            futures = [future for _, future in batch]
+
+            with self._stats_lock:
+                self._batch_sizes[len(batch)] += 1
+                self._queue_depths[_bucket(depth)] += 1
+                self._items += len(batch)
+
+            try:
+                results = self.batch_fn(items)
+                if len(results) != len(futures):
+                    raise RuntimeError(f"{self.name}: batch_fn returned {len(results)} results for {len(futures)} items")
+                for future, result in zip(futures, results):
+                    future.set_result(result)
+            except Exception as e:
+                with self._stats_lock:
+                    self._errors += 1
+                for future in futures:
+                    if not future.done():
+                        future.set_exception(e)
+
+            if self._closed:
+                return
+
+    def stats(self) -> Dict[str, Any]:
+        """Queue depth plus batch-size and queue-depth histograms."""
+        with self._stats_lock:
+            batches = sum(self._batch_sizes.values())
+            return {
+                "max_batch_size": self.max_batch_size,
+                "max_wait_ms": self.max_wait * 1000.0,
+                "queue_depth": self._queue.qsize(),
+                "batches": batches,
+                "items": self._items,
+                "errors": self._errors,
+                "mean_batch_size": round(self._items / batches, 2) if batches else 0.0,
+                "batch_size_histogram": {str(k): v for k, v in sorted(self._batch_sizes.items())},
+                "queue_depth_histogram": dict(self._queue_depths),
+            }
+
+    def close(self) -> None:
+        """Stop the scheduler after the items already queued are served."""
+        if not self._closed:
+            self._queue.put(None)
+            self._thread.join(timeout=5)
+            self._closed = True
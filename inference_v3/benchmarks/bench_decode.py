@@ -0,0 +1,88 @@
+"""
+Decode Benchmark
+Full-resolution vs reduced-resolution decode over a directory of images.
+
+Each mode runs in a fresh child process so ru_maxrss is a real per-mode peak.
+Per-image rows (CPU ms, decoded size, DCT scale, estimated buffer bytes) and a summary
+are printed as JSON.
+
+Usage:
+    python benchmarks/bench_decode.py path/to/photos --max-side 640
+"""
+
+import argparse
+import json
+import multiprocessing as mp
+import resource
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from image_decode import decode_image_reduced  # noqa: E402
+
+IMAGE_SUFFIXES = {".jpg", ".jpeg", ".png", ".webp"}
+
+
+def _run_mode(paths, max_side, queue):
+    rows = []
+    for path in paths:
+        data = Path(path).read_bytes()
+        _, stats = decode_image_reduced(data, max_side)
+        if stats is not None:
+            rows.append({"path": str(path), **stats.as_dict()})
+    # ru_maxrss is KiB on Linux
+    queue.put({"rows": rows, "max_rss_bytes": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024})
+
+
+def run_mode(paths, max_side):
+    ctx = mp.get_context("spawn")
+    queue = ctx.Queue()
+    proc = ctx.Process(target=_run_mode, args=(paths, max_side, queue))
+    proc.start()
+    result = queue.get()
+    proc.join()
+    return result
+
+
+def summarize(result):
+    rows = result["rows"]
+    n = len(rows) or 1
+    return {
+        "images": len(rows),
+        "mean_cpu_ms": round(sum(r["cpu_ms"] for r in rows) / n, 3),
+        "total_cpu_ms": round(sum(r["cpu_ms"] for r in rows), 3),
+        "mean_est_peak_buffer_mb": round(sum(r["est_peak_buffer_bytes"] for r in rows) / n / 2**20, 2),
+        "process_max_rss_mb": round(result["max_rss_bytes"] / 2**20, 1),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("directory", help="Directory of benchmark images")
+    parser.add_argument("--max-side", type=int, default=640, help="Target long side for reduced decode")
+    parser.add_argument("--per-image", action="store_true", help="Include per-image rows in the output")
+    args = parser.parse_args()
+
+    paths = sorted(str(p) for p in Path(args.directory).rglob("*") if p.suffix.lower() in IMAGE_SUFFIXES)
+    if not paths:
+        print(f"No images found in {args.directory}")
+        return
+
+    full = run_mode(paths, 0)
+    reduced = run_mode(paths, args.max_side)
+
+    report = {
+        "max_side": args.max_side,
+        "full": summarize(full),
+        "reduced": summarize(reduced),
+    }
+    report["cpu_speedup"] = (round(report["full"]["total_cpu_ms"] / report["reduced"]["total_cpu_ms"], 2)
+                             if report["reduced"]["total_cpu_ms"] else None)
+    if args.per_image:
+        report["per_image"] = {"full": full["rows"], "reduced": reduced["rows"]}
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,111 @@
+"""
+Embedder Backend Benchmark
+Latency, throughput and embedding agreement across keras / tflite / onnx.
+
+Inputs are face crops from a directory (preprocessed exactly like the live
+pipeline) or, without one, random (H, W, 3) batches. Every backend embeds the
+same inputs; agreement is the cosine similarity of each backend's embedding
+with the first backend's (keras by default).
+
+Usage:
+    python benchmarks/bench_embedders.py --backends keras tflite onnx --artifacts artifacts --crops faces/
+"""
+
+import argparse
+import json
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from embedders import BACKENDS, create_embedder  # noqa: E402
+
+IMAGE_SUFFIXES = {".jpg", ".jpeg", ".png", ".webp"}
+
+
+def load_inputs(crops_dir, count, width, height, seed):
+    if crops_dir:
+        from deepface.modules import preprocessing
+        from PIL import Image
+
+        paths = sorted(p for p in Path(crops_dir).rglob("*") if p.suffix.lower() in IMAGE_SUFFIXES)[:count]
+        inputs = []
+        for path in paths:
+            img = np.asarray(Image.open(path).convert("RGB"))[:, :, ::-1]
+            img = preprocessing.resize_image(img=img, target_size=(height, width))
+            inputs.append(preprocessing.normalize_input(img=img, normalization="base")[0])
+        if inputs:
+            return np.stack(inputs).astype(np.float32)
+    rng = np.random.default_rng(seed)
+    return rng.random((count, height, width, 3), dtype=np.float32)
+
+
+def percentile_ms(samples, q):
+    return round(float(np.percentile(samples, q)) * 1000.0, 3)
+
+
+def bench_backend(embedder, inputs, batch_size, repeats):
+    embedder.embed(inputs[:1])  # warm-up: allocations, first-call graph work
+    single = []
+    for i in range(min(repeats, len(inputs))):
+        start = time.perf_counter()
+        embedder.embed(inputs[i:i + 1])
+        single.append(time.perf_counter() - start)
+
+    batches = [inputs[i:i + batch_size] for i in range(0, len(inputs), batch_size)]
+    start = time.perf_counter()
+    outputs = [embedder.embed(batch) for batch in batches]
+    elapsed = time.perf_counter() - start
+    return np.concatenate(outputs), {
+        "latency_p50_ms": percentile_ms(single, 50),
+        "latency_p95_ms": percentile_ms(single, 95),
+        "batch_size": batch_size,
+        "throughput_per_s": round(len(inputs) / elapsed, 1) if elapsed else None,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--backends", nargs="+", default=list(BACKENDS), choices=BACKENDS)
+    parser.add_argument("--model", default="Facenet512")
+    parser.add_argument("--artifacts", default=str(Path(__file__).parent.parent / "artifacts"))
+    parser.add_argument("--threads", type=int, default=4)
+    parser.add_argument("--crops", help="Directory of face crops (random inputs if omitted)")
+    parser.add_argument("--count", type=int, default=64)
+    parser.add_argument("--batch-size", type=int, default=8)
+    parser.add_argument("--repeats", type=int, default=32, help="Single-image latency samples")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    report = {"model": args.model, "threads": args.threads, "backends": {}}
+    inputs = reference = None
+    for backend in args.backends:
+        try:
+            embedder = create_embedder(backend, args.model, args.artifacts, args.threads)
+        except (ImportError, OSError, ValueError) as e:
+            report["backends"][backend] = {"error": str(e)}
+            continue
+        if inputs is None:
+            width, height = embedder.input_shape
+            inputs = load_inputs(args.crops, args.count, width, height, args.seed)
+            report["inputs"] = len(inputs)
+
+        embeddings, row = bench_backend(embedder, inputs, args.batch_size, args.repeats)
+        normed = embeddings / np.linalg.norm(embeddings, axis=1, keepdims=True)
+        if reference is None:
+            reference = normed
+            row["reference"] = True
+        else:
+            cosine = np.sum(normed * reference, axis=1)
+            row["cosine_agreement_mean"] = round(float(cosine.mean()), 6)
+            row["cosine_agreement_min"] = round(float(cosine.min()), 6)
+        report["backends"][backend] = {**embedder.describe(), **row}
+
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
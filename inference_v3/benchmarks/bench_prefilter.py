@@ -0,0 +1,164 @@
+"""
+Prefilter Benchmark
+Two-stage centroid prefilter vs exhaustive photo matching.
+
+Independent random 512-d vectors are nearly orthogonal, which makes any
+prefilter look perfect, so identities are generated with the structure of
+real Facenet512 embeddings instead. Every identity shares a common "face"
+direction (cosine --inter-similarity between unrelated people), identities
+come in look-alike clusters (--cluster-size members at
+--cluster-similarity, like relatives) and each photo is a noisy copy of its
+identity (cosine --intra-similarity between two photos of one person).
+Queries are fresh photos of random members plus a share of strangers drawn
+from the same distribution. The report includes the measured similarities
+so the setting can be checked. For each top-k it gives:
+
+- recall@1: how often the prefilter returns the same best member as exhaustive search.
+- identity accuracy: how often its best member is the query's true identity (exhaustive: see top level).
+- decision agreement: how often it makes the same match/no-match call under the threshold.
+- fallback rate: how often it falls back to exhaustive search.
+- mean latency per query and the speedup over exhaustive search.
+
+The fallback hides most centroid-stage misses; --fallback-distance 2 turns
+it off, and recall@1 then shows what each top-k alone loses.
+
+Usage:
+    python benchmarks/bench_prefilter.py --members 200 --photos 10 --top-k 1 4 8 16
+"""
+
+import argparse
+import json
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from matching import PrefilterConfig, build_gallery_matrix, match_members  # noqa: E402
+
+
+def unit(rng, count, dim):
+    vectors = rng.normal(size=(count, dim)).astype(np.float32)
+    return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+
+def mix(parts):
+    """Sum of (weight, unit vectors) with weights summing to 1, renormalized."""
+    out = sum(np.sqrt(weight) * vectors for weight, vectors in parts)
+    return (out / np.linalg.norm(out, axis=1, keepdims=True)).astype(np.float32)
+
+
+class IdentityModel:
+    """Clustered identities: common face direction + look-alike cluster + individual part."""
+
+    def __init__(self, rng, dim, inter, cluster, cluster_size):
+        self.rng, self.dim = rng, dim
+        self.inter, self.cluster, self.cluster_size = inter, cluster, cluster_size
+        self.common = unit(rng, 1, dim)
+
+    def identities(self, count):
+        clusters = unit(self.rng, -(-count // self.cluster_size), self.dim)
+        centers = np.repeat(clusters, self.cluster_size, axis=0)[:count]
+        return mix([(self.inter, self.common), (self.cluster - self.inter, centers),
+                    (1.0 - self.cluster, unit(self.rng, count, self.dim))])
+
+    def photos(self, identities, intra):
+        # cos(photo, identity) = sqrt(intra), so two photos of one person have cosine ~intra
+        return mix([(intra, identities), (1.0 - intra, unit(self.rng, len(identities), self.dim))])
+
+
+def synthetic_gallery(model, members, photos, intra):
+    identities = model.identities(members)
+    rows = model.photos(np.repeat(identities, photos, axis=0), intra)
+    member_ids = [f"member-{i}" for i in np.repeat(np.arange(members), photos)]
+    return identities, rows, build_gallery_matrix(rows, member_ids)
+
+
+def synthetic_queries(model, rng, identities, count, intra, stranger_rate):
+    truth = rng.integers(0, len(identities), size=count)
+    strangers = rng.random(count) < stranger_rate
+    sources = identities[truth].copy()
+    sources[strangers] = model.identities(int(strangers.sum()))
+    truth[strangers] = -1
+    return model.photos(sources, intra), truth
+
+
+def similarity_report(rows, photos):
+    """Measured mean cosine between photos of the same / different members."""
+    sims = rows @ rows.T
+    owner = np.arange(len(rows)) // photos
+    same = owner[:, None] == owner[None, :]
+    np.fill_diagonal(same, False)
+    different = owner[:, None] != owner[None, :]
+    return {"same_member": round(float(sims[same].mean()), 3),
+            "different_member": round(float(sims[different].mean()), 3),
+            "different_member_p99": round(float(np.percentile(sims[different], 99)), 3)}
+
+
+def timed(gallery, queries, prefilter):
+    out = []
+    start = time.perf_counter()
+    for q in queries:
+        out.append(match_members(gallery, q, prefilter))
+    return np.stack(out), (time.perf_counter() - start) / len(queries) * 1000.0
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--members", type=int, default=200)
+    parser.add_argument("--photos", type=int, default=10, help="Photos per member")
+    parser.add_argument("--dim", type=int, default=512)
+    parser.add_argument("--queries", type=int, default=500)
+    parser.add_argument("--intra-similarity", type=float, default=0.7, help="Cosine between photos of one person")
+    parser.add_argument("--inter-similarity", type=float, default=0.2, help="Cosine between unrelated identities")
+    parser.add_argument("--cluster-similarity", type=float, default=0.6, help="Cosine between look-alikes")
+    parser.add_argument("--cluster-size", type=int, default=4, help="Identities per look-alike cluster")
+    parser.add_argument("--stranger-rate", type=float, default=0.1)
+    parser.add_argument("--threshold", type=float, default=0.40)
+    parser.add_argument("--top-k", type=int, nargs="+", default=[4, 8, 16])
+    parser.add_argument("--fallback-distance", type=float, default=0.7)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+    if not 0.0 <= args.inter_similarity <= args.cluster_similarity <= 1.0:
+        parser.error("expected 0 <= --inter-similarity <= --cluster-similarity <= 1")
+
+    rng = np.random.default_rng(args.seed)
+    model = IdentityModel(rng, args.dim, args.inter_similarity, args.cluster_similarity, args.cluster_size)
+    identities, rows, gallery = synthetic_gallery(model, args.members, args.photos, args.intra_similarity)
+    queries, truth = synthetic_queries(model, rng, identities, args.queries, args.intra_similarity,
+                                       args.stranger_rate)
+    known = truth >= 0
+
+    exhaustive, exhaustive_ms = timed(gallery, queries, None)
+    best = exhaustive.argmin(axis=1)
+    decisions = exhaustive.min(axis=1) < args.threshold
+
+    report = {
+        "members": args.members,
+        "photos_per_member": args.photos,
+        "queries": args.queries,
+        "similarity": similarity_report(rows, args.photos),
+        "exhaustive_identity_accuracy": round(float((best[known] == truth[known]).mean()), 4),
+        "exhaustive_ms_per_query": round(exhaustive_ms, 4),
+        "prefilter": [],
+    }
+    for k in args.top_k:
+        config = PrefilterConfig(top_k=k, min_members=0, fallback_distance=args.fallback_distance)
+        filtered, filtered_ms = timed(gallery, queries, config)
+        fallbacks = int(np.isfinite(filtered).all(axis=1).sum())
+        report["prefilter"].append({
+            "top_k": k,
+            "recall_at_1": round(float((filtered.argmin(axis=1) == best).mean()), 4),
+            "identity_accuracy": round(float((filtered.argmin(axis=1)[known] == truth[known]).mean()), 4),
+            "decision_agreement": round(float(((filtered.min(axis=1) < args.threshold) == decisions).mean()), 4),
+            "fallback_rate": round(fallbacks / args.queries, 4),
+            "ms_per_query": round(filtered_ms, 4),
+            "speedup": round(exhaustive_ms / filtered_ms, 2) if filtered_ms else None,
+        })
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,277 @@
+"""
+End-to-end Recognition Benchmark
+recognize_face latency percentiles and throughput at fixed concurrency.
+
+Synthetic patients are built from face images: by default the siamese
+module's generate_sample_face_dataset (legacy archive), or --faces, a
+directory with one sub-directory of photos per identity. Each family member
+gets --photos gallery photos and keeps one more as a query. Rosters and
+photos are served by a local Supabase stand-in, so the app runs its real
+path: roster fetch, photo download, enrollment into a temporary gallery,
+decode, detection, embedding and matching.
+
+Each --concurrency level sends --requests uploads (JPEG bytes through the
+same decode + recognize path as POST /v1/recognize) from that many threads.
+A cold pass (first request per patient) is reported separately. The
+workload re-sends the same few query JPEGs, so the result cache is off
+(RESULT_CACHE_TTL=0) unless --result-cache is given; with it, most
+requests after the first are cache hits and measure the cache. Cache hit
+rates are deltas of the app's own counters over each level; CPU is process
+time over wall time, RSS is read from /proc. The stand-in's fault options
+(--storage-latency, --error-rate, --bandwidth-kbps...) apply to the whole
+run, and --save-fixtures writes the generated patients for
+supabase_standin.py --fixtures.
+
+Note: generated images are coloured shapes, not faces, so most results are
+"no_face" and the run measures detection misses, not matching; the report
+carries a warning (also printed to stderr) when that happens. Use --faces
+with real photos to exercise matching.
+
+Usage:
+    python benchmarks/bench_recognition.py --patients 4 --family-size 6 --photos 3 --concurrency 1 4 8
+"""
+
+import argparse
+import json
+import os
+import random
+import resource
+import sys
+import tempfile
+import threading
+import time
+import uuid
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+import cv2
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from supabase_standin import SupabaseStandIn, add_fault_arguments, faults_from_args  # noqa: E402
+
+REPO_ROOT = Path(__file__).resolve().parents[2]
+LEGACY_MODELS = REPO_ROOT / "_legacy_archive" / "root" / "models"
+IMAGE_SUFFIXES = {".jpg", ".jpeg", ".png", ".webp"}
+RELATIONSHIPS = ["Mother", "Father", "Daughter", "Son", "Sister", "Brother", "Grandmother", "Grandfather", "Friend"]
+
+
+# --- synthetic patients ---
+
+def load_identities(faces_dir, family_size, images_per_identity, work_dir):
+    """{identity: [image paths]} from --faces or generate_sample_face_dataset."""
+    if faces_dir:
+        root = Path(faces_dir)
+        identities = {}
+        for child in sorted(root.iterdir()):
+            if child.is_dir():
+                paths = sorted(str(p) for p in child.iterdir() if p.suffix.lower() in IMAGE_SUFFIXES)
+                if len(paths) >= 2:
+                    identities[child.name] = paths
+        if not identities:
+            raise SystemExit(f"{faces_dir}: expected sub-directories with 2+ images each")
+        return identities
+
+    sys.path.insert(0, str(LEGACY_MODELS))
+    from siamese.dataset import generate_sample_face_dataset
+
+    return generate_sample_face_dataset(num_identities=family_size, images_per_identity=images_per_identity,
+                                        output_dir=work_dir)
+
+
+def encode_jpeg(path):
+    image = cv2.imread(path)
+    ok, buffer = cv2.imencode(".jpg", image, [cv2.IMWRITE_JPEG_QUALITY, 90])
+    return buffer.tobytes() if ok else Path(path).read_bytes()
+
+
+def build_patients(standin, identities, patients, family_size, photos):
+    """Register rosters + photos with the stand-in; returns [(patient_id, [(member_id, query_jpeg)])]."""
+    names = sorted(identities)
+    built, reused = [], family_size > len(names)
+    for _ in range(patients):
+        patient_id = str(uuid.uuid4())
+        members, rows = [], []
+        for k in range(family_size):
+            name = names[k % len(names)]
+            paths = identities[name]
+            member_id = str(uuid.uuid4())
+            urls = [standin.add_object("family-photos", f"{patient_id}/{member_id}/{j}.jpg", encode_jpeg(path))
+                    for j, path in enumerate(paths[:photos])]
+            rows.append({
+                "id": member_id, "patientId": patient_id, "name": f"{name} {k}",
+                "relationship": RELATIONSHIPS[k % len(RELATIONSHIPS)], "photoUrls": urls,
+                "updatedAt": time.strftime("%Y-%m-%dT%H:%M:%S+00:00", time.gmtime()),
+            })
+            members.append((member_id, encode_jpeg(paths[min(photos, len(paths) - 1)])))
+        standin.add_rows("FamilyMember", rows)
+        built.append((patient_id, members))
+    return built, reused
+
+
+# --- measurement ---
+
+def rss_mb():
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return round(int(line.split()[1]) / 1024.0, 1)
+    except OSError:
+        pass
+    return None
+
+
+def cpu_seconds():
+    usage = resource.getrusage(resource.RUSAGE_SELF)
+    return usage.ru_utime + usage.ru_stime
+
+
+def percentiles_ms(samples):
+    if not samples:
+        return {}
+    values = np.asarray(samples) * 1000.0
+    summary = {f"p{q}": round(float(np.percentile(values, q)), 3) for q in (50, 90, 95, 99)}
+    summary["mean"] = round(float(values.mean()), 3)
+    summary["max"] = round(float(values.max()), 3)
+    return summary
+
+
+def cache_counters(app):
+    """Hit/miss counters of every cache the app keeps."""
+    stats = app.get_stats()
+    counters = {
+        "result": (stats["result_cache"]["hits"], stats["result_cache"]["misses"]),
+        "roster": (stats["roster_cache"]["hits"], stats["roster_cache"]["misses"]),
+        "gallery_matrix": (stats["matching"]["hits"], stats["matching"]["misses"]),
+    }
+    gallery = {labels["outcome"]: value for labels, value in next(iter(app.CACHE_EVENTS.collect()))[3]
+               if labels["cache"] == "gallery_embedding"}
+    counters["gallery_embedding"] = (gallery.get("hit", 0), gallery.get("miss", 0))
+    return counters
+
+
+def hit_rates(before, after):
+    rates = {}
+    for cache, (hits, misses) in after.items():
+        hits -= before[cache][0]
+        misses -= before[cache][1]
+        lookups = hits + misses
+        rates[cache] = {"hits": hits, "misses": misses,
+                        "hit_rate": round(hits / lookups, 3) if lookups else None}
+    return rates
+
+
+def run_level(app, workload, concurrency, requests):
+    """Send `requests` recognitions from `concurrency` threads; one report row."""
+    latencies, outcomes, lock = [], Counter(), threading.Lock()
+
+    def one(item):
+        patient_id, jpeg = item
+        start = time.perf_counter()
+        result = app.recognize_upload(app.recognize_face, jpeg, patient_id, include_timings=False)
+        elapsed = time.perf_counter() - start
+        outcome = "decode_error" if result is None else (result.get("error_type") or
+                                                         ("match" if result.get("match") else "error"))
+        with lock:
+            latencies.append(elapsed)
+            outcomes[outcome] += 1
+
+    caches_before, cpu_before = cache_counters(app), cpu_seconds()
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        list(pool.map(one, workload[:requests]))
+    wall = time.perf_counter() - start
+    return {
+        "concurrency": concurrency,
+        "requests": len(latencies),
+        "wall_s": round(wall, 3),
+        "throughput_per_s": round(len(latencies) / wall, 2) if wall else None,
+        "latency_ms": percentiles_ms(latencies),
+        "outcomes": dict(outcomes),
+        "cache": hit_rates(caches_before, cache_counters(app)),
+        "cpu_percent": round((cpu_seconds() - cpu_before) / wall * 100.0, 1) if wall else None,
+        "rss_mb": rss_mb(),
+    }
+
+
+def workload_warnings(levels, max_no_face=0.5):
+    """Reasons the measured latencies may not mean what they seem to."""
+    outcomes = Counter()
+    for level in levels:
+        outcomes.update(level["outcomes"])
+    total = sum(outcomes.values())
+    warnings = []
+    if total and outcomes["no_face"] / total > max_no_face:
+        warnings.append(f"{outcomes['no_face']}/{total} results were no_face: the run measures detection "
+                        f"misses, not matching (use --faces with real photos)")
+    return warnings
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--patients", type=int, default=4)
+    parser.add_argument("--family-size", type=int, default=6, help="Members per patient")
+    parser.add_argument("--photos", type=int, default=3, help="Gallery photos per member")
+    parser.add_argument("--faces", help="Directory of <identity>/<images> (generated if omitted)")
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 4, 8])
+    parser.add_argument("--requests", type=int, default=200, help="Recognitions per concurrency level")
+    parser.add_argument("--result-cache", action="store_true",
+                        help="Keep the app's result cache on (repeated queries become cache hits)")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--out", help="Also write the report to this file")
+    parser.add_argument("--save-fixtures", help="Write the generated rosters and photos to this directory")
+    add_fault_arguments(parser)
+    args = parser.parse_args()
+    random.seed(args.seed)
+
+    work_dir = tempfile.mkdtemp(prefix="memora-bench-")
+    standin = SupabaseStandIn(faults=faults_from_args(args), seed=args.fault_seed).start()
+    identities = load_identities(args.faces, args.family_size, args.photos + 1, work_dir)
+    patients, reused = build_patients(standin, identities, args.patients, args.family_size, args.photos)
+    if args.save_fixtures:
+        standin.save_fixtures(args.save_fixtures)
+
+    # The app reads its configuration at import time
+    os.environ.update({
+        "SUPABASE_URL": standin.url, "SUPABASE_KEY": "bench",
+        "GALLERY_DIR": os.path.join(work_dir, "gallery"), "ENROLLMENT_POLL_SECONDS": "0",
+    })
+    if not args.result_cache:
+        os.environ["RESULT_CACHE_TTL"] = "0"
+    rss_before_import = rss_mb()
+    import app_optimized as app
+
+    report = {
+        "config": {**vars(args), "identities": len(identities), "identities_reused": reused,
+                   "detector": app.DETECTOR, "embedder_backend": app.STARTUP.notes.get("embedder_backend"),
+                   "gallery_quantization": app.GALLERY_QUANTIZATION, "cpu_count": os.cpu_count()},
+        "startup": app.STARTUP.snapshot(),
+        "rss_mb": {"before_import": rss_before_import, "after_import": rss_mb()},
+    }
+
+    queries = [(patient_id, jpeg) for patient_id, members in patients for _, jpeg in members]
+    cold = [(patient_id, members[0][1]) for patient_id, members in patients]
+    report["cold"] = run_level(app, cold, 1, len(cold))
+
+    report["levels"] = []
+    for concurrency in args.concurrency:
+        workload = [random.choice(queries) for _ in range(args.requests)]
+        report["levels"].append(run_level(app, workload, concurrency, args.requests))
+    report["warnings"] = workload_warnings(report["levels"])
+    for warning in report["warnings"]:
+        print(f"WARNING: {warning}", file=sys.stderr)
+    report["rss_mb"]["peak"] = round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024.0, 1)
+    report["supabase_standin"] = {"faults": standin.faults(), **standin.counters}
+    standin.stop()
+
+    text = json.dumps(report, indent=2)
+    if args.out:
+        Path(args.out).write_text(text + "\n")
+    print(text)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,138 @@
+"""
+Tracing Overhead Benchmark
+Cost of stage() spans per simulated request, with sampling off and on.
+
+A simulated request is one root trace with the pipeline's usual shape: a
+roster span, a handful of photo downloads recorded after the fact, and the
+decode / detection / embedding / matching stages. The stage bodies are
+empty, so the numbers are pure bookkeeping cost (histogram, timing
+breakdown, span). Three modes are compared:
+
+    baseline    the same call tree as plain function calls
+    off         TRACE_SAMPLE_RATE=0 (the default): metrics only, no spans
+    sampled     every request traced and exported to a temporary JSONL file
+
+"off" still pays for the stage histograms; noop_span_ns isolates what
+tracing itself adds to an unsampled request (one span() call).
+
+In "sampled" mode the exporter is flushed every time its queue could fill,
+and the flushes are timed with the run, so the numbers include writing every
+span. Spans the exporter still dropped are reported; any drop is a warning,
+since the overhead then leaves out part of the export cost.
+
+Usage:
+    python benchmarks/bench_tracing.py --requests 20000 --photos 8
+"""
+
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+import tracing  # noqa: E402
+from metrics import collect_timings, observe_stage, stage  # noqa: E402
+from tracing import TRACER, span  # noqa: E402
+
+STAGES = ("decode", "detection", "embedding", "matching")
+
+
+def _noop():
+    pass
+
+
+def baseline_request(photos):
+    _noop()
+    for _ in range(photos):
+        _noop()
+    for _ in STAGES:
+        _noop()
+
+
+def traced_request(photos):
+    with collect_timings(), TRACER.trace("recognize_face", patientId="bench", mode="single"):
+        with span("roster", cache="hit"):
+            pass
+        for i in range(photos):
+            observe_stage("photo_download", 0.001, memberId=str(i), cache="miss")
+        for name in STAGES:
+            with stage(name):
+                pass
+
+
+def noop_span_ns(calls):
+    """Per-call cost of span() outside any trace, minus an empty loop."""
+    start = time.perf_counter()
+    for _ in range(calls):
+        pass
+    empty = time.perf_counter() - start
+    start = time.perf_counter()
+    for _ in range(calls):
+        with span("detection"):
+            pass
+    return round(max(0.0, time.perf_counter() - start - empty) / calls * 1e9, 1)
+
+
+def run(fn, requests, photos, flush_every=None):
+    """Seconds for `requests` calls; with flush_every, the exporter is drained that often (timed)."""
+    for _ in range(min(requests, 500)):  # warm-up
+        fn(photos)
+    TRACER.exporter.flush()
+    start = time.perf_counter()
+    for i in range(requests):
+        fn(photos)
+        if flush_every and (i + 1) % flush_every == 0:
+            TRACER.exporter.flush()
+    if flush_every:
+        TRACER.exporter.flush()
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=20000)
+    parser.add_argument("--photos", type=int, default=8, help="Photo downloads per request")
+    args = parser.parse_args()
+
+    spans_per_request = 2 + args.photos + len(STAGES)
+    report = {"requests": args.requests, "spans_per_request": spans_per_request, "modes": {}}
+
+    with tempfile.TemporaryDirectory() as tmp:
+        out_path = os.path.join(tmp, "spans.jsonl")
+        modes = [("baseline", baseline_request, None), ("off", traced_request, 0.0),
+                 ("sampled", traced_request, 1.0)]
+        baseline_s = None
+        for mode, fn, rate in modes:
+            flush_every = None
+            if rate is not None:
+                tracing.configure(rate, "jsonl:" + out_path)
+                if rate > 0:
+                    # Half a queue per flush leaves room for the exporter thread to lag
+                    flush_every = max(1, TRACER.exporter.max_queue // (2 * spans_per_request))
+            elapsed = run(fn, args.requests, args.photos, flush_every)
+            TRACER.exporter.flush()
+            baseline_s = elapsed if baseline_s is None else baseline_s
+            per_request_us = elapsed / args.requests * 1e6
+            report["modes"][mode] = {
+                "us_per_request": round(per_request_us, 3),
+                "ns_per_span": round(per_request_us * 1000.0 / spans_per_request, 1),
+                "overhead_us_per_request": round((elapsed - baseline_s) / args.requests * 1e6, 3),
+            }
+        report["exported_spans"] = sum(1 for _ in open(out_path)) if os.path.exists(out_path) else 0
+        report["exporter"] = TRACER.exporter.stats
+        report["dropped_spans"] = TRACER.exporter.stats.get("dropped", 0)
+        tracing.configure(0.0, "")
+    report["noop_span_ns"] = noop_span_ns(args.requests * spans_per_request)
+
+    print(json.dumps(report, indent=2))
+    if report["dropped_spans"]:
+        print(f"WARNING: the exporter dropped {report['dropped_spans']} spans; the sampled overhead "
+              f"does not include exporting them", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
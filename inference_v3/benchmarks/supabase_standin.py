@@ -0,0 +1,376 @@
+"""
+Supabase Stand-in
+Local HTTP server answering the Supabase calls the inference Space makes,
+with injectable latency, timeouts, 5xx errors and bandwidth caps.
+
+    GET /rest/v1/<table>?select=...&<column>=eq.<value>&order=<column>.asc&limit=N
+    GET /storage/v1/object/public/<bucket>/<path>      (ETag / If-None-Match aware)
+
+Rows and objects come from fixtures, either added in-process or loaded from
+a directory:
+
+    fixtures/rest/FamilyMember.json          list of rows
+    fixtures/storage/<bucket>/<path>         public objects
+
+"{SUPABASE_URL}" inside row values is replaced with the server's own URL,
+so fixture photoUrls can point back at it. Point the app at the server
+with SUPABASE_URL=<url> (any SUPABASE_KEY).
+
+Faults are drawn per request, separately for "rest" and "storage"
+(FaultProfile). Latency specs are in milliseconds:
+
+    fixed:50   uniform:20,200   normal:80,20   lognormal:60,0.6 (median, sigma)   exponential:40
+
+A timeout holds the request for stall_seconds and then drops the connection
+without a response; the bandwidth cap paces the body. Faults can also be
+changed while serving: POST /_standin/faults {"storage": {"error_rate": 0.1}}.
+
+Usage:
+    python benchmarks/supabase_standin.py --fixtures fixtures/ --port 54321 \\
+        --storage-latency lognormal:80,0.5 --error-rate 0.02 --bandwidth-kbps 4000
+
+    standin = SupabaseStandIn(faults={"storage": FaultProfile(latency="fixed:30")}).start()
+    url = standin.add_object("photos", "p1/m1/0.jpg", jpeg_bytes)
+    standin.add_rows("FamilyMember", [{"id": "m1", "patientId": "p1", "photoUrls": [url], ...}])
+"""
+
+import argparse
+import hashlib
+import json
+import math
+import mimetypes
+import random
+import threading
+import time
+from dataclasses import asdict, dataclass
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Tuple
+from urllib.parse import parse_qsl, quote, unquote, urlsplit
+
+REST_PREFIX = "/rest/v1/"
+STORAGE_PREFIX = "/storage/v1/object/public/"
+CONTROL_PATH = "/_standin/faults"
+URL_PLACEHOLDER = "{SUPABASE_URL}"
+KINDS = ("rest", "storage")
+CHUNK_BYTES = 16 * 1024
+
+
+@dataclass
+class FaultProfile:
+    latency: str = "none"           # distribution spec, milliseconds
+    error_rate: float = 0.0         # fraction answered with a 5xx
+    error_statuses: Tuple[int, ...] = (500, 502, 503)
+    timeout_rate: float = 0.0       # fraction stalled, then dropped without a response
+    stall_seconds: float = 30.0
+    bandwidth_kbps: float = 0.0     # response body pacing (0 = unlimited)
+
+
+def latency_sampler(spec: str, rng: random.Random) -> Callable[[], float]:
+    """Seconds-returning sampler for a "kind:args" millisecond spec."""
+    kind, _, args = (spec or "none").partition(":")
+    values = [float(v) for v in args.split(",") if v.strip()]
+    if kind == "none":
+        draw = lambda: 0.0  # noqa: E731
+    elif kind == "fixed":
+        draw = lambda: values[0]  # noqa: E731
+    elif kind == "uniform":
+        draw = lambda: rng.uniform(values[0], values[1])  # noqa: E731
+    elif kind == "normal":
+        draw = lambda: rng.gauss(values[0], values[1])  # noqa: E731
+    elif kind == "lognormal":
+        draw = lambda: values[0] * math.exp(values[1] * rng.gauss(0.0, 1.0))  # noqa: E731
+    elif kind == "exponential":
+        draw = lambda: rng.expovariate(1.0 / values[0])  # noqa: E731
+    else:
+        raise ValueError(f"Unknown latency distribution {spec!r}")
+    return lambda: max(0.0, draw()) / 1000.0
+
+
+def _matches(row: Dict, column: str, condition: str) -> bool:
+    op, _, value = condition.partition(".")
+    field = row.get(column)
+    if op == "eq":
+        return str(field) == value
+    if op == "neq":
+        return str(field) != value
+    if op in ("gt", "gte", "lt", "lte"):
+        if field is None:
+            return False
+        field = str(field)
+        return {"gt": field > value, "gte": field >= value, "lt": field < value, "lte": field <= value}[op]
+    if op == "in":
+        return str(field) in value.strip("()").split(",")
+    raise ValueError(f"Unsupported filter operator {op!r}")
+
+
+def query_rows(rows: List[Dict], params: List[Tuple[str, str]]) -> List[Dict]:
+    """Apply the PostgREST subset the app uses: filters, select, order, limit."""
+    select, order, limit = "*", None, None
+    for key, value in params:
+        if key == "select":
+            select = value
+        elif key == "order":
+            order = value
+        elif key == "limit":
+            limit = int(value)
+        else:
+            rows = [row for row in rows if _matches(row, key, value)]
+    if order:
+        column, _, direction = order.partition(".")
+        rows = sorted(rows, key=lambda row: str(row.get(column) or ""), reverse=direction.startswith("desc"))
+    if limit is not None:
+        rows = rows[:limit]
+    if select != "*":
+        columns = [c.strip() for c in select.split(",")]
+        rows = [{c: row.get(c) for c in columns} for row in rows]
+    return rows
+
+
+class SupabaseStandIn:
+    """Threaded fixture server for Supabase REST + public storage."""
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 0, faults: Optional[Dict[str, FaultProfile]] = None,
+                 seed: Optional[int] = None):
+        self._lock = threading.Lock()
+        self._tables: Dict[str, List[Dict]] = {}
+        self._objects: Dict[str, Tuple[bytes, str, str]] = {}   # path -> (body, content type, etag)
+        self._rng = random.Random(seed)
+        self._faults: Dict[str, FaultProfile] = {}
+        self._latency: Dict[str, Callable[[], float]] = {}
+        for kind in KINDS:
+            self.set_faults(kind, (faults or {}).get(kind) or FaultProfile())
+        self.counters = {"rest": 0, "storage": 0, "not_modified": 0, "not_found": 0,
+                         "injected_errors": 0, "injected_timeouts": 0, "bytes_sent": 0}
+        self._server = ThreadingHTTPServer((host, port), self._handler())
+        self._server.daemon_threads = True
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    # --- fixtures ---
+
+    def add_rows(self, table: str, rows: List[Dict]) -> None:
+        rows = json.loads(json.dumps(rows).replace(URL_PLACEHOLDER, self.url))
+        with self._lock:
+            self._tables.setdefault(table, []).extend(rows)
+
+    def add_object(self, bucket: str, path: str, body: bytes, content_type: str = "image/jpeg") -> str:
+        """Store an object; returns its public URL."""
+        etag = '"' + hashlib.sha1(body).hexdigest() + '"'
+        with self._lock:
+            self._objects[f"{bucket}/{path}"] = (body, content_type, etag)
+        return f"{self.url}{STORAGE_PREFIX}{bucket}/{quote(path)}"
+
+    def load_fixtures(self, directory: str) -> "SupabaseStandIn":
+        """Load rest/<table>.json and storage/<bucket>/<path> from a fixtures directory."""
+        root = Path(directory)
+        for table_file in sorted((root / "rest").glob("*.json")):
+            self.add_rows(table_file.stem, json.loads(table_file.read_text()))
+        storage = root / "storage"
+        for path in sorted(p for p in storage.rglob("*") if p.is_file()):
+            bucket, _, key = path.relative_to(storage).as_posix().partition("/")
+            self.add_object(bucket, key, path.read_bytes(),
+                            mimetypes.guess_type(path.name)[0] or "application/octet-stream")
+        return self
+
+    def save_fixtures(self, directory: str) -> None:
+        """Write the current rows and objects in load_fixtures() layout (URLs as the placeholder)."""
+        root = Path(directory)
+        (root / "rest").mkdir(parents=True, exist_ok=True)
+        with self._lock:
+            tables = {name: list(rows) for name, rows in self._tables.items()}
+            objects = dict(self._objects)
+        for name, rows in tables.items():
+            text = json.dumps(rows, indent=2).replace(self.url, URL_PLACEHOLDER)
+            (root / "rest" / f"{name}.json").write_text(text + "\n")
+        for key, (body, _, _) in objects.items():
+            target = root / "storage" / key
+            target.parent.mkdir(parents=True, exist_ok=True)
+            target.write_bytes(body)
+
+    # --- faults ---
+
+    def set_faults(self, kind: str, profile: FaultProfile) -> None:
+        if kind not in KINDS:
+            raise ValueError(f"Unknown fault target {kind!r}; expected one of {KINDS}")
+        sampler = latency_sampler(profile.latency, self._rng)
+        with self._lock:
+            self._faults[kind] = profile
+            self._latency[kind] = sampler
+
+    def faults(self) -> Dict[str, Dict]:
+        with self._lock:
+            return {kind: asdict(profile) for kind, profile in self._faults.items()}
+
+    def _inject(self, handler, kind: str) -> bool:
+        """Sleep the drawn latency; True if the request was consumed by a fault."""
+        with self._lock:
+            profile, delay = self._faults[kind], self._latency[kind]()
+            roll = self._rng.random()
+            status = self._rng.choice(profile.error_statuses) if profile.error_statuses else 500
+        if delay:
+            time.sleep(delay)
+        if roll < profile.timeout_rate:
+            with self._lock:
+                self.counters["injected_timeouts"] += 1
+            time.sleep(profile.stall_seconds)
+            handler.close_connection = True
+            return True
+        if roll < profile.timeout_rate + profile.error_rate:
+            with self._lock:
+                self.counters["injected_errors"] += 1
+            self._send(handler, status, json.dumps({"message": "injected failure"}).encode(),
+                       "application/json", kind=kind)
+            return True
+        return False
+
+    # --- serving ---
+
+    def start(self) -> "SupabaseStandIn":
+        self._thread = threading.Thread(target=self._server.serve_forever, name="supabase-standin", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self._server.shutdown()
+        self._server.server_close()
+
+    def _handler(self):
+        standin = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"  # keep-alive, like the real API
+
+            def do_GET(self):
+                parts = urlsplit(self.path)
+                if parts.path.startswith(REST_PREFIX):
+                    if not standin._inject(self, "rest"):
+                        standin._serve_rest(self, parts.path[len(REST_PREFIX):], parse_qsl(parts.query))
+                elif parts.path.startswith(STORAGE_PREFIX):
+                    if not standin._inject(self, "storage"):
+                        standin._serve_object(self, unquote(parts.path[len(STORAGE_PREFIX):]))
+                elif parts.path == CONTROL_PATH:
+                    standin._send(self, 200, json.dumps(standin.faults()).encode(), "application/json")
+                else:
+                    standin._send(self, 404, b'{"message":"not found"}', "application/json")
+
+            def do_POST(self):
+                if urlsplit(self.path).path != CONTROL_PATH:
+                    standin._send(self, 404, b'{"message":"not found"}', "application/json")
+                    return
+                try:
+                    body = json.loads(self.rfile.read(int(self.headers.get("Content-Length") or 0)) or b"{}")
+                    for kind, overrides in body.items():
+                        current = asdict(standin._faults[kind]) if kind in KINDS else {}
+                        standin.set_faults(kind, FaultProfile(**{**current, **overrides}))
+                except (KeyError, TypeError, ValueError) as e:
+                    standin._send(self, 400, json.dumps({"message": str(e)}).encode(), "application/json")
+                    return
+                standin._send(self, 200, json.dumps(standin.faults()).encode(), "application/json")
+
+            def log_message(self, fmt, *args):
+                pass
+
+        return Handler
+
+    def _send(self, handler, status: int, body: bytes, content_type: str, headers: Optional[Dict] = None,
+              kind: Optional[str] = None) -> None:
+        handler.send_response(status)
+        handler.send_header("Content-Type", content_type)
+        handler.send_header("Content-Length", str(len(body)))
+        for key, value in (headers or {}).items():
+            handler.send_header(key, value)
+        handler.end_headers()
+        if not body:
+            return
+        bandwidth = self._faults[kind].bandwidth_kbps if kind else 0.0
+        if bandwidth <= 0:
+            handler.wfile.write(body)
+        else:
+            bytes_per_second = bandwidth * 1000.0 / 8.0
+            for offset in range(0, len(body), CHUNK_BYTES):
+                chunk = body[offset:offset + CHUNK_BYTES]
+                handler.wfile.write(chunk)
+                time.sleep(len(chunk) / bytes_per_second)
+        with self._lock:
+            self.counters["bytes_sent"] += len(body)
+
+    def _serve_rest(self, handler, table: str, params: List[Tuple[str, str]]) -> None:
+        with self._lock:
+            self.counters["rest"] += 1
+            rows = list(self._tables.get(table, []))
+        try:
+            body = json.dumps(query_rows(rows, params)).encode()
+        except ValueError as e:
+            self._send(handler, 400, json.dumps({"message": str(e)}).encode(), "application/json")
+            return
+        self._send(handler, 200, body, "application/json", kind="rest")
+
+    def _serve_object(self, handler, key: str) -> None:
+        with self._lock:
+            self.counters["storage"] += 1
+            entry = self._objects.get(key)
+            if entry is None:
+                self.counters["not_found"] += 1
+            elif handler.headers.get("If-None-Match") == entry[2]:
+                self.counters["not_modified"] += 1
+        if entry is None:
+            self._send(handler, 404, b'{"message":"Object not found"}', "application/json")
+            return
+        body, content_type, etag = entry
+        if handler.headers.get("If-None-Match") == etag:
+            self._send(handler, 304, b"", content_type, {"ETag": etag})
+            return
+        self._send(handler, 200, body, content_type, {"ETag": etag}, kind="storage")
+
+
+# --- command line (also used by bench_recognition.py) ---
+
+def add_fault_arguments(parser: argparse.ArgumentParser) -> None:
+    group = parser.add_argument_group("Supabase stand-in faults")
+    group.add_argument("--latency", default="none", help="Latency spec for every request (ms), e.g. lognormal:60,0.6")
+    group.add_argument("--rest-latency", help="Overrides --latency for /rest/v1")
+    group.add_argument("--storage-latency", help="Overrides --latency for storage objects")
+    group.add_argument("--error-rate", type=float, default=0.0, help="Fraction of requests answered 5xx")
+    group.add_argument("--timeout-rate", type=float, default=0.0, help="Fraction stalled and dropped")
+    group.add_argument("--stall-seconds", type=float, default=30.0)
+    group.add_argument("--bandwidth-kbps", type=float, default=0.0, help="Storage body pacing (0 = unlimited)")
+    group.add_argument("--fault-seed", type=int)
+
+
+def faults_from_args(args: argparse.Namespace) -> Dict[str, FaultProfile]:
+    common = {"error_rate": args.error_rate, "timeout_rate": args.timeout_rate,
+              "stall_seconds": args.stall_seconds}
+    return {
+        "rest": FaultProfile(latency=args.rest_latency or args.latency, **common),
+        "storage": FaultProfile(latency=args.storage_latency or args.latency,
+                                bandwidth_kbps=args.bandwidth_kbps, **common),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--fixtures", help="Directory with rest/ and storage/ (empty server if omitted)")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=54321)
+    add_fault_arguments(parser)
+    args = parser.parse_args()
+
+    standin = SupabaseStandIn(args.host, args.port, faults=faults_from_args(args), seed=args.fault_seed)
+    if args.fixtures:
+        standin.load_fixtures(args.fixtures)
+    print(f"SUPABASE_URL={standin.url}")
+    print(json.dumps(standin.faults()))
+    standin.start()
+    try:
+        standin._thread.join()
+    except KeyboardInterrupt:
+        standin.stop()
+
+
+if __name__ == "__main__":
+    main()
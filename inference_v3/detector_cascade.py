@@ -0,0 +1,222 @@
+"""
+Memora Detector Cascade
+Fast face detection on a downscaled proxy, with a heavier detector only when
+the fast one comes up empty or unsure.
+
+Stage 1 runs OpenCV's YuNet (cv2.FaceDetectorYN, when its ONNX model is
+available) or the bundled Haar cascade on a proxy whose long side is about
+proxy_side pixels. Boxes and eye landmarks are scaled back, and the aligned
+crop is cut from the full-resolution image, so the embedder still sees full
+detail. If stage 1 finds nothing, or its best score is under min_confidence,
+stage 2 runs the configured DeepFace backend on the full image. If stage 2
+finds nothing (or raises), the low-confidence stage 1 faces are kept.
+
+Per-stage call counts, hit rates and latency are kept for the stats endpoint.
+"""
+
+import os
+import threading
+import time
+from typing import Callable, Dict, List, Optional
+
+import cv2
+import numpy as np
+
+from face_pipeline import FaceResult
+
+
+class StageStats:
+    """Calls, hits and latency of one cascade stage."""
+
+    def __init__(self):
+        self.calls = 0
+        self.hits = 0
+        self.total_ms = 0.0
+        self.max_ms = 0.0
+
+    def record(self, hit: bool, elapsed_ms: float) -> None:
+        self.calls += 1
+        self.hits += int(hit)
+        self.total_ms += elapsed_ms
+        self.max_ms = max(self.max_ms, elapsed_ms)
+
+    def snapshot(self) -> Dict:
+        return {
+            "calls": self.calls,
+            "hits": self.hits,
+            "hit_rate": round(self.hits / self.calls, 3) if self.calls else 0.0,
+            "mean_ms": round(self.total_ms / self.calls, 3) if self.calls else 0.0,
+            "max_ms": round(self.max_ms, 3),
+        }
+
+
+def aligned_crop(image: np.ndarray, bbox: Dict[str, int], left_eye=None, right_eye=None) -> np.ndarray:
+    """
+    Crop a face from the full image, rotated so the eyes are level.
+
+    Returns RGB float32 in [0, 1], the same form DeepFace.extract_faces gives.
+    """
+    height, width = image.shape[:2]
+    x, y, w, h = bbox['x'], bbox['y'], bbox['w'], bbox['h']
+    if left_eye is not None and right_eye is not None:
+        angle = float(np.degrees(np.arctan2(right_eye[1] - left_eye[1], right_eye[0] - left_eye[0])))
+        # Rotate only a padded window around the face, not the whole frame
+        pad = max(w, h) // 2
+        x0, y0 = max(0, x - pad), max(0, y - pad)
+        x1, y1 = min(width, x + w + pad), min(height, y + h + pad)
+        window = image[y0:y1, x0:x1]
+        center = (x + w / 2.0 - x0, y + h / 2.0 - y0)
+        rotation = cv2.getRotationMatrix2D(center, angle, 1.0)
+        window = cv2.warpAffine(window, rotation, (window.shape[1], window.shape[0]))
+        face = window[max(0, y - y0):y - y0 + h, max(0, x - x0):x - x0 + w]
+    else:
+        face = image[max(0, y):y + h, max(0, x):x + w]
+    face = face.astype(np.float32)
+    return face / 255.0 if image.dtype == np.uint8 else face
+
+
+class DetectorCascade:
+    """Two-stage face detector (fast proxy stage, heavy fallback)."""
+
+    def __init__(self, heavy_fn: Callable[[np.ndarray], List[FaceResult]], fast: str = "yunet",
+                 yunet_model_path: Optional[str] = None, proxy_side: int = 320,
+                 min_confidence: float = 0.8, min_face_side: int = 20):
+        self.heavy_fn = heavy_fn
+        self.proxy_side = proxy_side
+        self.min_confidence = min_confidence
+        self.min_face_side = min_face_side
+
+        self.fast = fast
+        self._yunet_path = yunet_model_path
+        if fast == "yunet" and not (yunet_model_path and os.path.isfile(yunet_model_path)
+                                    and hasattr(cv2, "FaceDetectorYN")):
+            print(f"⚠️ YuNet model not available at {yunet_model_path}; cascade uses Haar")
+            self.fast = "haar"
+        if self.fast == "haar":
+            if not hasattr(cv2, "CascadeClassifier"):
+                print("⚠️ This OpenCV build has no Haar cascades; every frame takes the heavy path")
+                self.fast = "none"
+            else:
+                self._haar = cv2.CascadeClassifier(os.path.join(cv2.data.haarcascades,
+                                                                "haarcascade_frontalface_default.xml"))
+        # FaceDetectorYN keeps per-input-size state, so one instance per thread
+        self._local = threading.local()
+
+        self._lock = threading.Lock()
+        self._frames = 0
+        self._fast = StageStats()
+        self._heavy = StageStats()
+        self._misses = 0
+        self._unsure_kept = 0
+
+    # --- stage 1 ---
+
+    def _yunet(self):
+        detector = getattr(self._local, "yunet", None)
+        if detector is None:
+            detector = cv2.FaceDetectorYN.create(self._yunet_path, "", (320, 320), 0.5, 0.3, 50)
+            self._local.yunet = detector
+        return detector
+
+    def _proxy(self, image: np.ndarray):
+        height, width = image.shape[:2]
+        scale = min(1.0, self.proxy_side / float(max(height, width)))
+        proxy = image
+        if scale < 1.0:
+            proxy = cv2.resize(image, (max(1, int(width * scale)), max(1, int(height * scale))),
+                               interpolation=cv2.INTER_AREA)
+        if proxy.dtype != np.uint8:
+            proxy = np.clip(proxy * (255.0 if proxy.max() <= 1.0 else 1.0), 0, 255).astype(np.uint8)
+        return proxy, scale
+
+    def detect_fast(self, image: np.ndarray) -> List[FaceResult]:
+        """Stage 1 on the proxy; boxes and crops are in full-image coordinates."""
+        if self.fast == "none":
+            return []
+        proxy, scale = self._proxy(image)
+        if proxy.ndim == 2:
+            proxy = cv2.cvtColor(proxy, cv2.COLOR_GRAY2RGB)
+        elif proxy.shape[2] == 4:
+            proxy = cv2.cvtColor(proxy, cv2.COLOR_RGBA2RGB)
+
+        detections = []  # (x, y, w, h, score, left_eye, right_eye) in proxy pixels
+        if self.fast == "yunet":
+            detector = self._yunet()
+            detector.setInputSize((proxy.shape[1], proxy.shape[0]))
+            _, faces = detector.detect(cv2.cvtColor(proxy, cv2.COLOR_RGB2BGR))
+            for row in faces if faces is not None else []:
+                # YuNet landmarks: right eye, left eye, nose, mouth corners (image left/right)
+                detections.append((row[0], row[1], row[2], row[3], float(row[14]),
+                                   (row[4], row[5]), (row[6], row[7])))
+        else:
+            gray = cv2.cvtColor(proxy, cv2.COLOR_RGB2GRAY)
+            min_side = max(8, int(self.min_face_side * scale))
+            boxes, _, weights = self._haar.detectMultiScale3(
+                gray, scaleFactor=1.1, minNeighbors=6, minSize=(min_side, min_side), outputRejectLevels=True)
+            for (x, y, w, h), weight in zip(boxes, np.ravel(weights) if len(boxes) else []):
+                # Haar level weights are unbounded; squash so min_confidence means the same for both
+                detections.append((x, y, w, h, float(1.0 - np.exp(-max(0.0, weight))), None, None))
+
+        height, width = image.shape[:2]
+        results = []
+        for x, y, w, h, score, left_eye, right_eye in detections:
+            bbox = {
+                'x': int(max(0, x / scale)), 'y': int(max(0, y / scale)),
+                'w': int(min(width, w / scale)), 'h': int(min(height, h / scale)),
+            }
+            if min(bbox['w'], bbox['h']) < self.min_face_side:
+                continue
+            if left_eye is not None:
+                left_eye = (left_eye[0] / scale, left_eye[1] / scale)
+                right_eye = (right_eye[0] / scale, right_eye[1] / scale)
+            results.append(FaceResult(crop=aligned_crop(image, bbox, left_eye, right_eye),
+                                      bbox=bbox, confidence=score))
+        results.sort(key=lambda f: f.confidence, reverse=True)
+        return results
+
+    # --- cascade ---
+
+    def detect(self, image) -> List[FaceResult]:
+        """All faces, best first; empty list when neither stage finds one."""
+        image = np.asarray(image)
+        start = time.perf_counter()
+        faces = self.detect_fast(image)
+        fast_ms = (time.perf_counter() - start) * 1000.0
+        fast_hit = bool(faces) and faces[0].confidence >= self.min_confidence
+
+        heavy_ms, heavy_faces = None, []
+        if not fast_hit:
+            start = time.perf_counter()
+            try:
+                heavy_faces = self.heavy_fn(image) or []
+            except ValueError:
+                pass
+            heavy_ms = (time.perf_counter() - start) * 1000.0
+
+        with self._lock:
+            self._frames += 1
+            self._fast.record(fast_hit, fast_ms)
+            if heavy_ms is not None:
+                self._heavy.record(bool(heavy_faces), heavy_ms)
+                if heavy_faces:
+                    faces = heavy_faces
+                elif faces:
+                    self._unsure_kept += 1
+            if not faces:
+                self._misses += 1
+        return faces
+
+    def stats(self) -> Dict:
+        with self._lock:
+            frames = self._frames
+            return {
+                "fast_detector": self.fast,
+                "proxy_side": self.proxy_side,
+                "min_confidence": self.min_confidence,
+                "frames": frames,
+                "fast": self._fast.snapshot(),
+                "heavy": self._heavy.snapshot(),
+                "slow_path_rate": round(self._heavy.calls / frames, 3) if frames else 0.0,
+                "unsure_fast_kept": self._unsure_kept,
+                "no_face": self._misses,
+            }
@@ -0,0 +1,208 @@
+"""
+Memora Embedder Backends
+Interchangeable CPU runtimes for the face embedding model.
+
+    keras   DeepFace's Keras model behind a traced tf.function (default)
+    tflite  converted .tflite model; float32 graphs run on the XNNPACK delegate
+    onnx    converted .onnx model on ONNX Runtime's CPU execution provider
+
+All backends take a preprocessed (N, H, W, 3) float32 batch (see
+face_pipeline.preprocess_crop) and return (N, dim) float32 embeddings, so the
+rest of the pipeline does not care which one is active. tflite and onnx only
+need their model file at runtime; TensorFlow is required to convert it:
+
+    python embedders.py export tflite artifacts/facenet512.tflite
+    python embedders.py export onnx artifacts/facenet512.onnx
+"""
+
+import argparse
+import os
+import threading
+from typing import Optional, Tuple
+
+import numpy as np
+
+BACKENDS = ("keras", "tflite", "onnx")
+MODEL_FILES = {"tflite": "{model}.tflite", "onnx": "{model}.onnx"}
+
+
+class Embedder:
+    """Runs one forward pass over a preprocessed batch."""
+
+    name = "base"
+
+    def __init__(self, model_name: str, input_shape: Tuple[int, int]):
+        self.model_name = model_name
+        self.input_shape = input_shape          # (width, height), as DeepFace reports it
+
+    def embed(self, batch: np.ndarray) -> np.ndarray:
+        raise NotImplementedError
+
+    def describe(self) -> dict:
+        return {"backend": self.name, "model": self.model_name, "input_shape": list(self.input_shape)}
+
+
+class KerasEmbedder(Embedder):
+    """The DeepFace Keras model, traced once with a batch-agnostic signature."""
+
+    name = "keras"
+
+    def __init__(self, model_name: str):
+        from deepface import DeepFace
+        from face_pipeline import compile_forward
+
+        model = DeepFace.build_model(model_name)
+        super().__init__(model_name, tuple(model.input_shape))
+        self._forward = compile_forward(model_name)
+
+    def embed(self, batch: np.ndarray) -> np.ndarray:
+        return self._forward(np.asarray(batch, dtype=np.float32)).numpy()
+
+
+class TFLiteEmbedder(Embedder):
+    """
+    .tflite model on the TFLite interpreter.
+
+    Float32 models are delegated to XNNPACK by the default op resolver, with
+    num_threads workers; describe() reports whether that actually happened in
+    this build. The interpreter is not thread-safe, so calls are serialized;
+    the micro-batcher already funnels requests into one caller.
+    """
+
+    name = "tflite"
+
+    def __init__(self, model_name: str, model_path: str, num_threads: int = 4):
+        try:
+            from tflite_runtime.interpreter import Interpreter
+        except ImportError:
+            try:
+                from tensorflow.lite import Interpreter
+            except ImportError as e:
+                raise ImportError("tflite backend needs tflite-runtime or tensorflow") from e
+
+        self.num_threads = num_threads
+        self._interpreter = Interpreter(model_path=model_path, num_threads=num_threads)
+        self._input = self._interpreter.get_input_details()[0]
+        self._output = self._interpreter.get_output_details()[0]
+        height, width = int(self._input["shape"][1]), int(self._input["shape"][2])
+        super().__init__(model_name, (width, height))
+        self._lock = threading.Lock()
+        self._batch_size = None
+        self.delegate = self._loaded_delegate()
+
+    def _loaded_delegate(self) -> str:
+        # The default delegate is applied at allocate_tensors and replaces the
+        # nodes it takes over with DELEGATE nodes; no such node means plain CPU kernels.
+        # _get_ops_details is private (tensorflow / tflite-runtime >= 2.5), so builds
+        # without it report "unknown" rather than a guess
+        if not hasattr(self._interpreter, "_get_ops_details"):
+            return "unknown"
+        try:
+            self._interpreter.allocate_tensors()
+            ops = {op["op_name"] for op in self._interpreter._get_ops_details()}
+        except Exception as e:
+            print(f"⚠️ Could not inspect the TFLite execution plan: {e}")
+            return "unknown"
+        return "xnnpack" if "DELEGATE" in ops else "none"
+
+    def embed(self, batch: np.ndarray) -> np.ndarray:
+        batch = np.ascontiguousarray(batch, dtype=np.float32)
+        with self._lock:
+            if self._batch_size != len(batch):
+                self._interpreter.resize_tensor_input(self._input["index"], list(batch.shape))
+                self._interpreter.allocate_tensors()
+                self._batch_size = len(batch)
+            self._interpreter.set_tensor(self._input["index"], batch)
+            self._interpreter.invoke()
+            return np.array(self._interpreter.get_tensor(self._output["index"]), dtype=np.float32)
+
+    def describe(self) -> dict:
+        return {**super().describe(), "threads": self.num_threads, "delegate": self.delegate}
+
+
+class OnnxEmbedder(Embedder):
+    """.onnx model on ONNX Runtime (CPUExecutionProvider, full graph optimizations)."""
+
+    name = "onnx"
+
+    def __init__(self, model_name: str, model_path: str, num_threads: int = 4):
+        try:
+            import onnxruntime as ort
+        except ImportError as e:
+            raise ImportError("onnx backend needs onnxruntime") from e
+
+        options = ort.SessionOptions()
+        options.intra_op_num_threads = num_threads
+        options.inter_op_num_threads = 1
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        self.num_threads = num_threads
+        self._session = ort.InferenceSession(model_path, sess_options=options,
+                                             providers=["CPUExecutionProvider"])
+        model_input = self._session.get_inputs()[0]
+        self._input_name = model_input.name
+        height, width = int(model_input.shape[1]), int(model_input.shape[2])
+        super().__init__(model_name, (width, height))
+
+    def embed(self, batch: np.ndarray) -> np.ndarray:
+        batch = np.ascontiguousarray(batch, dtype=np.float32)
+        return np.asarray(self._session.run(None, {self._input_name: batch})[0], dtype=np.float32)
+
+    def describe(self) -> dict:
+        return {**super().describe(), "threads": self.num_threads, "providers": self._session.get_providers()}
+
+
+def model_path(artifact_dir: str, backend: str, model_name: str) -> str:
+    return os.path.join(artifact_dir, MODEL_FILES[backend].format(model=model_name.lower()))
+
+
+def create_embedder(backend: str, model_name: str, artifact_dir: Optional[str] = None,
+                    num_threads: int = 4) -> Embedder:
+    """Build the configured backend; converted models are read from artifact_dir."""
+    if backend not in BACKENDS:
+        raise ValueError(f"Unknown embedder backend {backend!r} (expected one of {', '.join(BACKENDS)})")
+    if backend == "keras":
+        return KerasEmbedder(model_name)
+    path = model_path(artifact_dir or ".", backend, model_name)
+    if not os.path.isfile(path):
+        raise FileNotFoundError(f"{backend} model not found at {path}; convert it with embedders.py export")
+    if backend == "tflite":
+        return TFLiteEmbedder(model_name, path, num_threads)
+    return OnnxEmbedder(model_name, path, num_threads)
+
+
+def export_model(backend: str, output_path: str, model_name: str = "Facenet512") -> str:
+    """Convert DeepFace's Keras model to a .tflite or .onnx file with a dynamic batch axis."""
+    import tensorflow as tf
+    from deepface import DeepFace
+
+    model = DeepFace.build_model(model_name)
+    width, height = model.input_shape
+    spec = tf.TensorSpec([None, height, width, 3], tf.float32, name="input")
+    os.makedirs(os.path.dirname(os.path.abspath(output_path)), exist_ok=True)
+
+    if backend == "tflite":
+        forward = tf.function(lambda x: model.model(x, training=False), input_signature=[spec])
+        converter = tf.lite.TFLiteConverter.from_concrete_functions([forward.get_concrete_function()], model.model)
+        with open(output_path, "wb") as f:
+            f.write(converter.convert())
+    elif backend == "onnx":
+        import tf2onnx
+        tf2onnx.convert.from_keras(model.model, input_signature=(spec,), opset=13, output_path=output_path)
+    else:
+        raise ValueError(f"Cannot export to {backend!r}")
+    return output_path
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Convert the embedding model for the tflite/onnx backends")
+    sub = parser.add_subparsers(dest="command", required=True)
+    export = sub.add_parser("export")
+    export.add_argument("backend", choices=["tflite", "onnx"])
+    export.add_argument("output")
+    export.add_argument("--model", default="Facenet512")
+    args = parser.parse_args()
+    print(export_model(args.backend, args.output, args.model))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,216 @@
+"""
+Memora Enrollment
+Embeds FamilyMember photos once, when they are added or changed, and writes
+them into the persistent gallery so the recognition path only has to match.
+
+Two triggers feed the same Enroller:
+- an explicit enroll call with a member id (Gradio "enroll" endpoint)
+- EnrollmentWorker polling FamilyMember rows updated since a watermark
+
+This is the only place stored photos are revalidated (If-None-Match with
+the row's ETag; a 304 keeps the embedding). Recognition trusts the gallery
+and only downloads photos it has no row for.
+"""
+
+import json
+import os
+import queue
+import threading
+import time
+from typing import Callable, Dict, List, Optional
+
+
+class Enroller:
+    """Keeps one member's gallery rows in sync with their photoUrls."""
+
+    def __init__(self, gallery, model_name: str, fetch_many_fn: Callable,
+                 decode_fn: Callable, embed_fn: Callable, hash_fn: Callable):
+        self.gallery = gallery
+        self.model_name = model_name
+        self.fetch_many_fn = fetch_many_fn
+        self.decode_fn = decode_fn
+        self.embed_fn = embed_fn
+        self.hash_fn = hash_fn
+
+    def enroll_member(self, member: Dict, force: bool = False, revalidate: bool = False) -> Dict:
+        """
+        Embed new photos and drop photos that were removed from the member.
+
+        revalidate=True re-checks already enrolled photos with a conditional
+        GET (ETag) and only re-embeds ones whose bytes actually changed.
+        force=True downloads and re-embeds every photo unconditionally.
+        """
+        patient_id = member.get('patientId')
+        member_id = member.get('id')
+        photo_urls = list(member.get('photoUrls') or [])
+        summary = {"member_id": member_id, "added": 0, "kept": 0, "not_modified": 0,
+                   "removed": 0, "failed": 0}
+        if not patient_id or not member_id:
+            summary["error"] = "Member is missing id or patientId"
+            return summary
+
+        # Photos no longer listed on the member
+        current = self.gallery.load(patient_id)
+        if current is not None:
+            stale = [row["photo_url"] for row in current.rows
+                     if row["member_id"] == member_id and row["photo_url"] not in photo_urls]
+            if stale:
+                self.gallery.remove(patient_id, member_id=member_id, photo_urls=stale)
+                summary["removed"] = len(stale)
+
+        to_fetch = []  # (url, etag sent, existing row)
+        for url in photo_urls:
+            row = self.gallery.row(patient_id, url, self.model_name)
+            if row is None or force:
+                to_fetch.append((url, None, row))
+            elif revalidate:
+                to_fetch.append((url, row.get("etag"), row))
+            else:
+                summary["kept"] += 1
+
+        results = self.fetch_many_fn([(url, etag) for url, etag, _ in to_fetch]) if to_fetch else []
+
+        pending = []
+        for (url, _, row), result in zip(to_fetch, results):
+            if result.not_modified:
+                summary["not_modified"] += 1
+                continue
+            if not result.ok:
+                summary["failed"] += 1
+                continue
+
+            digest = self.hash_fn(result.content)
+            if row is not None and not force and row.get("content_hash") == digest:
+                # Same bytes under a new ETag: refresh the validator, keep the embedding
+                if result.etag and result.etag != row.get("etag"):
+                    pending.append(self._entry(member_id, url, digest, result.etag,
+                                               self.gallery.lookup(patient_id, url, self.model_name)))
+                summary["kept"] += 1
+                continue
+
+            image_array = self.decode_fn(result.content)
+            embedding = self.embed_fn(image_array) if image_array is not None else None
+            if embedding is None:
+                summary["failed"] += 1
+                continue
+            pending.append(self._entry(member_id, url, digest, result.etag, embedding))
+            summary["added"] += 1
+
+        if pending:
+            self.gallery.put_many(patient_id, pending)
+        return summary
+
+    def _entry(self, member_id, url, digest, etag, embedding) -> Dict:
+        return {
+            "member_id": member_id,
+            "photo_url": url,
+            "content_hash": digest,
+            "etag": etag,
+            "model": self.model_name,
+            "embedding": embedding,
+        }
+
+
+class EnrollmentWorker:
+    """
+    Background thread that enrolls members queued by id and polls for
+    FamilyMember rows updated since the last watermark.
+    """
+
+    def __init__(self, enroller: Enroller, fetch_member_fn: Callable,
+                 fetch_updated_fn: Callable, watermark_path: str,
+                 poll_seconds: float = 60.0, on_enrolled: Optional[Callable] = None):
+        self.enroller = enroller
+        self.fetch_member_fn = fetch_member_fn
+        self.fetch_updated_fn = fetch_updated_fn
+        self.watermark_path = watermark_path
+        self.poll_seconds = poll_seconds
+        self.on_enrolled = on_enrolled
+
+        self._queue: "queue.Queue" = queue.Queue()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self.stats = {"enrolled": 0, "polls": 0, "errors": 0, "last_poll": None}
+
+    # --- watermark ---
+
+    def load_watermark(self) -> Optional[str]:
+        try:
+            with open(self.watermark_path, "r") as f:
+                return json.load(f).get("updatedAt")
+        except (OSError, ValueError):
+            return None
+
+    def save_watermark(self, updated_at: str) -> None:
+        tmp = self.watermark_path + ".tmp"
+        with open(tmp, "w") as f:
+            json.dump({"updatedAt": updated_at}, f)
+        os.replace(tmp, self.watermark_path)
+
+    # --- triggers ---
+
+    def enqueue(self, member_id: str) -> None:
+        self._queue.put(member_id)
+
+    def enroll_by_id(self, member_id: str, force: bool = False) -> Dict:
+        member = self.fetch_member_fn(member_id)
+        if not member:
+            return {"member_id": member_id, "error": "Family member not found"}
+        return self._enroll(member, force=force)
+
+    def poll_once(self) -> List[Dict]:
+        """Enroll every member updated since the watermark, oldest first."""
+        watermark = self.load_watermark()
+        members = self.fetch_updated_fn(watermark)
+        self.stats["polls"] += 1
+        self.stats["last_poll"] = time.time()
+
+        summaries = []
+        for member in members or []:
+            summaries.append(self._enroll(member))
+            if member.get('updatedAt'):
+                self.save_watermark(member['updatedAt'])
+        return summaries
+
+    def _enroll(self, member: Dict, force: bool = False) -> Dict:
+        try:
+            summary = self.enroller.enroll_member(member, force=force, revalidate=True)
+            self.stats["enrolled"] += 1
+            if self.on_enrolled is not None:
+                self.on_enrolled(member.get('patientId'))
+            print(f"🧾 Enrolled {member.get('name', member.get('id'))}: {summary}")
+            return summary
+        except Exception as e:
+            self.stats["errors"] += 1
+            print(f"Enrollment error for {member.get('id')}: {e}")
+            return {"member_id": member.get('id'), "error": str(e)}
+
+    # --- thread ---
+
+    def start(self) -> None:
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="enrollment-worker", daemon=True)
+            self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        self._queue.put(None)
+
+    def _run(self) -> None:
+        next_poll = time.monotonic()
+        while not self._stop.is_set():
+            if self.poll_seconds > 0 and time.monotonic() >= next_poll:
+                try:
+                    self.poll_once()
+                except Exception as e:
+                    self.stats["errors"] += 1
+                    print(f"Enrollment poll error: {e}")
+                next_poll = time.monotonic() + self.poll_seconds
+
+            timeout = max(0.1, next_poll - time.monotonic()) if self.poll_seconds > 0 else None
+            try:
+                member_id = self._queue.get(timeout=timeout)
+            except queue.Empty:
+                continue
+            if member_id is not None:
+                self.enroll_by_id(member_id)
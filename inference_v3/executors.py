@@ -0,0 +1,84 @@
+"""
+Memora Executors & Admission Control
+Process-wide thread pools and a cap on in-flight recognitions.
+
+Both pools are created once at startup: one for blocking I/O, one for
+CPU-bound model work (decode + embed). Requests never create their own
+pools, so thread count stays fixed under load. The AdmissionController lets
+max_in_flight recognitions run, parks up to max_queued more for at most
+queue_timeout seconds, and rejects the rest with Overloaded.
+"""
+
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from typing import Dict
+
+
+class Overloaded(Exception):
+    """Raised when a request cannot be admitted."""
+
+
+def create_executors(io_workers: int, cpu_workers: int):
+    """Build the shared (io, cpu) pools."""
+    io = ThreadPoolExecutor(max_workers=io_workers, thread_name_prefix="memora-io")
+    cpu = ThreadPoolExecutor(max_workers=cpu_workers, thread_name_prefix="memora-cpu")
+    return io, cpu
+
+
+class AdmissionController:
+    """Bounded concurrency with a bounded wait queue."""
+
+    def __init__(self, max_in_flight: int = 4, max_queued: int = 16, queue_timeout: float = 10.0):
+        self.max_in_flight = max(1, int(max_in_flight))
+        self.max_queued = max(0, int(max_queued))
+        self.queue_timeout = queue_timeout
+
+        self._cond = threading.Condition()
+        self._active = 0
+        self._queued = 0
+        self._counters = {"admitted": 0, "rejected": 0, "timed_out": 0, "completed": 0}
+
+    @contextmanager
+    def admit(self, wait: bool = True):
+        """Hold one in-flight slot for the duration of the block (wait=False: no queueing)."""
+        with self._cond:
+            if self._active >= self.max_in_flight:
+                if not wait or self._queued >= self.max_queued:
+                    self._counters["rejected"] += 1
+                    raise Overloaded(f"{self._active} recognitions running, {self._queued} queued")
+
+                self._queued += 1
+                deadline = time.monotonic() + self.queue_timeout
+                try:
+                    while self._active >= self.max_in_flight:
+                        remaining = deadline - time.monotonic()
+                        if remaining <= 0:
+                            self._counters["timed_out"] += 1
+                            self._counters["rejected"] += 1
+                            raise Overloaded(f"Waited {self.queue_timeout:.0f}s for a recognition slot")
+                        self._cond.wait(remaining)
+                finally:
+                    self._queued -= 1
+
+            self._active += 1
+            self._counters["admitted"] += 1
+
+        try:
+            yield
+        finally:
+            with self._cond:
+                self._active -= 1
+                self._counters["completed"] += 1
+                self._cond.notify()
+
+    def stats(self) -> Dict:
+        with self._cond:
+            return {
+                "active": self._active,
+                "queued": self._queued,
+                "max_in_flight": self.max_in_flight,
+                "max_queued": self.max_queued,
+                **self._counters,
+            }
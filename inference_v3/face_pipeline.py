@@ -0,0 +1,193 @@
+"""
+Memora Face Pipeline
+Single-pass detect -> align -> embed for query images.
+
+The image is decoded and run through the detector exactly once. The aligned
+crop is preprocessed the way DeepFace.represent(detector_backend="skip") would
+and fed straight into the embedding model, so the same face is never
+re-detected or re-aligned.
+
+compile_forward() traces the embedding model once as a tf.function with a
+fixed (None, H, W, 3) float32 signature, so batches of any size reuse one
+graph instead of paying tracing on the first real request. set_embedder()
+swaps the forward pass for another runtime (see embedders.py), and
+set_detector() registers a custom detector (see detector_cascade.py) under a
+detector_backend name.
+"""
+
+from dataclasses import dataclass
+from typing import Callable, Dict, List, Optional
+
+import numpy as np
+from deepface import DeepFace
+from deepface.modules import preprocessing
+
+from metrics import stage
+
+# model_name -> traced forward function (see compile_forward)
+_COMPILED: Dict[str, Callable] = {}
+# model_name -> active Embedder backend (see set_embedder)
+_EMBEDDERS: Dict[str, object] = {}
+
+
+def set_embedder(embedder) -> None:
+    """Route forward passes for embedder.model_name through this backend."""
+    _EMBEDDERS[embedder.model_name] = embedder
+
+
+def get_embedder(model_name: str):
+    return _EMBEDDERS.get(model_name)
+
+
+# detector_backend name -> object with detect(image) -> [FaceResult] (see set_detector)
+_DETECTORS: Dict[str, object] = {}
+
+
+def set_detector(name: str, detector) -> None:
+    """Answer detect_faces(..., detector_backend=name) with detector.detect()."""
+    _DETECTORS[name] = detector
+
+
+@dataclass
+class FaceResult:
+    """Everything later stages need about one detected face."""
+
+    crop: np.ndarray                        # aligned face, RGB float [0, 1]
+    bbox: Dict[str, int]                    # x, y, w, h in source image pixels
+    confidence: float
+    embedding: Optional[np.ndarray] = None
+
+
+def detect_faces(image, detector_backend: str, align: bool = True,
+                 enforce_detection: bool = True) -> List[FaceResult]:
+    """
+    Detect and align all faces, best confidence first.
+
+    Raises ValueError (from DeepFace) when no face is found, unless
+    enforce_detection is False, in which case the whole image is returned.
+    """
+    with stage("detection"):
+        return _detect_faces(image, detector_backend, align, enforce_detection)
+
+
+def _detect_faces(image, detector_backend: str, align: bool, enforce_detection: bool) -> List[FaceResult]:
+    custom = _DETECTORS.get(detector_backend)
+    if custom is not None:
+        faces = custom.detect(image)
+        if faces:
+            return faces
+        if enforce_detection:
+            raise ValueError("Face could not be detected")
+        img = np.asarray(image)
+        crop = img.astype(np.float32) / 255.0 if img.dtype == np.uint8 else img.astype(np.float32)
+        return [FaceResult(crop=crop, bbox={'x': 0, 'y': 0, 'w': img.shape[1], 'h': img.shape[0]},
+                           confidence=0.0)]
+
+    face_objs = DeepFace.extract_faces(
+        img_path=image,
+        detector_backend=detector_backend,
+        enforce_detection=enforce_detection,
+        align=align
+    )
+    faces = []
+    for obj in face_objs or []:
+        area = obj.get('facial_area', {})
+        faces.append(FaceResult(
+            crop=obj['face'],
+            bbox={k: int(area.get(k, 0)) for k in ('x', 'y', 'w', 'h')},
+            confidence=float(obj.get('confidence', 0.0)),
+        ))
+    faces.sort(key=lambda f: f.confidence, reverse=True)
+    return faces
+
+
+def preprocess_crop(crop, model_name: str) -> np.ndarray:
+    """Resize an aligned crop to the model input exactly as DeepFace.represent does."""
+    embedder = _EMBEDDERS.get(model_name)
+    input_shape = embedder.input_shape if embedder is not None else DeepFace.build_model(model_name).input_shape
+    target_h, target_w = input_shape[1], input_shape[0]
+    img = np.asarray(crop)[:, :, ::-1]  # same channel flip represent() applies
+    img = preprocessing.resize_image(img=img, target_size=(target_h, target_w))
+    img = preprocessing.normalize_input(img=img, normalization="base")
+    return img[0].astype(np.float32, copy=False)
+
+
+def compile_forward(model_name: str) -> Callable:
+    """Trace the model's forward pass once with a batch-agnostic signature."""
+    import tensorflow as tf
+
+    model = DeepFace.build_model(model_name)
+    height, width = model.input_shape[1], model.input_shape[0]
+    keras_model = model.model
+
+    @tf.function(input_signature=[tf.TensorSpec([None, height, width, 3], tf.float32)])
+    def forward(batch):
+        return keras_model(batch, training=False)
+
+    forward.get_concrete_function()
+    _COMPILED[model_name] = forward
+    return forward
+
+
+def forward_batch(batch: List[np.ndarray], model_name: str) -> List[np.ndarray]:
+    """One forward pass over preprocessed crops, one embedding per crop."""
+    embedder = _EMBEDDERS.get(model_name)
+    compiled = _COMPILED.get(model_name)
+    if embedder is not None:
+        outputs = embedder.embed(np.stack(batch))
+    elif compiled is not None:
+        outputs = compiled(np.stack(batch).astype(np.float32, copy=False))
+    else:
+        outputs = DeepFace.build_model(model_name).model(np.stack(batch), training=False)
+    outputs = outputs.numpy() if hasattr(outputs, 'numpy') else np.asarray(outputs)
+    return [row.astype(np.float32) for row in outputs]
+
+
+def embed_face(face: FaceResult, model_name: str, batcher=None) -> FaceResult:
+    """
+    Embed an already aligned crop without running detection again.
+
+    With a MicroBatcher the crop joins whatever other requests are in flight
+    and shares their forward pass.
+    """
+    try:
+        with stage("embedding"):
+            img = preprocess_crop(face.crop, model_name)
+            if batcher is not None:
+                face.embedding = batcher(img)
+            else:
+                face.embedding = forward_batch([img], model_name)[0]
+    except Exception as e:
+        print(f"Embedding extraction error: {e}")
+    return face
+
+
+def embed_faces(faces: List[FaceResult], model_name: str) -> List[FaceResult]:
+    """Embed every crop of a multi-face image in one batched forward pass."""
+    if not faces:
+        return faces
+    try:
+        with stage("embedding"):
+            batch = [preprocess_crop(face.crop, model_name) for face in faces]
+            for face, embedding in zip(faces, forward_batch(batch, model_name)):
+                face.embedding = embedding
+    except Exception as e:
+        print(f"Embedding extraction error: {e}")
+    return faces
+
+
+def detect_align_embed(image, model_name: str, detector_backend: str,
+                       min_confidence: float = 0.0, batcher=None) -> Optional[FaceResult]:
+    """
+    Run the full query stage once and return the best face.
+
+    The embedding is only computed when the face clears min_confidence, so a
+    low-quality frame never pays for the model forward pass.
+    """
+    faces = detect_faces(image, detector_backend)
+    if not faces:
+        return None
+    best_face = faces[0]
+    if best_face.confidence >= min_confidence:
+        embed_face(best_face, model_name, batcher)
+    return best_face
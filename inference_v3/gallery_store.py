@@ -0,0 +1,369 @@
+"""
+Memora Gallery Store
+Persistent per-patient embedding galleries backed by np.memmap.
+
+Layout on disk (one directory per patient):
+
+    <root>/<patient_id>/index.json                          row -> (member id, photo URL, hash, ETag, model)
+    <root>/<patient_id>/embeddings.<v>.<token>.<f32|f16|i8>  contiguous matrix (rows x dim)
+    <root>/<patient_id>/embeddings.<v>.<token>.scales.f32    per-row int8 scales
+    <root>/<patient_id>/embeddings.<v>.<token>.exact.f32     optional float32 copy for re-ranking
+    <root>/<patient_id>/.lock                               writer lock (flock)
+
+Embeddings are L2-normalized on write and stored in the store's quantization
+scheme (see quantization.py). index.json records the scheme, so galleries
+written under another setting stay readable and are converted on next write. Writers build a new matrix file and
+atomically swap index.json, so readers in other workers keep serving the old
+mapping until they notice the new version. Writers in different processes
+(pre-fork workers) serialize on an flock of the patient's .lock file, and
+every file they create carries a per-writer token, so no two writers ever
+share a temporary or matrix path.
+"""
+
+import json
+import os
+import re
+import threading
+import uuid
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional
+
+import numpy as np
+
+try:
+    import fcntl
+except ImportError:  # not POSIX: one process only, the thread lock is enough
+    fcntl = None
+
+from quantization import FILE_SUFFIXES, STORAGE_DTYPES, check_scheme, dequantize, quantize
+
+INDEX_FILE = "index.json"
+LOCK_FILE = ".lock"
+READ_ATTEMPTS = 3
+EMBEDDING_DTYPE = np.float32
+
+
+@dataclass
+class PatientGallery:
+    """Read-only view over one patient's gallery."""
+
+    patient_id: str
+    version: int
+    matrix: np.ndarray               # (rows, dim) in the quantization dtype, memory-mapped
+    rows: List[Dict]                 # member_id, photo_url, content_hash, etag, model
+    url_to_row: Dict[tuple, int] = field(default_factory=dict)
+    stamp: tuple = ()                # (mtime_ns, inode) of the index it was read from
+    quantization: str = "float32"
+    scales: Optional[np.ndarray] = None   # (rows,) float32, int8 only
+    exact: Optional[np.ndarray] = None    # (rows, dim) float32, memory-mapped
+
+    def __len__(self) -> int:
+        return len(self.rows)
+
+    def vectors(self, rows=None) -> np.ndarray:
+        """float32 embeddings for the given row indices (all rows if None)."""
+        rows = slice(None) if rows is None else rows
+        if self.exact is not None:
+            return np.asarray(self.exact[rows], dtype=np.float32)
+        scales = self.scales[rows] if self.scales is not None else None
+        return dequantize(self.matrix[rows], scales)
+
+
+def _file_version(name: str) -> Optional[int]:
+    """Version of an embeddings.<v>.* file, None for other files."""
+    parts = name.split(".")
+    if len(parts) > 2 and parts[0] == "embeddings" and parts[1].isdigit():
+        return int(parts[1])
+    return None
+
+
+def _stamp(index_path: str) -> tuple:
+    # Every write replaces index.json with a new inode; mtime alone can repeat
+    # within the filesystem's timestamp granularity
+    st = os.stat(index_path)
+    return (st.st_mtime_ns, st.st_ino)
+
+
+def normalize(embedding) -> np.ndarray:
+    """Return a float32 unit vector."""
+    vec = np.asarray(embedding, dtype=EMBEDDING_DTYPE).reshape(-1)
+    norm = np.linalg.norm(vec)
+    if norm > 0:
+        vec = vec / norm
+    return vec.astype(EMBEDDING_DTYPE, copy=False)
+
+
+class GalleryStore:
+    """On-disk gallery of face embeddings, one memory-mapped matrix per patient."""
+
+    def __init__(self, root: str, dim: int = 512, quantization: str = "float32", keep_exact: bool = True):
+        self.root = root
+        self.dim = dim
+        self.quantization = check_scheme(quantization)
+        self.keep_exact = keep_exact
+        self._lock = threading.Lock()
+        self._open: Dict[str, PatientGallery] = {}
+        os.makedirs(root, exist_ok=True)
+
+    # --- paths ---
+
+    def _patient_dir(self, patient_id: str) -> str:
+        # Patient ids are UUIDs; anything else is sanitized so it can't escape root
+        safe_id = re.sub(r"[^A-Za-z0-9_-]", "_", str(patient_id))
+        return os.path.join(self.root, safe_id)
+
+    @contextmanager
+    def _writing(self, patient_id: str):
+        """Exclusive write access to one patient: an flock across processes, then the thread lock."""
+        if fcntl is None:
+            with self._lock:
+                yield
+            return
+        # flock is per open file, so it also excludes other threads of this process;
+        # taking it before self._lock keeps readers here unblocked while another process writes
+        patient_dir = self._patient_dir(patient_id)
+        os.makedirs(patient_dir, exist_ok=True)
+        with open(os.path.join(patient_dir, LOCK_FILE), "a") as lock_file:
+            fcntl.flock(lock_file.fileno(), fcntl.LOCK_EX)
+            try:
+                with self._lock:
+                    yield
+            finally:
+                fcntl.flock(lock_file.fileno(), fcntl.LOCK_UN)
+
+    # --- reads ---
+
+    def load(self, patient_id: str) -> Optional[PatientGallery]:
+        """Open (or reuse) the memory-mapped gallery for a patient."""
+        index_path = os.path.join(self._patient_dir(patient_id), INDEX_FILE)
+        try:
+            stamp = _stamp(index_path)
+        except FileNotFoundError:
+            return None
+
+        cached = self._open.get(patient_id)
+        if cached is not None and cached.stamp == stamp:
+            return cached
+
+        with self._lock:
+            cached = self._open.get(patient_id)
+            if cached is not None and cached.stamp == stamp:
+                return cached
+            gallery = self._read(patient_id, index_path, stamp)
+            if gallery is not None:
+                self._open[patient_id] = gallery
+            return gallery
+
+    def loaded(self, patient_id: str) -> Optional[PatientGallery]:
+        """The gallery this process last opened or wrote, without checking disk (load() if none)."""
+        gallery = self._open.get(patient_id)
+        return gallery if gallery is not None else self.load(patient_id)
+
+    def forget(self, patient_id: Optional[str] = None) -> None:
+        """Drop open galleries (all if patient_id is None) so the next load() re-reads disk."""
+        with self._lock:
+            if patient_id is None:
+                self._open.clear()
+            else:
+                self._open.pop(patient_id, None)
+
+    def _read(self, patient_id: str, index_path: str, stamp: tuple) -> Optional[PatientGallery]:
+        # A writer may replace the index (and retire its files) between our two
+        # steps; a missing matrix means a newer index is already in place.
+        for attempt in range(READ_ATTEMPTS):
+            try:
+                with open(index_path, "r") as f:
+                    index = json.load(f)
+            except (OSError, ValueError) as e:
+                print(f"⚠️ Gallery index unreadable for {patient_id}: {e}")
+                return None
+            try:
+                return self._map(patient_id, index, stamp)
+            except FileNotFoundError as e:
+                if attempt == READ_ATTEMPTS - 1:
+                    print(f"⚠️ Gallery files missing for {patient_id}: {e}")
+                    return None
+                try:
+                    stamp = _stamp(index_path)
+                except FileNotFoundError:
+                    return None
+        return None
+
+    def _map(self, patient_id: str, index: Dict, stamp: tuple) -> PatientGallery:
+        rows = index.get("rows", [])
+        dim = index.get("dim", self.dim)
+        scheme = index.get("quantization", "float32")  # galleries from before quantization
+        patient_dir = self._patient_dir(patient_id)
+
+        def mapped(name, dtype, shape):
+            return np.memmap(os.path.join(patient_dir, name), dtype=dtype, mode="r", shape=shape)
+
+        scales = exact = None
+        if rows:
+            matrix = mapped(index["matrix"], STORAGE_DTYPES[scheme], (len(rows), dim))
+            if index.get("scales"):
+                scales = mapped(index["scales"], np.float32, (len(rows),))
+            if index.get("exact"):
+                exact = mapped(index["exact"], EMBEDDING_DTYPE, (len(rows), dim))
+        else:
+            matrix = np.zeros((0, dim), dtype=STORAGE_DTYPES[scheme])
+
+        url_to_row = {(row["photo_url"], row["model"]): i for i, row in enumerate(rows)}
+        return PatientGallery(
+            patient_id=patient_id,
+            version=index.get("version", 0),
+            matrix=matrix,
+            rows=rows,
+            url_to_row=url_to_row,
+            stamp=stamp,
+            quantization=scheme,
+            scales=scales,
+            exact=exact,
+        )
+
+    def lookup(self, patient_id: str, photo_url: str, model_name: str) -> Optional[np.ndarray]:
+        """Return the stored embedding for a photo, or None if not enrolled."""
+        gallery = self.load(patient_id)
+        if gallery is None:
+            return None
+        row = gallery.url_to_row.get((photo_url, model_name))
+        if row is None:
+            return None
+        return gallery.vectors(row)
+
+    def row(self, patient_id: str, photo_url: str, model_name: str) -> Optional[Dict]:
+        """Return the index entry (hash, ETag, member) for a stored photo."""
+        gallery = self.load(patient_id)
+        if gallery is None:
+            return None
+        row = gallery.url_to_row.get((photo_url, model_name))
+        return gallery.rows[row] if row is not None else None
+
+    # --- writes ---
+
+    def put_many(self, patient_id: str, entries: List[Dict]) -> Optional[PatientGallery]:
+        """
+        Insert or replace rows for a patient.
+
+        Each entry needs member_id, photo_url, model and embedding; content_hash
+        and etag are optional.
+        Rows with the same (photo_url, model) are replaced.
+        """
+        if not entries:
+            return self.load(patient_id)
+
+        with self._writing(patient_id):
+            current = None
+            index_path = os.path.join(self._patient_dir(patient_id), INDEX_FILE)
+            if os.path.exists(index_path):
+                current = self._read(patient_id, index_path, _stamp(index_path))
+
+            rows = list(current.rows) if current else []
+            vectors = list(current.vectors()) if current else []
+            positions = dict(current.url_to_row) if current else {}
+
+            for entry in entries:
+                key = (entry["photo_url"], entry["model"])
+                row = {
+                    "member_id": entry["member_id"],
+                    "photo_url": entry["photo_url"],
+                    "content_hash": entry.get("content_hash"),
+                    "etag": entry.get("etag"),
+                    "model": entry["model"],
+                }
+                vec = normalize(entry["embedding"])
+                if key in positions:
+                    rows[positions[key]] = row
+                    vectors[positions[key]] = vec
+                else:
+                    positions[key] = len(rows)
+                    rows.append(row)
+                    vectors.append(vec)
+
+            return self._write(patient_id, rows, vectors, current)
+
+    def remove(self, patient_id: str, member_id: Optional[str] = None,
+               photo_urls: Optional[List[str]] = None) -> Optional[PatientGallery]:
+        """Drop all rows of a member, or only the given photo URLs."""
+        with self._writing(patient_id):
+            index_path = os.path.join(self._patient_dir(patient_id), INDEX_FILE)
+            if not os.path.exists(index_path):
+                return None
+            current = self._read(patient_id, index_path, _stamp(index_path))
+            if current is None:
+                return None
+
+            keep_rows, keep_vectors = [], []
+            for row, vec in zip(current.rows, current.vectors()):
+                if member_id is not None and row["member_id"] != member_id:
+                    keep = True
+                elif photo_urls is not None:
+                    keep = row["photo_url"] not in photo_urls
+                else:
+                    keep = False
+                if keep:
+                    keep_rows.append(row)
+                    keep_vectors.append(vec)
+
+            if len(keep_rows) == len(current.rows):
+                return current
+            return self._write(patient_id, keep_rows, keep_vectors, current)
+
+    def _write(self, patient_id: str, rows: List[Dict], vectors: List[np.ndarray],
+               current: Optional[PatientGallery]) -> PatientGallery:
+        patient_dir = self._patient_dir(patient_id)
+        os.makedirs(patient_dir, exist_ok=True)
+
+        version = (current.version if current else 0) + 1
+        token = f"{os.getpid()}-{uuid.uuid4().hex[:8]}"
+        scheme = self.quantization
+        matrix = (np.stack(vectors).astype(EMBEDDING_DTYPE) if vectors
+                  else np.zeros((0, self.dim), dtype=EMBEDDING_DTYPE))
+        data, scales = quantize(matrix, scheme)
+
+        files = {"matrix": f"embeddings.{version}.{token}.{FILE_SUFFIXES[scheme]}", "scales": None, "exact": None}
+        self._write_array(os.path.join(patient_dir, files["matrix"]), data)
+        if scales is not None:
+            files["scales"] = f"embeddings.{version}.{token}.scales.f32"
+            self._write_array(os.path.join(patient_dir, files["scales"]), scales)
+        if scheme != "float32" and self.keep_exact:
+            files["exact"] = f"embeddings.{version}.{token}.exact.f32"
+            self._write_array(os.path.join(patient_dir, files["exact"]), matrix)
+
+        index = {
+            "version": version,
+            "dim": int(matrix.shape[1]) if matrix.size else self.dim,
+            "quantization": scheme,
+            **files,
+            "rows": rows,
+        }
+        index_path = os.path.join(patient_dir, INDEX_FILE)
+        tmp_path = f"{index_path}.{token}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(index, f)
+        os.replace(tmp_path, index_path)
+
+        # Files older than the previous version can go: readers that loaded the
+        # previous index can still map its files, and mapped pages outlive unlink.
+        # Index temp files left now are from writers that died (we hold the lock).
+        for name in os.listdir(patient_dir):
+            file_version = _file_version(name)
+            if ((file_version is not None and file_version < version - 1)
+                    or (name.startswith(INDEX_FILE + ".") and name.endswith(".tmp"))):
+                try:
+                    os.remove(os.path.join(patient_dir, name))
+                except OSError:
+                    pass
+
+        gallery = self._read(patient_id, index_path, _stamp(index_path))
+        self._open[patient_id] = gallery
+        return gallery
+
+    @staticmethod
+    def _write_array(path: str, array: np.ndarray) -> None:
+        # The name is unique to this write and no index points at it yet, so no tmp + rename
+        with open(path, "wb") as f:
+            f.write(np.ascontiguousarray(array).tobytes())
+            f.flush()
+            os.fsync(f.fileno())
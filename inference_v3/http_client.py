@@ -0,0 +1,144 @@
+"""
+Memora Async HTTP Layer
+One shared, connection-pooled httpx.AsyncClient for Supabase REST and storage.
+
+The client lives on a dedicated event-loop thread, so synchronous callers
+(Gradio handlers, worker threads) can submit coroutines and block on the
+result while every request reuses keep-alive connections. Photo downloads run
+concurrently under a per-host limit and support ETag revalidation, so an
+unchanged photo comes back as 304 with no body.
+
+Only enrollment sends ETags (enrollment.py revalidates enrolled photos). The
+recognition path downloads just the photos missing from the gallery, which
+have no stored validator, so its downloads are always full GETs.
+"""
+
+import asyncio
+import json
+import threading
+import time
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Sequence, Tuple
+from urllib.parse import urlsplit
+
+import httpx
+
+
+@dataclass
+class FetchResult:
+    """Outcome of one GET."""
+
+    url: str
+    status: int = 0
+    content: Optional[bytes] = None
+    etag: Optional[str] = None
+    not_modified: bool = False
+    error: Optional[str] = None
+    elapsed: float = 0.0            # seconds from slot acquired to body read
+
+    @property
+    def ok(self) -> bool:
+        return self.status == 200 and self.content is not None
+
+
+class AsyncHTTP:
+    """Shared pooled HTTP client running on its own event loop thread."""
+
+    def __init__(self, max_connections: int = 32, per_host_limit: int = 8,
+                 timeout: float = 5.0, keepalive_expiry: float = 30.0, executor=None):
+        self.per_host_limit = per_host_limit
+        self._limits = httpx.Limits(
+            max_connections=max_connections,
+            max_keepalive_connections=max_connections,
+            keepalive_expiry=keepalive_expiry,
+        )
+        self._timeout = httpx.Timeout(timeout)
+        self._host_slots: Dict[str, asyncio.Semaphore] = {}
+        self._client: Optional[httpx.AsyncClient] = None
+
+        self._loop = asyncio.new_event_loop()
+        if executor is not None:
+            # Blocking helpers (DNS resolution) use the shared I/O pool
+            self._loop.set_default_executor(executor)
+        self._thread = threading.Thread(target=self._loop.run_forever, name="http-loop", daemon=True)
+        self._thread.start()
+
+    # --- loop plumbing ---
+
+    def run(self, coro, timeout: Optional[float] = None):
+        """Run a coroutine on the HTTP loop and wait for its result."""
+        return asyncio.run_coroutine_threadsafe(coro, self._loop).result(timeout)
+
+    def _get_client(self) -> httpx.AsyncClient:
+        if self._client is None:
+            self._client = httpx.AsyncClient(limits=self._limits, timeout=self._timeout,
+                                             follow_redirects=True)
+        return self._client
+
+    def _slot(self, url: str) -> asyncio.Semaphore:
+        host = urlsplit(url).netloc
+        slot = self._host_slots.get(host)
+        if slot is None:
+            slot = self._host_slots[host] = asyncio.Semaphore(self.per_host_limit)
+        return slot
+
+    # --- coroutines ---
+
+    async def fetch(self, url: str, headers: Optional[Dict[str, str]] = None,
+                    params: Optional[Dict[str, str]] = None,
+                    etag: Optional[str] = None) -> FetchResult:
+        """GET one URL, conditional on etag when given."""
+        request_headers = dict(headers or {})
+        if etag:
+            request_headers["If-None-Match"] = etag
+        start = time.perf_counter()
+        try:
+            async with self._slot(url):
+                start = time.perf_counter()
+                resp = await self._get_client().get(url, headers=request_headers, params=params)
+        except Exception as e:
+            return FetchResult(url=url, error=str(e) or e.__class__.__name__,
+                               elapsed=time.perf_counter() - start)
+
+        elapsed = time.perf_counter() - start
+        if resp.status_code == 304:
+            return FetchResult(url=url, status=304, etag=etag, not_modified=True, elapsed=elapsed)
+        return FetchResult(
+            url=url,
+            status=resp.status_code,
+            content=resp.content if resp.status_code == 200 else None,
+            etag=resp.headers.get("etag"),
+            elapsed=elapsed,
+        )
+
+    async def fetch_many(self, requests: Sequence[Tuple[str, Optional[str]]],
+                         headers: Optional[Dict[str, str]] = None) -> List[FetchResult]:
+        """GET many (url, etag) pairs concurrently, results in input order."""
+        return await asyncio.gather(*(self.fetch(url, headers=headers, etag=etag)
+                                      for url, etag in requests))
+
+    # --- synchronous wrappers ---
+
+    def get(self, url: str, headers: Optional[Dict[str, str]] = None,
+            params: Optional[Dict[str, str]] = None, etag: Optional[str] = None) -> FetchResult:
+        return self.run(self.fetch(url, headers=headers, params=params, etag=etag))
+
+    def get_json(self, url: str, headers: Optional[Dict[str, str]] = None,
+                 params: Optional[Dict[str, str]] = None):
+        """GET and decode JSON; None on non-200, IOError on transport failure."""
+        result = self.get(url, headers=headers, params=params)
+        if result.error:
+            raise IOError(result.error)
+        if not result.ok:
+            return None
+        return json.loads(result.content)
+
+    def get_many(self, requests: Sequence[Tuple[str, Optional[str]]],
+                 headers: Optional[Dict[str, str]] = None) -> List[FetchResult]:
+        return self.run(self.fetch_many(requests, headers=headers))
+
+    def close(self) -> None:
+        if self._client is not None:
+            self.run(self._client.aclose())
+            self._client = None
+        self._loop.call_soon_threadsafe(self._loop.stop)
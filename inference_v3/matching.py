@@ -0,0 +1,287 @@
+"""
+Memora Matching Engine
+Vectorized gallery matching: one matrix-vector product per query, reduced to
+per-member minimum cosine distances with a segment-min.
+
+Large galleries can be matched in two stages: the query is scored against one
+normalized centroid per member, and only the photos of the top-k members are
+scored exactly. Members that were not shortlisted get an infinite distance.
+
+Quantized galleries (float16 / int8, see quantization.py) keep only the
+compact matrix resident. With rerank > 0 the best members per query are
+re-scored against the store's float32 copy, read from the memory map.
+"""
+
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from quantization import quantize, scores
+
+MATRIX_DTYPE = np.float32
+
+
+@dataclass
+class GalleryMatrix:
+    """Pre-normalized gallery laid out member by member."""
+
+    matrix: np.ndarray           # (N_photos, dim) float32/float16/int8, rows grouped by member
+    member_ids: List[str]        # one entry per segment
+    member_index: np.ndarray     # (N_photos,) segment number of each row
+    segment_starts: np.ndarray   # (M,) first row of each member
+    photo_counts: np.ndarray     # (M,) photos per member
+    centroids: np.ndarray        # (M, dim) normalized mean embedding per member
+    quantization: str = "float32"
+    scales: Optional[np.ndarray] = None         # (N_photos,) int8 row scales
+    exact_source: Optional[np.ndarray] = None   # float32 store rows (memmap) for re-ranking
+    source_rows: Optional[np.ndarray] = None    # (N_photos,) row of each photo in exact_source
+
+    def __len__(self) -> int:
+        return len(self.member_ids)
+
+    @property
+    def nbytes(self) -> int:
+        """Resident size of the matching data (the exact copy stays on disk)."""
+        scales = self.scales.nbytes if self.scales is not None else 0
+        return int(self.matrix.nbytes + scales + self.centroids.nbytes)
+
+
+def normalize_rows(matrix) -> np.ndarray:
+    """L2-normalize each row, returning contiguous float32."""
+    matrix = np.asarray(matrix, dtype=MATRIX_DTYPE)
+    if matrix.ndim == 1:
+        matrix = matrix[None, :]
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return np.ascontiguousarray(matrix / norms, dtype=MATRIX_DTYPE)
+
+
+def build_gallery_matrix(embeddings, member_ids: Sequence[str], quantization: str = "float32",
+                         exact_source: Optional[np.ndarray] = None,
+                         source_rows: Optional[np.ndarray] = None) -> GalleryMatrix:
+    """Group rows by member (stable) and pack them into one contiguous matrix."""
+    embeddings = np.asarray(embeddings, dtype=MATRIX_DTYPE)
+    if len(member_ids) == 0:
+        dim = embeddings.shape[1] if embeddings.ndim == 2 else 0
+        return GalleryMatrix(
+            matrix=quantize(np.zeros((0, dim), dtype=MATRIX_DTYPE), quantization)[0],
+            member_ids=[],
+            member_index=np.zeros(0, dtype=np.int32),
+            segment_starts=np.zeros(0, dtype=np.int64),
+            photo_counts=np.zeros(0, dtype=np.int64),
+            centroids=np.zeros((0, dim), dtype=MATRIX_DTYPE),
+            quantization=quantization,
+        )
+
+    order: Dict[str, int] = {}
+    for member_id in member_ids:
+        order.setdefault(member_id, len(order))
+    member_index = np.fromiter((order[m] for m in member_ids), dtype=np.int32, count=len(member_ids))
+
+    perm = np.argsort(member_index, kind="stable")
+    member_index = member_index[perm]
+    matrix = normalize_rows(embeddings[perm])
+
+    segment_starts = np.flatnonzero(np.r_[True, member_index[1:] != member_index[:-1]])
+    photo_counts = np.diff(np.r_[segment_starts, len(member_index)])
+    centroids = normalize_rows(np.add.reduceat(matrix, segment_starts, axis=0))
+    data, scales = quantize(matrix, quantization)
+    if quantization == "float32":
+        exact_source = None
+    if exact_source is not None:
+        source_rows = np.asarray(source_rows, dtype=np.int64)[perm]
+
+    return GalleryMatrix(
+        matrix=data,
+        member_ids=list(order.keys()),
+        member_index=member_index,
+        segment_starts=segment_starts,
+        photo_counts=photo_counts,
+        centroids=centroids,
+        quantization=quantization,
+        scales=scales,
+        exact_source=exact_source,
+        source_rows=source_rows if exact_source is not None else None,
+    )
+
+
+@dataclass
+class PrefilterConfig:
+    """When and how far to narrow the search with member centroids."""
+
+    top_k: int = 8                  # members whose photos are scored exactly
+    min_members: int = 16           # below this, exhaustive search is already cheap
+    fallback_distance: float = 0.7  # best centroid farther than this -> exhaustive
+
+    def enabled_for(self, gallery: GalleryMatrix) -> bool:
+        return self.top_k > 0 and len(gallery) >= max(self.min_members, self.top_k + 1)
+
+
+def shortlist_members(gallery: GalleryMatrix, queries: np.ndarray,
+                      config: PrefilterConfig) -> Optional[np.ndarray]:
+    """
+    Sorted member indices worth scoring exactly for normalized queries (F, dim),
+    or None when the search should stay exhaustive.
+    """
+    if not config.enabled_for(gallery):
+        return None
+    centroid_distances = 1.0 - queries @ gallery.centroids.T
+    if float(centroid_distances.min(axis=1).max()) > config.fallback_distance:
+        return None
+    top = np.argpartition(centroid_distances, config.top_k - 1, axis=1)[:, :config.top_k]
+    return np.unique(top)
+
+
+def _member_rows(gallery: GalleryMatrix, members: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """Photo rows of the given members, plus where each member's run starts."""
+    counts = gallery.photo_counts[members]
+    offsets = np.r_[0, np.cumsum(counts)[:-1]]
+    rows = np.repeat(gallery.segment_starts[members] - offsets, counts) + np.arange(counts.sum())
+    return rows, offsets
+
+
+def _score_rows(gallery: GalleryMatrix, queries: np.ndarray, rows=None) -> np.ndarray:
+    if rows is None:
+        return 1.0 - scores(queries, gallery.matrix, gallery.scales)
+    scales = gallery.scales[rows] if gallery.scales is not None else None
+    return 1.0 - scores(queries, gallery.matrix[rows], scales)
+
+
+def _match_subset(gallery: GalleryMatrix, queries: np.ndarray, members: np.ndarray) -> np.ndarray:
+    """(F, M) distances with only the given members' photos scored; others are inf."""
+    rows, offsets = _member_rows(gallery, members)
+    out = np.full((len(queries), len(gallery)), np.inf, dtype=MATRIX_DTYPE)
+    out[:, members] = np.minimum.reduceat(_score_rows(gallery, queries, rows), offsets, axis=1)
+    return out
+
+
+def _rerank_exact(gallery: GalleryMatrix, queries: np.ndarray, distances: np.ndarray, rerank: int) -> np.ndarray:
+    """Replace the best `rerank` members' quantized distances with exact float32 ones."""
+    k = min(rerank, len(gallery))
+    top = np.argpartition(distances, k - 1, axis=1)[:, :k]
+    members = np.unique(top)
+    members = members[np.isfinite(distances[:, members]).any(axis=0)]
+    if len(members) == 0:
+        return distances
+    rows, offsets = _member_rows(gallery, members)
+    exact = np.asarray(gallery.exact_source[gallery.source_rows[rows]], dtype=MATRIX_DTYPE)
+    distances[:, members] = np.minimum.reduceat(1.0 - queries @ exact.T, offsets, axis=1)
+    return distances
+
+
+def match_members(gallery: GalleryMatrix, query, prefilter: Optional[PrefilterConfig] = None,
+                  rerank: int = 0) -> np.ndarray:
+    """Return the minimum cosine distance per member for one query embedding."""
+    if len(gallery) == 0:
+        return np.zeros(0, dtype=MATRIX_DTYPE)
+    return match_members_batch(gallery, query, prefilter, rerank)[0]
+
+
+def match_members_batch(gallery: GalleryMatrix, queries, prefilter: Optional[PrefilterConfig] = None,
+                        rerank: int = 0) -> np.ndarray:
+    """(F, M) minimum cosine distances for F query embeddings in one matrix-matrix product."""
+    queries = normalize_rows(queries)
+    if len(gallery) == 0:
+        return np.zeros((len(queries), 0), dtype=MATRIX_DTYPE)
+    members = shortlist_members(gallery, queries, prefilter) if prefilter is not None else None
+    if members is not None:
+        distances = _match_subset(gallery, queries, members)
+    else:
+        distances = np.minimum.reduceat(_score_rows(gallery, queries), gallery.segment_starts, axis=1)
+    if rerank > 0 and gallery.exact_source is not None:
+        distances = _rerank_exact(gallery, queries, distances, rerank)
+    return distances
+
+
+def assign_members(distances: np.ndarray, threshold: float) -> List[Optional[int]]:
+    """
+    Greedy one-to-one assignment of faces to members.
+
+    The closest (face, member) pair under threshold wins first, so two faces
+    in one photo are never both named as the same person.
+    """
+    n_faces = distances.shape[0]
+    assignment: List[Optional[int]] = [None] * n_faces
+    if distances.size == 0:
+        return assignment
+    taken = set()
+    for flat in np.argsort(distances, axis=None):
+        face, member = divmod(int(flat), distances.shape[1])
+        if distances[face, member] >= threshold:
+            break
+        if assignment[face] is None and member not in taken:
+            assignment[face] = member
+            taken.add(member)
+    return assignment
+
+
+class MatchingEngine:
+    """Caches one GalleryMatrix per patient, rebuilt when the gallery or roster changes."""
+
+    def __init__(self, max_patients: int = 256):
+        self.max_patients = max_patients
+        self._lock = threading.Lock()
+        self._cache: "OrderedDict[str, Tuple[tuple, GalleryMatrix]]" = OrderedDict()
+        self._counters = {"hits": 0, "misses": 0}
+
+    @staticmethod
+    def roster_key(candidates: List[Dict]) -> tuple:
+        return tuple((m.get('id'), tuple(m.get('photoUrls') or ())) for m in candidates)
+
+    def get(self, patient_id: str, gallery, candidates: List[Dict], model_name: str) -> GalleryMatrix:
+        """Gallery matrix restricted to the photos currently on the patient's roster."""
+        key = (gallery.version if gallery is not None else 0, model_name, self.roster_key(candidates))
+        with self._lock:
+            hit = self._cache.get(patient_id)
+            if hit is not None and hit[0] == key:
+                self._cache.move_to_end(patient_id)
+                self._counters["hits"] += 1
+                return hit[1]
+            self._counters["misses"] += 1
+
+        rows, member_ids = [], []
+        if gallery is not None:
+            for member in candidates:
+                for url in member.get('photoUrls') or []:
+                    row = gallery.url_to_row.get((url, model_name))
+                    if row is not None:
+                        rows.append(row)
+                        member_ids.append(member.get('id'))
+        rows = np.asarray(rows, dtype=np.int64)
+        embeddings = (gallery.vectors(rows) if len(rows)
+                      else np.zeros((0, gallery.matrix.shape[1] if gallery is not None else 0)))
+        built = build_gallery_matrix(
+            embeddings, member_ids,
+            quantization=gallery.quantization if gallery is not None else "float32",
+            exact_source=gallery.exact if gallery is not None else None,
+            source_rows=rows,
+        )
+
+        with self._lock:
+            self._cache[patient_id] = (key, built)
+            self._cache.move_to_end(patient_id)
+            while len(self._cache) > self.max_patients:
+                self._cache.popitem(last=False)
+        return built
+
+    def stats(self) -> Dict:
+        with self._lock:
+            built = [entry[1] for entry in self._cache.values()]
+            counters = dict(self._counters)
+        return {
+            **counters,
+            "patients": len(built),
+            "photos": int(sum(len(g.matrix) for g in built)),
+            "resident_bytes": int(sum(g.nbytes for g in built)),
+            "quantization": sorted(set(g.quantization for g in built)),
+        }
+
+    def invalidate(self, patient_id: Optional[str] = None) -> None:
+        with self._lock:
+            if patient_id is None:
+                self._cache.clear()
+            else:
+                self._cache.pop(patient_id, None)
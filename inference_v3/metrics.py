@@ -0,0 +1,269 @@
+"""
+Memora Metrics
+Latency histograms and counters in the Prometheus text exposition format.
+
+A tiny in-process registry (no client library needed):
+
+    with stage("detection"):        # observed into memora_stage_seconds{stage="detection"}
+        ...
+
+Every stage is also a tracing span (see tracing.py) when the request is
+sampled. Stages also feed the per-request timing breakdown when the caller opened
+one with collect_timings(). Work handed to executor threads keeps the
+breakdown if the callable is wrapped with bind_context(). A stage nested in
+another stage of the same name is not counted twice (the detector cascade
+calls detect_faces again for its heavy path).
+
+Collectors registered with Registry.collector() are called at scrape time.
+They export values that components already count themselves, such as cache
+hits and queue depths.
+"""
+
+import contextvars
+import math
+import threading
+import time
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+from tracing import record_span, span
+
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# (metric name, type, help, [(labels, value)])
+Family = Tuple[str, str, str, List[Tuple[Dict[str, str], float]]]
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(labels: Dict[str, str]) -> str:
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{k}="{_escape(v)}"' for k, v in labels.items()) + "}"
+
+
+def _format_value(value: float) -> str:
+    if math.isinf(value):
+        return "+Inf" if value > 0 else "-Inf"
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+class Counter:
+    """Monotonic counter with optional labels."""
+
+    kind = "counter"
+
+    def __init__(self, name: str, help_text: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.help = help_text
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        self._values: Dict[tuple, float] = {}
+
+    def inc(self, amount: float = 1.0, **labels) -> None:
+        key = tuple(str(labels.get(n, "")) for n in self.labelnames)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def collect(self) -> Iterable[Family]:
+        with self._lock:
+            samples = [(dict(zip(self.labelnames, key)), value) for key, value in self._values.items()]
+        yield self.name + "_total", self.kind, self.help, samples
+
+
+class Histogram:
+    """Cumulative-bucket histogram with optional labels."""
+
+    kind = "histogram"
+
+    def __init__(self, name: str, help_text: str, labelnames: Sequence[str] = (),
+                 buckets: Sequence[float] = LATENCY_BUCKETS):
+        self.name = name
+        self.help = help_text
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(sorted(buckets))
+        self._lock = threading.Lock()
+        self._series: Dict[tuple, List[float]] = {}   # key -> [bucket counts..., sum, count]
+
+    def observe(self, value: float, **labels) -> None:
+        key = tuple(str(labels.get(n, "")) for n in self.labelnames)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [0.0] * (len(self.buckets) + 2)
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[i] += 1
+                    break
+            series[-2] += value
+            series[-1] += 1
+
+    def collect(self) -> Iterable[Family]:
+        with self._lock:
+            snapshot = {key: list(series) for key, series in self._series.items()}
+        samples = []
+        for key, series in snapshot.items():
+            labels = dict(zip(self.labelnames, key))
+            cumulative = 0.0
+            for bound, count in zip(self.buckets, series):
+                cumulative += count
+                samples.append(({**labels, "le": _format_value(bound)}, cumulative, "_bucket"))
+            samples.append(({**labels, "le": "+Inf"}, series[-1], "_bucket"))
+            samples.append((labels, series[-2], "_sum"))
+            samples.append((labels, series[-1], "_count"))
+        yield self.name, self.kind, self.help, samples
+
+
+class Registry:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._metrics: List = []
+        self._collectors: List[Callable[[], Iterable[Family]]] = []
+
+    def counter(self, name: str, help_text: str, labelnames: Sequence[str] = ()) -> Counter:
+        metric = Counter(name, help_text, labelnames)
+        with self._lock:
+            self._metrics.append(metric)
+        return metric
+
+    def histogram(self, name: str, help_text: str, labelnames: Sequence[str] = (),
+                  buckets: Sequence[float] = LATENCY_BUCKETS) -> Histogram:
+        metric = Histogram(name, help_text, labelnames, buckets)
+        with self._lock:
+            self._metrics.append(metric)
+        return metric
+
+    def collector(self, fn: Callable[[], Iterable[Family]]) -> Callable:
+        """Register fn() -> [(name, type, help, [(labels, value)])], called at scrape time."""
+        with self._lock:
+            self._collectors.append(fn)
+        return fn
+
+    def render(self) -> str:
+        """Prometheus text exposition format 0.0.4."""
+        with self._lock:
+            sources = [m.collect for m in self._metrics] + list(self._collectors)
+        lines = []
+        for source in sources:
+            try:
+                families = list(source())
+            except Exception as e:
+                lines.append(f"# collector error: {e}")
+                continue
+            for name, kind, help_text, samples in families:
+                lines.append(f"# HELP {name} {help_text}")
+                lines.append(f"# TYPE {name} {kind}")
+                for sample in samples:
+                    labels, value = sample[0], sample[1]
+                    suffix = sample[2] if len(sample) > 2 else ""
+                    lines.append(f"{name}{suffix}{_format_labels(labels)} {_format_value(value)}")
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+STAGE_SECONDS = REGISTRY.histogram("memora_stage_seconds", "Wall time per pipeline stage", ["stage"])
+
+
+# --- per-request timing breakdown ---
+
+class Timings:
+    """Stage totals for one request (thread-safe: executor work may add to it)."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._ms: Dict[str, float] = {}
+        self._started = time.perf_counter()
+
+    def add(self, stage_name: str, seconds: float) -> None:
+        with self._lock:
+            self._ms[stage_name] = self._ms.get(stage_name, 0.0) + seconds * 1000.0
+
+    def as_dict(self) -> Dict[str, float]:
+        with self._lock:
+            out = {name: round(ms, 3) for name, ms in self._ms.items()}
+        out["total"] = round((time.perf_counter() - self._started) * 1000.0, 3)
+        return out
+
+
+_TIMINGS: contextvars.ContextVar[Optional[Timings]] = contextvars.ContextVar("memora_timings", default=None)
+_ACTIVE: contextvars.ContextVar[frozenset] = contextvars.ContextVar("memora_active_stages", default=frozenset())
+
+
+@contextmanager
+def collect_timings():
+    """Open a timing breakdown that stage() calls in this context add to (reuses an open one)."""
+    current = _TIMINGS.get()
+    if current is not None:
+        yield current
+        return
+    timings = Timings()
+    token = _TIMINGS.set(timings)
+    try:
+        yield timings
+    finally:
+        _TIMINGS.reset(token)
+
+
+@contextmanager
+def stage(name: str, **attributes):
+    """Time a block into memora_stage_seconds, the current breakdown and a span."""
+    active = _ACTIVE.get()
+    if name in active:
+        yield
+        return
+    token = _ACTIVE.set(active | {name})
+    start = time.perf_counter()
+    try:
+        with span(name, **attributes):
+            yield
+    finally:
+        elapsed = time.perf_counter() - start
+        _ACTIVE.reset(token)
+        STAGE_SECONDS.observe(elapsed, stage=name)
+        timings = _TIMINGS.get()
+        if timings is not None:
+            timings.add(name, elapsed)
+
+
+def observe_stage(name: str, seconds: float, **attributes) -> None:
+    """Record a duration measured elsewhere (e.g. inside the HTTP event loop)."""
+    STAGE_SECONDS.observe(seconds, stage=name)
+    record_span(name, seconds, **attributes)
+    timings = _TIMINGS.get()
+    if timings is not None:
+        timings.add(name, seconds)
+
+
+def bind_context(fn: Callable) -> Callable:
+    """Run fn in (a copy of) the caller's context, for executor threads."""
+    ctx = contextvars.copy_context()
+
+    def bound(*args, **kwargs):
+        return ctx.copy().run(fn, *args, **kwargs)
+    return bound
+
+
+def process_memory() -> Dict[str, float]:
+    """
+    This process's memory in MB from /proc/self/smaps_rollup (Linux; {} elsewhere).
+
+    rss counts pages shared with forked siblings in full; pss splits them
+    between the sharers, so summing pss over workers gives their real total.
+    """
+    fields = {"Rss": "rss_mb", "Pss": "pss_mb", "Shared_Clean": "shared_mb", "Shared_Dirty": "shared_mb",
+              "Private_Clean": "private_mb", "Private_Dirty": "private_mb"}
+    memory: Dict[str, float] = {}
+    try:
+        with open("/proc/self/smaps_rollup") as f:
+            for line in f:
+                name, _, rest = line.partition(":")
+                if name in fields:
+                    key = fields[name]
+                    memory[key] = memory.get(key, 0.0) + int(rest.split()[0]) / 1024.0
+    except (OSError, ValueError, IndexError):
+        return {}
+    return {key: round(value, 1) for key, value in memory.items()}
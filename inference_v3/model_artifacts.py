@@ -0,0 +1,165 @@
+"""
+Memora Model Artifacts
+Fast cold start: verified local weights, a pre-traced forward pass, and
+per-phase startup timings.
+
+DeepFace only downloads weights when <DEEPFACE_HOME>/.deepface/weights/<file>
+is missing. A local artifact directory holding the weights plus a
+manifest.json of SHA-256 checksums is verified and linked into that layout,
+so startup never touches the network when the artifacts are present. A
+checksum mismatch is reported and DeepFace falls back to its normal download.
+
+Populate an artifact directory from an already warmed machine with:
+
+    python model_artifacts.py export /path/to/artifacts --model Facenet512
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import shutil
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Dict, Optional
+
+MANIFEST_FILE = "manifest.json"
+WEIGHT_FILES = {
+    "Facenet512": "facenet512_weights.h5",
+    "Facenet": "facenet_weights.h5",
+    "ArcFace": "arcface_weights.h5",
+    "VGG-Face": "vgg_face_weights.h5",
+}
+
+
+def sha256_file(path: str, chunk_size: int = 1 << 20) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def deepface_weights_dir() -> Path:
+    return Path(os.getenv("DEEPFACE_HOME", str(Path.home()))) / ".deepface" / "weights"
+
+
+class StartupTimings:
+    """Wall-clock duration of each startup phase, plus time to first recognition."""
+
+    def __init__(self, started_at: Optional[float] = None):
+        self.started_at = started_at if started_at is not None else time.perf_counter()
+        self._lock = threading.Lock()
+        self.phases: Dict[str, float] = {}
+        self.notes: Dict[str, str] = {}
+        self.ready_s: Optional[float] = None
+        self.first_recognition_s: Optional[float] = None
+
+    def record(self, phase: str, seconds: float) -> None:
+        self.phases[phase] = round(seconds * 1000.0, 1)
+
+    @contextmanager
+    def phase(self, name: str):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(name, time.perf_counter() - start)
+
+    def mark_ready(self) -> None:
+        self.ready_s = round(time.perf_counter() - self.started_at, 3)
+
+    def mark_first_recognition(self) -> None:
+        if self.first_recognition_s is not None:
+            return
+        with self._lock:
+            if self.first_recognition_s is None:
+                self.first_recognition_s = round(time.perf_counter() - self.started_at, 3)
+
+    def snapshot(self) -> Dict:
+        return {
+            "phases_ms": dict(self.phases),
+            "notes": dict(self.notes),
+            "ready_s": self.ready_s,
+            "first_recognition_s": self.first_recognition_s,
+        }
+
+
+def install_local_weights(artifact_dir: str, model_name: str) -> str:
+    """
+    Verify the artifact for model_name and link it where DeepFace looks.
+
+    Returns "local" when the verified artifact is in place, "cached" when
+    DeepFace already has the weights, or "download" when DeepFace will fetch them.
+    """
+    filename = WEIGHT_FILES.get(model_name)
+    if filename is None:
+        return "download"
+    target = deepface_weights_dir() / filename
+    source = Path(artifact_dir) / filename if artifact_dir else None
+
+    if source is None or not source.is_file():
+        return "cached" if target.is_file() else "download"
+
+    try:
+        with open(Path(artifact_dir) / MANIFEST_FILE, "r") as f:
+            expected = json.load(f).get(filename)
+    except (OSError, ValueError):
+        expected = None
+    if not expected or sha256_file(str(source)) != expected:
+        print(f"⚠️ Model artifact {source} failed checksum verification; ignoring it")
+        return "cached" if target.is_file() else "download"
+
+    if target.is_file() and os.path.samefile(source, target):
+        return "local"
+    target.parent.mkdir(parents=True, exist_ok=True)
+    tmp = target.with_suffix(target.suffix + ".tmp")
+    if tmp.exists():
+        tmp.unlink()
+    try:
+        os.link(source, tmp)
+    except OSError:
+        os.symlink(source.resolve(), tmp)
+    os.replace(tmp, target)
+    return "local"
+
+
+def export_artifacts(artifact_dir: str, model_name: str) -> Dict[str, str]:
+    """Copy DeepFace's downloaded weights into artifact_dir and write the manifest."""
+    filename = WEIGHT_FILES[model_name]
+    source = deepface_weights_dir() / filename
+    if not source.is_file():
+        raise FileNotFoundError(f"{source} not found; run the model once so DeepFace downloads it")
+    os.makedirs(artifact_dir, exist_ok=True)
+    shutil.copy2(source, Path(artifact_dir) / filename)
+
+    manifest_path = Path(artifact_dir) / MANIFEST_FILE
+    manifest = json.loads(manifest_path.read_text()) if manifest_path.is_file() else {}
+    manifest[filename] = sha256_file(str(Path(artifact_dir) / filename))
+    manifest_path.write_text(json.dumps(manifest, indent=2))
+    return manifest
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Manage local model artifacts")
+    sub = parser.add_subparsers(dest="command", required=True)
+    export = sub.add_parser("export", help="Copy downloaded weights into an artifact directory")
+    export.add_argument("directory")
+    export.add_argument("--model", default="Facenet512", choices=sorted(WEIGHT_FILES))
+    verify = sub.add_parser("verify", help="Check an artifact directory against its manifest")
+    verify.add_argument("directory")
+    args = parser.parse_args()
+
+    if args.command == "export":
+        print(json.dumps(export_artifacts(args.directory, args.model), indent=2))
+    else:
+        manifest = json.loads((Path(args.directory) / MANIFEST_FILE).read_text())
+        for filename, expected in manifest.items():
+            actual = sha256_file(str(Path(args.directory) / filename))
+            print(f"{'ok' if actual == expected else 'MISMATCH'}  {filename}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,229 @@
+"""
+Memora Profiler
+Opt-in sampling profiler with slow-request capture.
+
+A daemon thread wakes every interval_s, reads every thread's Python stack
+(sys._current_frames) and counts it as one collapsed stack:
+
+    memora-cpu;_worker (thread.py:69);run (thread.py:53);embed_faces (face_pipeline.py:165) 42
+
+That is the input format of flamegraph.pl and speedscope. Threads parked in
+a wait (queue gets, selectors, condition variables) are skipped unless
+include_idle is set, so the profile shows where CPU goes.
+
+Requests wrapped in capture() are also timed. While one runs, samples of
+its thread are kept separately as well; if it ends up slower than
+slow_threshold_s it is tagged slow and its samples are retained (the last
+keep_slow of them) for download. Work the request hands to pool threads is
+in the process-wide profile only. Nothing samples unless start() is called;
+until then capture() is just a timer.
+
+Usage (outside the app, e.g. around a benchmark):
+
+    profiler = SamplingProfiler(interval_s=0.005)
+    profiler.start()
+    ...
+    open("cpu.folded", "w").write(profiler.collapsed())
+"""
+
+import itertools
+import os
+import re
+import sys
+import threading
+import time
+from collections import Counter, deque
+from contextlib import contextmanager
+from typing import Deque, Dict, List, Optional
+
+# Leaf functions of a thread that is blocked, not running
+IDLE_LEAVES = frozenset({"wait", "select", "poll", "_wait_for_tstate_lock", "accept"})
+MAX_DEPTH = 64
+
+
+class Capture:
+    """Timing and own-thread samples of one request."""
+
+    __slots__ = ("id", "name", "tags", "thread_id", "started", "wall_started", "duration_s",
+                 "samples", "slow")
+
+    def __init__(self, capture_id: int, name: str, tags: Dict):
+        self.id = capture_id
+        self.name = name
+        self.tags = tags
+        self.thread_id = threading.get_ident()
+        self.started = time.perf_counter()
+        self.wall_started = time.time()
+        self.duration_s = 0.0
+        self.samples: Counter = Counter()
+        self.slow = False
+
+    def summary(self) -> Dict:
+        return {
+            "id": self.id,
+            "name": self.name,
+            "tags": self.tags,
+            "started_at": round(self.wall_started, 3),
+            "duration_ms": round(self.duration_s * 1000.0, 3),
+            "samples": sum(self.samples.values()),
+        }
+
+
+def _thread_label(name: str) -> str:
+    # memora-cpu_3 / ThreadPoolExecutor-0_1 -> one root per pool
+    return re.sub(r"_\d+$", "", name).replace(";", ":")
+
+
+class SamplingProfiler:
+    """Periodic stack sampler aggregating collapsed stacks."""
+
+    def __init__(self, interval_s: float = 0.01, slow_threshold_s: float = 2.0, keep_slow: int = 32,
+                 max_stacks: int = 20000, include_idle: bool = False):
+        self.interval_s = interval_s
+        self.slow_threshold_s = slow_threshold_s
+        self.max_stacks = max_stacks
+        self.include_idle = include_idle
+
+        self._lock = threading.Lock()
+        self._stacks: Counter = Counter()
+        self._active: Dict[int, Capture] = {}
+        self._slow: Deque[Capture] = deque(maxlen=keep_slow)
+        self._ids = itertools.count(1)
+        self._labels: Dict[object, str] = {}
+        self._thread: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+        self._counters = {"ticks": 0, "samples": 0, "truncated": 0, "captures": 0, "slow": 0}
+        self._sampling_s = 0.0
+        self._started_at: Optional[float] = None
+
+    # --- sampling ---
+
+    @property
+    def running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self) -> None:
+        if self.running:
+            return
+        self._stop.clear()
+        self._started_at = time.time()
+        self._thread = threading.Thread(target=self._run, name="memora-profiler", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=1.0)
+        self._thread = None
+
+    def _label(self, code) -> str:
+        label = self._labels.get(code)
+        if label is None:
+            label = f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})".replace(";", ":")
+            self._labels[code] = label
+        return label
+
+    def _collapse(self, frame, thread_name: str) -> Optional[str]:
+        if not self.include_idle and frame.f_code.co_name in IDLE_LEAVES:
+            return None
+        frames = []
+        while frame is not None and len(frames) < MAX_DEPTH:
+            frames.append(self._label(frame.f_code))
+            frame = frame.f_back
+        frames.append(thread_name)
+        return ";".join(reversed(frames))
+
+    def sample(self) -> None:
+        """Take one sample of every other thread."""
+        start = time.perf_counter()
+        own = threading.get_ident()
+        names = {t.ident: _thread_label(t.name) for t in threading.enumerate()}
+        frames = sys._current_frames()
+        with self._lock:
+            self._counters["ticks"] += 1
+            for thread_id, frame in frames.items():
+                if thread_id == own:
+                    continue
+                stack = self._collapse(frame, names.get(thread_id, "thread"))
+                if stack is None:
+                    continue
+                self._counters["samples"] += 1
+                if stack in self._stacks or len(self._stacks) < self.max_stacks:
+                    self._stacks[stack] += 1
+                else:
+                    self._counters["truncated"] += 1
+                capture = self._active.get(thread_id)
+                if capture is not None:
+                    capture.samples[stack] += 1
+            self._sampling_s += time.perf_counter() - start
+        del frames
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.interval_s):
+            try:
+                self.sample()
+            except Exception as e:
+                print(f"⚠️ Profiler sample failed: {e}")
+
+    # --- request capture ---
+
+    @contextmanager
+    def capture(self, name: str, **tags):
+        """Time the block; keep its thread's samples if it is slower than slow_threshold_s."""
+        capture = Capture(next(self._ids), name, tags)
+        sampling = self.running
+        if sampling:
+            with self._lock:
+                self._active[capture.thread_id] = capture
+        try:
+            yield capture
+        finally:
+            capture.duration_s = time.perf_counter() - capture.started
+            capture.slow = capture.duration_s >= self.slow_threshold_s
+            with self._lock:
+                if sampling:
+                    self._active.pop(capture.thread_id, None)
+                self._counters["captures"] += 1
+                if capture.slow:
+                    self._counters["slow"] += 1
+                    self._slow.append(capture)
+
+    # --- output ---
+
+    def collapsed(self, capture_id: Optional[int] = None) -> Optional[str]:
+        """Collapsed-stack text ("frame;frame count" per line), process-wide or for one slow request."""
+        with self._lock:
+            if capture_id is None:
+                stacks = dict(self._stacks)
+            else:
+                capture = next((c for c in self._slow if c.id == capture_id), None)
+                if capture is None:
+                    return None
+                stacks = dict(capture.samples)
+        lines = [f"{stack} {count}" for stack, count in sorted(stacks.items(), key=lambda kv: -kv[1])]
+        return "\n".join(lines) + ("\n" if lines else "")
+
+    def slow_requests(self) -> List[Dict]:
+        with self._lock:
+            return [capture.summary() for capture in reversed(self._slow)]
+
+    def reset(self) -> None:
+        with self._lock:
+            self._stacks.clear()
+            self._slow.clear()
+            self._counters.update(ticks=0, samples=0, truncated=0)
+            self._sampling_s = 0.0
+
+    def stats(self) -> Dict:
+        with self._lock:
+            ticks = self._counters["ticks"]
+            return {
+                "running": self.running,
+                "interval_ms": round(self.interval_s * 1000.0, 3),
+                "slow_threshold_ms": round(self.slow_threshold_s * 1000.0, 3),
+                **self._counters,
+                "distinct_stacks": len(self._stacks),
+                "slow_retained": len(self._slow),
+                "mean_sample_us": round(self._sampling_s / ticks * 1e6, 1) if ticks else 0.0,
+                "started_at": self._started_at,
+            }
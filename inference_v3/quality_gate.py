@@ -0,0 +1,107 @@
+"""
+Memora Quality Gate
+Cheap pre-model check that rejects frames which cannot plausibly succeed.
+
+Blur (Laplacian variance) and brightness are measured on a small grayscale
+proxy taken by nearest-neighbour subsampling, so the cost depends on the
+proxy size (~160px) and not on the 12MP source. Typical cost is a few
+hundred microseconds.
+"""
+
+import threading
+import time
+from dataclasses import asdict, dataclass
+from typing import Dict, Tuple
+
+import cv2
+import numpy as np
+
+
+@dataclass
+class QualityThresholds:
+    proxy_side: int = 160          # long side of the grayscale proxy
+    min_side: int = 100            # source image must be at least this big
+    min_blur: float = 40.0         # Laplacian variance on the proxy
+    min_brightness: float = 30.0
+    max_brightness: float = 225.0
+
+
+def grayscale_proxy(image: np.ndarray, proxy_side: int) -> np.ndarray:
+    """Nearest-neighbour subsample to about proxy_side, then convert to gray."""
+    height, width = image.shape[:2]
+    scale = min(1.0, proxy_side / float(max(height, width)))
+    proxy = image
+    if scale < 1.0:
+        size = (max(1, int(width * scale)), max(1, int(height * scale)))
+        proxy = cv2.resize(image, size, interpolation=cv2.INTER_NEAREST)
+    if proxy.dtype != np.uint8:
+        scale = 255.0 if proxy.max() <= 1.0 else 1.0
+        proxy = np.clip(proxy * scale, 0, 255).astype(np.uint8)
+    if proxy.ndim == 2:
+        return proxy
+    if proxy.shape[2] == 4:
+        return cv2.cvtColor(proxy, cv2.COLOR_RGBA2GRAY)
+    return cv2.cvtColor(proxy, cv2.COLOR_RGB2GRAY)
+
+
+class QualityGate:
+    """Blur/brightness gate with rejection counters."""
+
+    def __init__(self, thresholds: QualityThresholds = None):
+        self.thresholds = thresholds or QualityThresholds()
+        self._lock = threading.Lock()
+        self._counters = {"checked": 0, "passed": 0, "too_small": 0, "too_blurry": 0,
+                          "too_dark": 0, "too_bright": 0}
+        self._total_us = 0.0
+
+    def check(self, image) -> Tuple[bool, str, Dict]:
+        """Return (ok, reason, metrics) for an RGB image array."""
+        start = time.perf_counter()
+        t = self.thresholds
+        img = image if isinstance(image, np.ndarray) else np.asarray(image)
+        height, width = img.shape[:2]
+        metrics = {"width": int(width), "height": int(height)}
+
+        if width < t.min_side or height < t.min_side:
+            return self._done(start, False, "too_small",
+                              f"Image too small (min {t.min_side}x{t.min_side})", metrics)
+
+        gray = grayscale_proxy(img, t.proxy_side)
+
+        brightness = float(cv2.mean(gray)[0])
+        metrics["brightness"] = round(brightness, 1)
+        if brightness < t.min_brightness:
+            return self._done(start, False, "too_dark", f"Poor lighting (brightness: {brightness:.1f})", metrics)
+        if brightness > t.max_brightness:
+            return self._done(start, False, "too_bright", f"Poor lighting (brightness: {brightness:.1f})", metrics)
+
+        _, std = cv2.meanStdDev(cv2.Laplacian(gray, cv2.CV_32F))
+        blur_score = float(std[0][0]) ** 2
+        metrics["blur_score"] = round(blur_score, 1)
+        if blur_score < t.min_blur:
+            return self._done(start, False, "too_blurry", f"Image too blurry (score: {blur_score:.1f})", metrics)
+
+        return self._done(start, True, "passed", "OK", metrics)
+
+    def _done(self, start, ok, counter, reason, metrics):
+        elapsed_us = (time.perf_counter() - start) * 1e6
+        metrics["gate_us"] = round(elapsed_us, 1)
+        if not ok:
+            metrics["failed_check"] = counter
+        with self._lock:
+            self._counters["checked"] += 1
+            self._counters[counter] += 1
+            self._total_us += elapsed_us
+        return ok, reason, metrics
+
+    def stats(self) -> Dict:
+        with self._lock:
+            checked = self._counters["checked"]
+            rejected = checked - self._counters["passed"]
+            return {
+                **self._counters,
+                "rejected": rejected,
+                "rejection_rate": round(rejected / checked, 3) if checked else 0.0,
+                "mean_gate_us": round(self._total_us / checked, 1) if checked else 0.0,
+                "thresholds": asdict(self.thresholds),
+            }
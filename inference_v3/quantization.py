@@ -0,0 +1,56 @@
+"""
+Memora Embedding Quantization
+Compact storage formats for L2-normalized embedding matrices.
+
+    float32  4 bytes/dim, exact
+    float16  2 bytes/dim, ~1e-3 relative error
+    int8     1 byte/dim + one float32 scale per vector (scale = max|x| / 127)
+
+Scoring never runs BLAS in the compact dtype: rows are widened to float32 for
+the duration of one product, so only the compact matrix stays resident.
+"""
+
+from typing import Optional, Tuple
+
+import numpy as np
+
+SCHEMES = ("float32", "float16", "int8")
+STORAGE_DTYPES = {"float32": np.float32, "float16": np.float16, "int8": np.int8}
+FILE_SUFFIXES = {"float32": "f32", "float16": "f16", "int8": "i8"}
+
+
+def check_scheme(scheme: str) -> str:
+    if scheme not in SCHEMES:
+        raise ValueError(f"Unknown quantization scheme {scheme!r} (expected one of {', '.join(SCHEMES)})")
+    return scheme
+
+
+def quantize(matrix, scheme: str) -> Tuple[np.ndarray, Optional[np.ndarray]]:
+    """Return (data, scales) for a float32 matrix; scales is None unless int8."""
+    matrix = np.asarray(matrix, dtype=np.float32)
+    if check_scheme(scheme) != "int8":
+        return np.ascontiguousarray(matrix, dtype=STORAGE_DTYPES[scheme]), None
+    if matrix.ndim == 1:
+        matrix = matrix[None, :]
+    scales = np.abs(matrix).max(axis=1) / 127.0 if matrix.size else np.zeros(len(matrix), dtype=np.float32)
+    scales = np.where(scales > 0, scales, 1.0).astype(np.float32)
+    data = np.clip(np.rint(matrix / scales[:, None]), -127, 127).astype(np.int8)
+    return np.ascontiguousarray(data), scales
+
+
+def dequantize(data, scales: Optional[np.ndarray] = None) -> np.ndarray:
+    """float32 view of quantized rows."""
+    matrix = np.asarray(data, dtype=np.float32)
+    if scales is not None:
+        matrix = matrix * np.asarray(scales, dtype=np.float32)[..., None]
+    return matrix
+
+
+def scores(queries: np.ndarray, data: np.ndarray, scales: Optional[np.ndarray] = None) -> np.ndarray:
+    """(F, N) dot products of float32 queries against quantized rows."""
+    if data.dtype == np.float32:
+        return queries @ data.T
+    products = queries @ data.astype(np.float32).T
+    if scales is not None:
+        products *= scales[None, :]
+    return products
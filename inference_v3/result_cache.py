@@ -0,0 +1,121 @@
+"""
+Memora Result Cache
+Short-lived recognition results keyed by (patient, perceptual hash).
+
+Re-scanning the same printed photo or resending a frame after a network
+retry produces a near-identical image. A 64-bit difference hash (dHash) of a
+tiny grayscale proxy identifies it in tens of microseconds, and any cached
+result within max_distance bits (Hamming) is returned without running the
+pipeline. Keep max_distance small (default 2): at 4+ bits two similar-looking
+frames of different people can share a result. Every entry records the
+patient's (roster version, gallery version); entries from another version
+are dropped on sight, so a changed roster or newly enrolled photo is never
+answered from the cache.
+"""
+
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
+
+import cv2
+import numpy as np
+
+from quality_gate import grayscale_proxy
+
+HASH_SIDE = 8
+
+
+def perceptual_hash(image) -> int:
+    """64-bit dHash: sign of horizontal gradients on a 9x8 grayscale thumbnail."""
+    gray = grayscale_proxy(np.asarray(image), 64)
+    small = cv2.resize(gray, (HASH_SIDE + 1, HASH_SIDE), interpolation=cv2.INTER_AREA)
+    bits = (small[:, 1:] > small[:, :-1]).ravel()
+    return int(np.packbits(bits).view(">u8")[0])
+
+
+def hamming(a: int, b: int) -> int:
+    return bin(a ^ b).count("1")
+
+
+class ResultCache:
+    """Per-patient LRU of recent results, matched by Hamming distance."""
+
+    def __init__(self, ttl_seconds: float = 30.0, max_distance: int = 2,
+                 max_per_patient: int = 32, max_patients: int = 1024):
+        self.ttl = ttl_seconds
+        self.max_distance = max_distance
+        self.max_per_patient = max_per_patient
+        self.max_patients = max_patients
+        self._lock = threading.Lock()
+        # patient_id -> (version, [(phash, mode, expires_at, result)])
+        self._entries: "OrderedDict[str, Tuple[tuple, List[tuple]]]" = OrderedDict()
+        self._counters = {"hits": 0, "misses": 0, "stores": 0, "version_invalidations": 0}
+
+    @property
+    def enabled(self) -> bool:
+        return self.ttl > 0
+
+    def _bucket(self, patient_id: str, version: tuple) -> Optional[List[tuple]]:
+        bucket = self._entries.get(patient_id)
+        if bucket is None:
+            return None
+        if bucket[0] != version:
+            del self._entries[patient_id]
+            self._counters["version_invalidations"] += 1
+            return None
+        return bucket[1]
+
+    def get(self, patient_id: str, phash: int, version: tuple, mode: str) -> Optional[Dict]:
+        """Closest unexpired result within max_distance bits, else None."""
+        now = time.monotonic()
+        with self._lock:
+            entries = self._bucket(patient_id, version)
+            best = None
+            if entries:
+                entries[:] = [e for e in entries if e[2] > now]
+                for entry_hash, entry_mode, _, result in entries:
+                    if entry_mode != mode:
+                        continue
+                    distance = hamming(entry_hash, phash)
+                    if distance <= self.max_distance and (best is None or distance < best[0]):
+                        best = (distance, result)
+                self._entries.move_to_end(patient_id)
+            self._counters["hits" if best else "misses"] += 1
+        if best is None:
+            return None
+        return {**best[1], "cached": True, "cache_distance": best[0]}
+
+    def put(self, patient_id: str, phash: int, version: tuple, mode: str, result: Dict) -> None:
+        expires_at = time.monotonic() + self.ttl
+        with self._lock:
+            entries = self._bucket(patient_id, version)
+            if entries is None:
+                entries = []
+                self._entries[patient_id] = (version, entries)
+            entries[:] = [e for e in entries if not (e[1] == mode and e[0] == phash)]
+            entries.append((phash, mode, expires_at, result))
+            del entries[:-self.max_per_patient]
+            self._entries.move_to_end(patient_id)
+            while len(self._entries) > self.max_patients:
+                self._entries.popitem(last=False)
+            self._counters["stores"] += 1
+
+    def invalidate(self, patient_id: Optional[str] = None) -> None:
+        with self._lock:
+            if patient_id is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(patient_id, None)
+
+    def stats(self) -> Dict:
+        with self._lock:
+            lookups = self._counters["hits"] + self._counters["misses"]
+            return {
+                **self._counters,
+                "patients": len(self._entries),
+                "entries": sum(len(bucket[1]) for bucket in self._entries.values()),
+                "hit_rate": round(self._counters["hits"] / lookups, 3) if lookups else 0.0,
+                "ttl_seconds": self.ttl,
+                "max_distance": self.max_distance,
+            }
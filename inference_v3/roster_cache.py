@@ -0,0 +1,132 @@
+"""
+Memora Roster Cache
+In-process TTL cache of FamilyMember rosters keyed by patientId.
+
+Concurrent misses for the same patient are coalesced (single-flight): one
+caller fetches, the rest wait on its Future. Expired entries are refreshed
+on access, and served stale if the refresh fails.
+
+InvalidationLog numbers the invalidations a process makes (after an
+enrollment) so serve_multiprocess.py's router can replay them on the
+sibling workers, whose caches would otherwise stay stale until the TTL.
+"""
+
+import threading
+import time
+from collections import OrderedDict, deque
+from concurrent.futures import Future
+from typing import Callable, Dict, List, Optional
+
+
+class RosterCache:
+    """TTL + single-flight cache in front of a roster fetch function."""
+
+    def __init__(self, fetch_fn: Callable[[str], List[Dict]],
+                 ttl_seconds: float = 300.0, max_entries: int = 1024):
+        self.fetch_fn = fetch_fn
+        self.ttl = ttl_seconds
+        self.max_entries = max_entries
+
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()   # patient -> (expires, roster, version)
+        self._inflight: Dict[str, Future] = {}
+        self._versions: Dict[str, int] = {}
+        self._counters = {"hits": 0, "misses": 0, "stale": 0, "coalesced": 0,
+                          "fetches": 0, "fetch_errors": 0, "stale_served": 0, "invalidations": 0}
+
+    def get(self, patient_id: str) -> List[Dict]:
+        """Return the roster, fetching at most once across concurrent callers."""
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(patient_id)
+            if entry is not None and entry[0] > now:
+                self._counters["hits"] += 1
+                self._entries.move_to_end(patient_id)
+                return entry[1]
+
+            self._counters["stale" if entry is not None else "misses"] += 1
+            future = self._inflight.get(patient_id)
+            leader = future is None
+            if leader:
+                future = self._inflight[patient_id] = Future()
+                self._counters["fetches"] += 1
+            else:
+                self._counters["coalesced"] += 1
+
+        if not leader:
+            return future.result()
+
+        try:
+            roster = self.fetch_fn(patient_id)
+        except Exception as e:
+            with self._lock:
+                self._counters["fetch_errors"] += 1
+                self._inflight.pop(patient_id, None)
+                stale = self._entries.get(patient_id)
+                if stale is not None:
+                    self._counters["stale_served"] += 1
+            if stale is not None:
+                future.set_result(stale[1])
+                return stale[1]
+            future.set_exception(e)
+            raise
+
+        with self._lock:
+            previous = self._entries.get(patient_id)
+            version = self._versions.get(patient_id, 0)
+            if previous is None or previous[1] != roster:
+                version += 1
+                self._versions[patient_id] = version
+            self._entries[patient_id] = (time.monotonic() + self.ttl, roster, version)
+            self._entries.move_to_end(patient_id)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+            self._inflight.pop(patient_id, None)
+        future.set_result(roster)
+        return roster
+
+    def version(self, patient_id: str) -> int:
+        """Counter that changes whenever the cached roster contents change."""
+        with self._lock:
+            return self._versions.get(patient_id, 0)
+
+    def invalidate(self, patient_id: Optional[str] = None) -> None:
+        """Drop one patient's roster (or all); the next get() refetches."""
+        with self._lock:
+            self._counters["invalidations"] += 1
+            if patient_id is None:
+                for pid in self._entries:
+                    self._versions[pid] = self._versions.get(pid, 0) + 1
+                self._entries.clear()
+            elif self._entries.pop(patient_id, None) is not None:
+                self._versions[patient_id] = self._versions.get(patient_id, 0) + 1
+
+    def stats(self) -> Dict:
+        with self._lock:
+            lookups = self._counters["hits"] + self._counters["misses"] + self._counters["stale"]
+            return {
+                **self._counters,
+                "entries": len(self._entries),
+                "ttl_seconds": self.ttl,
+                "hit_rate": round(self._counters["hits"] / lookups, 3) if lookups else 0.0,
+            }
+
+
+class InvalidationLog:
+    """Numbered record of recent patient invalidations (seq starts at 1)."""
+
+    def __init__(self, keep: int = 256):
+        self._lock = threading.Lock()
+        self._seq = 0
+        self._recent: deque = deque(maxlen=keep)
+
+    def record(self, patient_id: Optional[str]) -> int:
+        with self._lock:
+            self._seq += 1
+            self._recent.append((self._seq, patient_id))
+            return self._seq
+
+    def snapshot(self) -> Dict:
+        """{"seq": last seq, "recent": [[seq, patient_id], ...]}; older entries are dropped."""
+        with self._lock:
+            return {"seq": self._seq, "recent": [list(item) for item in self._recent]}
@@ -0,0 +1,539 @@
+"""
+Memora Multi-process Serving
+Pre-fork supervisor: preload once, fork N app workers, route by patientId.
+
+    python serve_multiprocess.py            # SERVE_WORKERS=4 GRADIO_SERVER_PORT=7860
+
+The supervisor process does everything that is safe to share across fork():
+heavy imports (numpy, OpenCV, TensorFlow/DeepFace modules, Gradio),
+verified local weights, and page-cache warming of the model artifacts and
+the gallery store. It then gc.freeze()s and forks. Workers share those
+pages copy-on-write; galleries are np.memmaps of the same files, so their
+pages are shared through the page cache.
+
+The model itself is NOT shared. Every runtime starts thread pools when it
+builds or first runs a model (TensorFlow, XNNPACK, ONNX Runtime), and those
+threads do not survive fork(), so each worker builds its own from the
+already-warm file. Model memory therefore scales with SERVE_WORKERS:
+/v1/workers reports each worker's RSS, PSS and private memory, and the
+PSS total is what the workers really use together.
+
+Each worker imports app_optimized and serves it on 127.0.0.1:<WORKER_BASE_PORT + i>
+with 1/N of the cores for its model threads. A router process owns the
+public port:
+
+    /v1/recognize, /v1/recognize/multi   routed by hash(patientId)
+    /v1/stream                           routed by the hello message's patientId
+    /v1/enroll                           worker 0 (the only enrollment poller); needs ADMIN_TOKEN
+    /v1/invalidate                       internal: not reachable through the router
+    /v1/workers                          per-worker health and load
+    /w/<i>/<path>                        any path on one worker (/w/2/metrics)
+    everything else (Gradio UI)          worker 0
+
+The same patient always reaches the same worker, so its roster, gallery
+matrix and result caches stay warm. If that worker is unhealthy, or refuses
+the connection, the next healthy one takes the request; with none left the
+client gets error_type "overloaded", as from a busy worker.
+
+Enrollment makes a worker drop the patient's roster and cached results. Each
+worker numbers those invalidations in its /v1/health answer; the router
+replays new ones on every other healthy worker (POST /v1/invalidate), right
+after a /v1/enroll and otherwise at the next health probe, so a poller-driven
+enrollment reaches all workers within HEALTH_INTERVAL. /v1/invalidate takes
+the admin token like /admin/*; without ADMIN_TOKEN the supervisor makes up
+a random one, so only the router can call it (and /v1/enroll is off). The supervisor restarts any process that
+exits, backing off when one crash-loops.
+"""
+
+import asyncio
+import gc
+import hashlib
+import importlib
+import json
+import os
+import secrets
+import signal
+import sys
+import time
+from contextlib import asynccontextmanager
+from pathlib import Path
+from typing import Collection, Dict, List, Optional, Tuple
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+SERVE_WORKERS = int(os.environ.get("SERVE_WORKERS", str(max(1, min(4, os.cpu_count() or 1)))))
+WORKER_BASE_PORT = int(os.environ.get("WORKER_BASE_PORT", "7870"))  # Worker i listens on this + i (localhost)
+HOST = os.environ.get("GRADIO_SERVER_NAME", "0.0.0.0")
+PORT = int(os.environ.get("GRADIO_SERVER_PORT", "7860"))
+PRELOAD_MODULES = os.environ.get("PRELOAD_MODULES", "numpy,cv2,tensorflow,deepface,gradio,fastapi,httpx").split(",")
+HEALTH_INTERVAL = float(os.environ.get("HEALTH_INTERVAL", "2"))  # Seconds between worker probes
+PROXY_TIMEOUT = float(os.environ.get("PROXY_TIMEOUT", "60"))
+MODEL_NAME = "Facenet512"
+ROUTED_PATHS = ("/v1/recognize", "/v1/recognize/multi")
+INTERNAL_PATHS = ("/v1/invalidate",)
+HOP_HEADERS = {"host", "content-length", "connection", "keep-alive", "transfer-encoding", "upgrade"}
+
+
+def route(patient_id: str, workers: int) -> int:
+    """Stable worker index for a patient (same on every router restart)."""
+    digest = hashlib.blake2b((patient_id or "").strip().encode(), digest_size=8).digest()
+    return int.from_bytes(digest, "big") % workers
+
+
+# --- supervisor ---
+
+def warm_file(path: str) -> int:
+    """Pull a file into the page cache; returns its size."""
+    size = os.path.getsize(path)
+    with open(path, "rb") as f:
+        if hasattr(os, "posix_fadvise"):
+            os.posix_fadvise(f.fileno(), 0, 0, os.POSIX_FADV_WILLNEED)
+        else:
+            while f.read(1 << 20):
+                pass
+    return size
+
+
+def preload(startup) -> Dict:
+    """Fork-safe warm-up shared by every worker."""
+    notes = {"modules": [], "missing_modules": [], "warmed_bytes": 0}
+    with startup.phase("imports"):
+        for name in filter(None, (m.strip() for m in PRELOAD_MODULES)):
+            try:
+                importlib.import_module(name)
+                notes["modules"].append(name)
+            except ImportError:
+                notes["missing_modules"].append(name)
+
+    from model_artifacts import deepface_weights_dir, install_local_weights
+
+    artifact_dir = os.environ.get("MODEL_ARTIFACT_DIR", os.path.join(BASE_DIR, "artifacts"))
+    gallery_dir = os.environ.get("GALLERY_DIR", os.path.join(BASE_DIR, "gallery_data"))
+    with startup.phase("verify_artifacts"):
+        notes["weights_source"] = install_local_weights(artifact_dir, MODEL_NAME)
+    with startup.phase("page_cache"):
+        for root in (artifact_dir, str(deepface_weights_dir()), gallery_dir):
+            for path in Path(root).rglob("*") if os.path.isdir(root) else []:
+                if path.is_file():
+                    notes["warmed_bytes"] += warm_file(str(path))
+    gc.collect()
+    gc.freeze()  # keep the collector from dirtying shared pages in the workers
+    return notes
+
+
+def worker_environment(index: int) -> None:
+    """Per-worker settings, applied in the child before app_optimized is imported."""
+    cores = max(1, (os.cpu_count() or 1) // SERVE_WORKERS)
+    os.environ["WORKER_INDEX"] = str(index)
+    for key in ("TF_NUM_INTRAOP_THREADS", "OMP_NUM_THREADS", "EMBEDDER_THREADS"):
+        os.environ.setdefault(key, str(cores))
+    os.environ.setdefault("TF_NUM_INTEROP_THREADS", "1")
+    os.environ.setdefault("CPU_WORKERS", str(cores))
+    if index != 0:
+        os.environ["ENROLLMENT_POLL_SECONDS"] = "0"  # one poller writes the shared gallery
+    if "TRACE_EXPORT" not in os.environ:
+        os.environ["TRACE_EXPORT"] = "jsonl:" + os.path.join(BASE_DIR, "traces", f"spans-worker{index}.jsonl")
+
+
+def run_worker(index: int) -> None:
+    worker_environment(index)
+    import uvicorn
+    import app_optimized
+
+    uvicorn.run(app_optimized.app, host="127.0.0.1", port=WORKER_BASE_PORT + index, log_level="warning")
+
+
+def run_router(startup_notes: Dict) -> None:
+    import uvicorn
+
+    uvicorn.run(build_router(startup_notes), host=HOST, port=PORT, log_level="warning")
+
+
+class Supervisor:
+    """Forks and restarts the router and the workers."""
+
+    def __init__(self, workers: int):
+        self.workers = workers
+        self.children: Dict[int, str] = {}          # pid -> "router" | "worker:<i>"
+        self.started: Dict[str, float] = {}
+        self.backoff: Dict[str, float] = {}
+        self.stopping = False
+
+    def spawn(self, role: str, target, *args) -> None:
+        sys.stdout.flush()  # or the child inherits (and repeats) buffered output
+        pid = os.fork()
+        if pid == 0:
+            code = 0
+            try:
+                signal.signal(signal.SIGTERM, signal.SIG_DFL)
+                signal.signal(signal.SIGINT, signal.SIG_DFL)
+                target(*args)
+            except BaseException as e:
+                print(f"❌ {role} exited: {e}")
+                code = 1
+            finally:
+                sys.stdout.flush()
+                os._exit(code)
+        self.children[pid] = role
+        self.started[role] = time.monotonic()
+        print(f"🚀 {role} started (pid {pid})")
+
+    def stop(self, *_) -> None:
+        self.stopping = True
+        for pid in list(self.children):
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+
+    def roles(self, startup_notes: Dict) -> Dict[str, tuple]:
+        """role -> (target, args) for every child process."""
+        roles = {f"worker:{i}": (run_worker, (i,)) for i in range(self.workers)}
+        roles["router"] = (run_router, (startup_notes,))
+        return roles
+
+    def run(self, startup_notes: Dict) -> None:
+        signal.signal(signal.SIGTERM, self.stop)
+        signal.signal(signal.SIGINT, self.stop)
+        roles = self.roles(startup_notes)
+        for role, (target, args) in roles.items():
+            self.spawn(role, target, *args)
+
+        restarts: Dict[str, float] = {}             # role -> monotonic time it is due
+        while self.children or (restarts and not self.stopping):
+            try:
+                pid, status = os.waitpid(-1, os.WNOHANG)
+            except ChildProcessError:
+                pid, status = 0, 0
+            if pid:
+                role = self.children.pop(pid, None)
+                if role is None or self.stopping:
+                    continue
+                uptime = time.monotonic() - self.started[role]
+                # Crash loop: double the wait (max 30s); a run longer than a minute resets it
+                delay = 1.0 if uptime > 60 else min(30.0, self.backoff.get(role, 0.5) * 2)
+                self.backoff[role] = delay
+                restarts[role] = time.monotonic() + delay
+                print(f"⚠️ {role} (pid {pid}) exited with status {status} after {uptime:.0f}s; "
+                      f"restarting in {delay:.0f}s")
+                continue
+            for role, due in list(restarts.items()):
+                if due <= time.monotonic() and not self.stopping:
+                    del restarts[role]
+                    target, args = roles[role]
+                    self.spawn(role, target, *args)
+            time.sleep(0.2)
+
+
+# --- router ---
+
+def unavailable(message: str) -> Dict:
+    """Body for requests no worker could take (same shape as the app's overloaded response)."""
+    return {"error": message, "match": False, "error_type": "overloaded",
+            "suggestion": "Please try again in a few seconds"}
+
+class WorkerState:
+    """What the router knows about one worker."""
+
+    def __init__(self, index: int):
+        self.index = index
+        self.url = f"http://127.0.0.1:{WORKER_BASE_PORT + index}"
+        self.healthy = False
+        self.pid: Optional[int] = None
+        self.restarts = 0
+        self.in_flight = 0
+        self.requests = 0
+        self.errors = 0
+        self.latency_ewma_ms: Optional[float] = None
+        self.last_health: Dict = {}
+        self.last_probe: Optional[float] = None
+        self.invalidation_seq: Optional[int] = None  # last of its invalidations replayed elsewhere
+
+    def observe(self, elapsed_s: float, ok: bool) -> None:
+        self.requests += 1
+        self.errors += int(not ok)
+        ms = elapsed_s * 1000.0
+        self.latency_ewma_ms = ms if self.latency_ewma_ms is None else 0.9 * self.latency_ewma_ms + 0.1 * ms
+
+    def snapshot(self) -> Dict:
+        admission = self.last_health.get("admission", {})
+        return {
+            "index": self.index,
+            "url": self.url,
+            "healthy": self.healthy,
+            "ready": self.last_health.get("ready", False),
+            "pid": self.pid,
+            "restarts": self.restarts,
+            "in_flight": self.in_flight,
+            "requests": self.requests,
+            "errors": self.errors,
+            "latency_ewma_ms": round(self.latency_ewma_ms, 3) if self.latency_ewma_ms is not None else None,
+            "active": admission.get("active"),
+            "queued": admission.get("queued"),
+            "rejected": admission.get("rejected"),
+            "embed_queue_depth": self.last_health.get("embed_queue_depth"),
+            "memory": self.last_health.get("memory", {}),
+            "last_probe": self.last_probe,
+        }
+
+
+def pick_worker(workers: List[WorkerState], patient_id: Optional[str],
+                tried: Collection[int] = ()) -> Optional[WorkerState]:
+    """
+    Owner of the patient (worker 0 without one), else the next healthy worker
+    after it. Workers in `tried` are skipped. With no healthy worker left the
+    owner is still returned (the health view may be stale), unless it was
+    already tried: then None.
+    """
+    home = route(patient_id, len(workers)) if patient_id else 0
+    for step in range(len(workers)):
+        worker = workers[(home + step) % len(workers)]
+        if worker.healthy and worker.index not in tried:
+            return worker
+    return workers[home] if home not in tried else None
+
+
+def new_invalidations(log: Dict, seen: Optional[int]) -> Tuple[List[Optional[str]], Optional[int]]:
+    """
+    Patients a worker invalidated after seq `seen`, and its current seq.
+
+    `log` is the "invalidations" field of its /v1/health. With seen None (first
+    probe) nothing is replayed. [None] means "every patient": entries after
+    `seen` already fell out of the worker's log.
+    """
+    if not log:
+        return [], seen
+    seq = log.get("seq", 0)
+    if seen is None:
+        return [], seq
+    if seq < seen:
+        seen = 0  # the worker restarted and counts from 1 again
+    fresh = [(number, patient_id) for number, patient_id in log.get("recent", []) if number > seen]
+    if seq > seen and (not fresh or fresh[0][0] > seen + 1):
+        return [None], seq
+    return list(dict.fromkeys(patient_id for _, patient_id in fresh)), seq
+
+
+async def broadcast_invalidation(client, workers: List[WorkerState], patient_ids: List[Optional[str]],
+                                 source: int) -> int:
+    """POST /v1/invalidate for each patient to every healthy worker but `source`; returns successes."""
+    import httpx
+
+    headers = {"x-admin-token": os.environ.get("ADMIN_TOKEN", "")}
+
+    async def post(worker: WorkerState, patient_id: Optional[str]) -> bool:
+        body = {"patientId": patient_id} if patient_id is not None else {"all": True}
+        try:
+            resp = await client.post(worker.url + "/v1/invalidate", json=body, headers=headers, timeout=2.0)
+        except httpx.HTTPError as e:
+            print(f"⚠️ Invalidation of {patient_id} on worker {worker.index} failed: {e}")
+            return False
+        return resp.status_code == 200
+
+    targets = [w for w in workers if w.healthy and w.index != source]
+    results = await asyncio.gather(*(post(w, p) for w in targets for p in patient_ids))
+    return sum(results)
+
+
+async def probe(client, worker: WorkerState, workers: List[WorkerState]) -> None:
+    """Refresh one worker's health and replay its new invalidations on the others."""
+    import httpx
+
+    try:
+        resp = await client.get(worker.url + "/v1/health", timeout=2.0)
+        health = resp.json()
+    except (httpx.HTTPError, ValueError):
+        worker.healthy = False
+        worker.last_probe = round(time.time(), 3)
+        return
+    if worker.pid is not None and health.get("pid") != worker.pid:
+        worker.restarts += 1
+        worker.invalidation_seq = 0  # everything the new process logged is new
+    worker.pid = health.get("pid")
+    worker.last_health = health
+    worker.healthy = resp.status_code == 200 and bool(health.get("ready"))
+    worker.last_probe = round(time.time(), 3)
+
+    patient_ids, worker.invalidation_seq = new_invalidations(health.get("invalidations"),
+                                                             worker.invalidation_seq)
+    if patient_ids:
+        await broadcast_invalidation(client, workers, patient_ids, source=worker.index)
+
+
+def build_router(startup_notes: Dict):
+    import httpx
+    import websockets
+    from fastapi import FastAPI, Request, WebSocket, WebSocketDisconnect
+    from fastapi.responses import JSONResponse, Response, StreamingResponse
+
+    from metrics import process_memory
+
+    workers: List[WorkerState] = [WorkerState(i) for i in range(SERVE_WORKERS)]
+    client = httpx.AsyncClient(timeout=PROXY_TIMEOUT, limits=httpx.Limits(max_connections=64 * SERVE_WORKERS))
+
+    async def probe_all() -> None:
+        await asyncio.gather(*(probe(client, w, workers) for w in workers))
+
+    async def monitor() -> None:
+        while True:
+            await probe_all()
+            await asyncio.sleep(HEALTH_INTERVAL)
+
+    @asynccontextmanager
+    async def lifespan(_app):
+        task = asyncio.get_running_loop().create_task(monitor())
+        try:
+            yield
+        finally:
+            task.cancel()
+            await client.aclose()
+
+    router = FastAPI(title="Memora Multi-process Router", lifespan=lifespan)
+
+    async def patient_of(request: Request) -> Optional[str]:
+        patient_id = request.query_params.get("patientId") or request.headers.get("x-patient-id")
+        if not patient_id and request.headers.get("content-type", "").startswith("multipart/form-data"):
+            await request.body()  # cached, so the proxied body is still available
+            patient_id = (await request.form()).get("patientId")
+        return patient_id
+
+    async def send(worker: WorkerState, request: Request, path: str):
+        """(response, None) from one worker, or (None, error); the worker is marked unhealthy on errors."""
+        headers = {k: v for k, v in request.headers.items() if k.lower() not in HOP_HEADERS}
+        upstream = client.build_request(request.method, worker.url + path, params=request.query_params,
+                                        headers=headers, content=await request.body())
+        worker.in_flight += 1
+        start = time.perf_counter()
+        try:
+            return await client.send(upstream, stream=True), None
+        except httpx.HTTPError as e:
+            worker.in_flight -= 1
+            worker.observe(time.perf_counter() - start, ok=False)
+            worker.healthy = False
+            return None, e
+
+    async def forward(worker: WorkerState, request: Request, path: str,
+                      patient_id: Optional[str] = None, failover: bool = True) -> Response:
+        # A refused connection never reached the worker, so the next one can take it
+        tried = set()
+        while True:
+            tried.add(worker.index)
+            start = time.perf_counter()
+            resp, error = await send(worker, request, path)
+            if resp is not None:
+                break
+            retry = pick_worker(workers, patient_id, tried) if failover else None
+            if not isinstance(error, httpx.ConnectError) or retry is None:
+                return JSONResponse(unavailable(f"Worker {worker.index} unavailable: {error}"), status_code=503,
+                                    headers={"retry-after": "2"})
+            worker = retry
+
+        async def body():
+            try:
+                async for chunk in resp.aiter_raw():
+                    yield chunk
+            finally:
+                await resp.aclose()
+                worker.in_flight -= 1
+                worker.observe(time.perf_counter() - start, ok=resp.status_code < 500)
+
+        response_headers = {k: v for k, v in resp.headers.items() if k.lower() not in HOP_HEADERS}
+        return StreamingResponse(body(), status_code=resp.status_code, headers=response_headers)
+
+    @router.get("/v1/workers")
+    async def workers_http():
+        snapshots = [w.snapshot() for w in workers]
+        return JSONResponse({
+            "workers": snapshots,
+            "healthy": sum(w.healthy for w in workers),
+            "memory": {
+                # rss counts shared pages once per worker; pss is the real combined footprint
+                "workers_rss_mb": round(sum(w["memory"].get("rss_mb", 0.0) for w in snapshots), 1),
+                "workers_pss_mb": round(sum(w["memory"].get("pss_mb", 0.0) for w in snapshots), 1),
+                "workers_private_mb": round(sum(w["memory"].get("private_mb", 0.0) for w in snapshots), 1),
+                "router": process_memory(),
+            },
+            "preload": startup_notes,
+        })
+
+    @router.websocket("/v1/stream")
+    async def stream_ws(websocket: WebSocket):
+        await websocket.accept()
+        hello = await websocket.receive_json()
+        patient_id = (hello or {}).get("patientId")
+        tried = set()
+        while True:
+            worker = pick_worker(workers, patient_id, tried)
+            if worker is None:
+                await websocket.send_json(unavailable("No worker available for this stream"))
+                await websocket.close(code=1013)  # try again later
+                return
+            tried.add(worker.index)
+            try:
+                upstream = await websockets.connect(worker.url.replace("http", "ws", 1) + "/v1/stream")
+            except (OSError, asyncio.TimeoutError, websockets.InvalidHandshake) as e:
+                print(f"⚠️ Stream connect to worker {worker.index} failed: {e}")
+                worker.healthy = False
+                continue
+            break
+        try:
+            async with upstream:
+                await upstream.send(json.dumps(hello))
+
+                async def downstream():
+                    async for message in upstream:
+                        if isinstance(message, str):
+                            await websocket.send_text(message)
+                        else:
+                            await websocket.send_bytes(message)
+
+                relay = asyncio.get_running_loop().create_task(downstream())
+                try:
+                    while True:
+                        await upstream.send(await websocket.receive_bytes())
+                finally:
+                    relay.cancel()
+        except (WebSocketDisconnect, websockets.ConnectionClosed):
+            pass
+
+    @router.api_route("/w/{index}/{path:path}", methods=["GET", "POST"])
+    async def worker_passthrough(index: int, path: str, request: Request):
+        if not 0 <= index < len(workers):
+            return JSONResponse({"error": f"No worker {index}"}, status_code=404)
+        if "/" + path in INTERNAL_PATHS:
+            return JSONResponse({"error": "Not found"}, status_code=404)
+        return await forward(workers[index], request, "/" + path, failover=False)
+
+    @router.api_route("/{path:path}", methods=["GET", "POST", "PUT", "DELETE", "PATCH", "OPTIONS", "HEAD"])
+    async def proxy(path: str, request: Request):
+        path = "/" + path
+        if path in INTERNAL_PATHS:
+            return JSONResponse({"error": "Not found"}, status_code=404)
+        patient_id = await patient_of(request) if path in ROUTED_PATHS else None
+        response = await forward(pick_worker(workers, patient_id), request, path, patient_id)
+        if path == "/v1/enroll":
+            # The worker has enrolled (and logged the invalidation) before answering; replay it now
+            await probe_all()
+        return response
+
+    return router
+
+
+def main():
+    from model_artifacts import StartupTimings
+
+    startup = StartupTimings()
+    if not os.environ.get("ADMIN_TOKEN"):
+        # Workers inherit it: the router can replay invalidations, nobody else knows it
+        os.environ["ADMIN_TOKEN"] = secrets.token_hex(16)
+        print("⚠️ ADMIN_TOKEN not set: using a random internal token (/admin and /v1/enroll unreachable)")
+    print(f"⏳ Preloading for {SERVE_WORKERS} workers...")
+    notes = preload(startup)
+    startup.mark_ready()
+    notes["phases"] = startup.snapshot()
+    print(f"✅ Preloaded ({notes['warmed_bytes'] / 1e6:.1f} MB warmed, modules: {', '.join(notes['modules'])}); "
+          f"serving on {HOST}:{PORT}")
+    Supervisor(SERVE_WORKERS).run(notes)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,183 @@
+"""
+Memora Streaming Recognition
+Per-session face tracking for camera streams.
+
+Frames are run through the detector, detections are associated with existing
+tracks by IoU, and a face is only embedded when a new track appears or its
+last embedding is older than embedding_ttl seconds. A 30 fps session therefore
+costs about one embedding per person instead of one per frame. Sessions that
+receive no frames for idle_timeout seconds are dropped.
+"""
+
+import itertools
+import threading
+import time
+from dataclasses import dataclass, field
+from typing import Callable, Dict, List, Optional
+
+import numpy as np
+
+
+def iou(a: Dict[str, int], b: Dict[str, int]) -> float:
+    """Intersection over union of two {x, y, w, h} boxes."""
+    ax2, ay2 = a['x'] + a['w'], a['y'] + a['h']
+    bx2, by2 = b['x'] + b['w'], b['y'] + b['h']
+    iw = max(0, min(ax2, bx2) - max(a['x'], b['x']))
+    ih = max(0, min(ay2, by2) - max(a['y'], b['y']))
+    inter = iw * ih
+    union = a['w'] * a['h'] + b['w'] * b['h'] - inter
+    return inter / union if union > 0 else 0.0
+
+
+@dataclass
+class Track:
+    track_id: int
+    bbox: Dict[str, int]
+    identity: Dict = field(default_factory=dict)
+    embedded_at: float = 0.0
+    last_seen: float = 0.0
+    missed: int = 0
+    embeddings: int = 0
+
+
+class StreamSession:
+    """Tracker state for one camera stream."""
+
+    _ids = itertools.count(1)
+
+    def __init__(self, patient_id: str, iou_threshold: float = 0.3,
+                 embedding_ttl: float = 5.0, max_missed: int = 15, detect_every: int = 1):
+        self.patient_id = patient_id
+        self.iou_threshold = iou_threshold
+        self.embedding_ttl = embedding_ttl
+        self.max_missed = max_missed
+        self.detect_every = max(1, int(detect_every))
+
+        self.tracks: List[Track] = []
+        self.last_results: List[Dict] = []
+        self.lock = threading.Lock()
+        self.created_at = self.last_active = time.monotonic()
+        self.stats = {"frames": 0, "frames_dropped": 0, "frames_overloaded": 0, "detections": 0,
+                      "embeddings": 0, "tracks_created": 0}
+
+    def _associate(self, detections) -> List[Optional[Track]]:
+        """Greedy IoU matching of detections to live tracks."""
+        pairs = sorted(
+            ((iou(det.bbox, track.bbox), d, t)
+             for d, det in enumerate(detections)
+             for t, track in enumerate(self.tracks)),
+            key=lambda p: p[0], reverse=True)
+        matched: List[Optional[Track]] = [None] * len(detections)
+        used = set()
+        for score, d, t in pairs:
+            if score < self.iou_threshold:
+                break
+            if matched[d] is None and t not in used:
+                matched[d] = self.tracks[t]
+                used.add(t)
+        return matched
+
+    def process(self, frame, detect_fn: Callable, embed_fn: Callable, identify_fn: Callable) -> List[Dict]:
+        """
+        Update tracks with one frame and return the current per-track results.
+
+        detect_fn(frame) -> [FaceResult]; embed_fn([FaceResult]) embeds in
+        place; identify_fn(embeddings) -> one identity dict per embedding.
+        """
+        now = time.monotonic()
+        self.last_active = now
+        self.stats["frames"] += 1
+
+        if (self.stats["frames"] - 1) % self.detect_every == 0:
+            detections = detect_fn(frame)
+            self.stats["detections"] += 1
+            matched = self._associate(detections)
+
+            to_embed, targets = [], []
+            seen = set()
+            for det, track in zip(detections, matched):
+                if track is None:
+                    track = Track(track_id=next(self._ids), bbox=det.bbox)
+                    self.tracks.append(track)
+                    self.stats["tracks_created"] += 1
+                track.bbox = det.bbox
+                track.last_seen = now
+                track.missed = 0
+                seen.add(track.track_id)
+                if not track.identity or now - track.embedded_at > self.embedding_ttl:
+                    to_embed.append(det)
+                    targets.append(track)
+
+            for track in self.tracks:
+                if track.track_id not in seen:
+                    track.missed += 1
+            self.tracks = [t for t in self.tracks if t.missed <= self.max_missed]
+
+            if to_embed:
+                embed_fn(to_embed)
+                ready = [(det, track) for det, track in zip(to_embed, targets) if det.embedding is not None]
+                if ready:
+                    identities = identify_fn(np.stack([det.embedding for det, _ in ready]))
+                    for (det, track), identity in zip(ready, identities):
+                        track.identity = identity
+                        track.embedded_at = now
+                        track.embeddings += 1
+                    self.stats["embeddings"] += len(ready)
+
+        self.last_results = [
+            {"track_id": t.track_id, "bbox": t.bbox, "embeddings": t.embeddings, **t.identity}
+            for t in self.tracks if t.missed == 0 and t.identity
+        ]
+        return self.last_results
+
+
+class StreamSessionManager:
+    """Owns all live sessions and expires idle ones."""
+
+    def __init__(self, idle_timeout: float = 30.0, max_sessions: int = 64, **session_kwargs):
+        self.idle_timeout = idle_timeout
+        self.max_sessions = max_sessions
+        self.session_kwargs = session_kwargs
+        self._lock = threading.Lock()
+        self._sessions: Dict[str, StreamSession] = {}
+        self._expired = 0
+
+    def get(self, session_id: str, patient_id: str) -> StreamSession:
+        """Return the session, creating it (or resetting on patient change)."""
+        self.reap()
+        with self._lock:
+            session = self._sessions.get(session_id)
+            if session is None or session.patient_id != patient_id:
+                if session is None and len(self._sessions) >= self.max_sessions:
+                    oldest = min(self._sessions, key=lambda k: self._sessions[k].last_active)
+                    del self._sessions[oldest]
+                    self._expired += 1
+                session = self._sessions[session_id] = StreamSession(patient_id, **self.session_kwargs)
+            return session
+
+    def close(self, session_id: str) -> None:
+        with self._lock:
+            self._sessions.pop(session_id, None)
+
+    def reap(self) -> None:
+        cutoff = time.monotonic() - self.idle_timeout
+        with self._lock:
+            idle = [k for k, s in self._sessions.items() if s.last_active < cutoff]
+            for k in idle:
+                del self._sessions[k]
+            self._expired += len(idle)
+
+    def stats(self) -> Dict:
+        self.reap()
+        with self._lock:
+            sessions = list(self._sessions.values())
+            frames = sum(s.stats["frames"] for s in sessions)
+            embeddings = sum(s.stats["embeddings"] for s in sessions)
+            return {
+                "active_sessions": len(sessions),
+                "expired_sessions": self._expired,
+                "frames": frames,
+                "embeddings": embeddings,
+                "embeddings_per_frame": round(embeddings / frames, 4) if frames else 0.0,
+                "idle_timeout_seconds": self.idle_timeout,
+            }
@@ -0,0 +1,5 @@
+import sys
+from pathlib import Path
+
+# Modules live flat in inference_v3/, as the benchmarks import them
+sys.path.insert(0, str(Path(__file__).parent.parent))
@@ -0,0 +1,68 @@
+import threading
+import time
+
+import pytest
+
+from executors import AdmissionController, Overloaded
+
+
+def hold_slot(controller, started, release):
+    with controller.admit():
+        started.set()
+        release.wait(5)
+
+
+def test_admit_without_wait_rejects_when_full():
+    controller = AdmissionController(max_in_flight=1, max_queued=4)
+    started, release = threading.Event(), threading.Event()
+    holder = threading.Thread(target=hold_slot, args=(controller, started, release))
+    holder.start()
+    assert started.wait(5)
+
+    # Queue room is left, but wait=False never takes it
+    with pytest.raises(Overloaded):
+        with controller.admit(wait=False):
+            pass
+    stats = controller.stats()
+    assert stats["rejected"] == 1 and stats["queued"] == 0
+
+    release.set()
+    holder.join(5)
+    with controller.admit(wait=False):
+        assert controller.stats()["active"] == 1
+    assert controller.stats()["completed"] == 2
+
+
+def test_queued_caller_gets_freed_slot():
+    controller = AdmissionController(max_in_flight=1, max_queued=1, queue_timeout=5)
+    started, release = threading.Event(), threading.Event()
+    holder = threading.Thread(target=hold_slot, args=(controller, started, release))
+    holder.start()
+    assert started.wait(5)
+    threading.Timer(0.05, release.set).start()
+    with controller.admit():
+        pass
+    holder.join(5)
+    assert controller.stats()["admitted"] == 2
+
+
+def test_full_queue_and_timeout_reject():
+    controller = AdmissionController(max_in_flight=1, max_queued=0, queue_timeout=0.05)
+    started, release = threading.Event(), threading.Event()
+    holder = threading.Thread(target=hold_slot, args=(controller, started, release))
+    holder.start()
+    assert started.wait(5)
+    with pytest.raises(Overloaded):
+        with controller.admit():
+            pass
+
+    controller.max_queued = 1
+    start = time.monotonic()
+    with pytest.raises(Overloaded):
+        with controller.admit():
+            pass
+    assert time.monotonic() - start >= 0.05
+    release.set()
+    holder.join(5)
+    stats = controller.stats()
+    assert stats["rejected"] == 2 and stats["timed_out"] == 1
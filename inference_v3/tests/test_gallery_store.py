@@ -0,0 +1,74 @@
+import multiprocessing
+import os
+
+import numpy as np
+import pytest
+
+from gallery_store import GalleryStore
+
+MODEL = "Facenet512"
+
+
+def entry(i, dim=8):
+    rng = np.random.default_rng(i)
+    return {"member_id": f"member-{i % 3}", "photo_url": f"https://photos/{i}.jpg", "model": MODEL,
+            "embedding": rng.normal(size=dim)}
+
+
+def write_rows(root, start, count):
+    store = GalleryStore(root, dim=8)
+    for i in range(start, start + count):
+        store.put_many("patient", [entry(i)])
+
+
+def test_put_many_then_load_roundtrip(tmp_path):
+    store = GalleryStore(str(tmp_path), dim=8)
+    store.put_many("patient", [entry(0), entry(1)])
+
+    gallery = GalleryStore(str(tmp_path), dim=8).load("patient")
+    assert gallery.version == 1
+    assert len(gallery) == 2
+    expected = entry(1)["embedding"] / np.linalg.norm(entry(1)["embedding"])
+    np.testing.assert_allclose(gallery.vectors(gallery.url_to_row[("https://photos/1.jpg", MODEL)]),
+                               expected, rtol=1e-6)
+
+
+def test_remove_member(tmp_path):
+    store = GalleryStore(str(tmp_path), dim=8)
+    store.put_many("patient", [entry(i) for i in range(6)])
+    gallery = store.remove("patient", member_id="member-0")
+    assert {row["member_id"] for row in gallery.rows} == {"member-1", "member-2"}
+    assert gallery.version == 2
+
+
+def test_other_process_write_is_seen(tmp_path):
+    reader = GalleryStore(str(tmp_path), dim=8)
+    writer = GalleryStore(str(tmp_path), dim=8)
+    writer.put_many("patient", [entry(0)])
+    assert len(reader.load("patient")) == 1
+    # Back-to-back writes can share an mtime; the index inode still changes
+    writer.put_many("patient", [entry(1)])
+    assert len(reader.load("patient")) == 2
+
+
+@pytest.mark.skipif(not hasattr(os, "fork"), reason="needs fork")
+def test_concurrent_writers_lose_no_rows(tmp_path):
+    processes, per_process = 4, 15
+    context = multiprocessing.get_context("fork")
+    workers = [context.Process(target=write_rows, args=(str(tmp_path), k * per_process, per_process))
+               for k in range(processes)]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join(timeout=60)
+        assert worker.exitcode == 0
+
+    gallery = GalleryStore(str(tmp_path), dim=8).load("patient")
+    assert len(gallery) == processes * per_process
+    assert gallery.version == processes * per_process
+    assert gallery.matrix.shape == (processes * per_process, 8)
+    for i in range(processes * per_process):
+        vector = entry(i)["embedding"]
+        np.testing.assert_allclose(gallery.vectors(gallery.url_to_row[(f"https://photos/{i}.jpg", MODEL)]),
+                                   vector / np.linalg.norm(vector), rtol=1e-6)
+    assert not [name for name in os.listdir(tmp_path / "patient") if name.endswith(".tmp")]
@@ -0,0 +1,111 @@
+import numpy as np
+
+from matching import (PrefilterConfig, assign_members, build_gallery_matrix, match_members, match_members_batch,
+                      shortlist_members)
+
+
+def random_gallery(members, photos_per_member, dim=32, seed=0):
+    """Shuffled rows, so build_gallery_matrix has to regroup them by member."""
+    rng = np.random.default_rng(seed)
+    member_ids = [f"member-{m}" for m in range(members) for _ in range(photos_per_member)]
+    embeddings = rng.normal(size=(len(member_ids), dim)).astype(np.float32)
+    order = rng.permutation(len(member_ids))
+    return embeddings[order], [member_ids[i] for i in order]
+
+
+def naive_min_distances(embeddings, member_ids, query):
+    """The per-photo loop the engine replaced: cosine distance per photo, min per member."""
+    best = {}
+    for embedding, member_id in zip(embeddings, member_ids):
+        distance = 1.0 - np.dot(query, embedding) / (np.linalg.norm(query) * np.linalg.norm(embedding))
+        best[member_id] = min(best.get(member_id, np.inf), distance)
+    return best
+
+
+def test_segment_min_matches_naive_loop():
+    embeddings, member_ids = random_gallery(members=7, photos_per_member=5)
+    gallery = build_gallery_matrix(embeddings, member_ids)
+    query = np.random.default_rng(1).normal(size=embeddings.shape[1])
+
+    expected = naive_min_distances(embeddings, member_ids, query)
+    distances = match_members(gallery, query)
+    assert len(distances) == len(expected)
+    for member_id, distance in zip(gallery.member_ids, distances):
+        assert abs(distance - expected[member_id]) < 1e-5
+
+
+def test_uneven_segments_and_batch_rows_match_single_queries():
+    rng = np.random.default_rng(2)
+    member_ids = ["a"] * 1 + ["b"] * 4 + ["c"] * 2
+    embeddings = rng.normal(size=(len(member_ids), 16))
+    gallery = build_gallery_matrix(embeddings, member_ids)
+    assert gallery.member_ids == ["a", "b", "c"]
+    assert gallery.photo_counts.tolist() == [1, 4, 2]
+
+    queries = rng.normal(size=(3, 16))
+    batch = match_members_batch(gallery, queries)
+    assert batch.shape == (3, 3)
+    for query, row in zip(queries, batch):
+        np.testing.assert_allclose(row, match_members(gallery, query), atol=1e-6)
+
+
+def test_empty_gallery():
+    gallery = build_gallery_matrix(np.zeros((0, 8)), [])
+    assert match_members(gallery, np.ones(8)).shape == (0,)
+    assert match_members_batch(gallery, np.ones((2, 8))).shape == (2, 0)
+
+
+def test_assign_members_is_one_to_one():
+    distances = np.array([[0.1, 0.5],
+                          [0.2, 0.3],
+                          [0.9, 0.9]])
+    # Face 1 is closest to member 0 too, but face 0 took it first
+    assert assign_members(distances, threshold=0.4) == [0, 1, None]
+
+
+def clustered_gallery(members=64, photos_per_member=6, dim=64, spread=0.35, seed=3):
+    """Members as tight clusters around their own direction, like real identities."""
+    rng = np.random.default_rng(seed)
+    centers = rng.normal(size=(members, dim))
+    centers /= np.linalg.norm(centers, axis=1, keepdims=True)
+    member_ids, embeddings = [], []
+    for m in range(members):
+        for _ in range(photos_per_member):
+            member_ids.append(f"member-{m}")
+            embeddings.append(centers[m] + spread * rng.normal(size=dim) / np.sqrt(dim))
+    return np.array(embeddings), member_ids, centers, rng
+
+
+def test_prefilter_recall_against_exhaustive():
+    embeddings, member_ids, centers, rng = clustered_gallery()
+    gallery = build_gallery_matrix(embeddings, member_ids)
+    queries = centers[rng.integers(0, len(centers), size=200)]
+    queries = queries + 0.35 * rng.normal(size=queries.shape) / np.sqrt(queries.shape[1])
+
+    config = PrefilterConfig(top_k=8, min_members=16)
+
+    exact = match_members_batch(gallery, queries)
+    shortlisted = np.array([match_members(gallery, query, config) for query in queries])
+    recall = np.mean(shortlisted.argmin(axis=1) == exact.argmin(axis=1))
+    assert recall >= 0.99
+
+    # Each query scores only its top_k members, exactly; the rest are excluded, not approximated
+    finite = np.isfinite(shortlisted)
+    assert (finite.sum(axis=1) == config.top_k).all()
+    np.testing.assert_allclose(shortlisted[finite], exact[finite], atol=1e-6)
+
+
+def test_prefilter_falls_back_to_exhaustive():
+    embeddings, member_ids, centers, rng = clustered_gallery(members=32)
+    gallery = build_gallery_matrix(embeddings, member_ids)
+    config = PrefilterConfig(top_k=8, min_members=16, fallback_distance=0.7)
+
+    # A query orthogonal to every member's direction is searched exhaustively
+    stranger = rng.normal(size=(1, centers.shape[1]))
+    stranger -= stranger @ np.linalg.pinv(centers) @ centers
+    assert shortlist_members(gallery, stranger / np.linalg.norm(stranger), config) is None
+    assert np.isfinite(match_members_batch(gallery, stranger, config)).all()
+
+    # So is a gallery below min_members
+    small = build_gallery_matrix(embeddings[:30], member_ids[:30])
+    assert shortlist_members(small, centers[:1], config) is None
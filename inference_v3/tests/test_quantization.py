@@ -0,0 +1,59 @@
+import numpy as np
+import pytest
+
+from matching import build_gallery_matrix, match_members_batch, normalize_rows
+from quantization import dequantize, quantize, scores
+
+DIM = 512  # Facenet512
+
+
+@pytest.fixture
+def rows():
+    return normalize_rows(np.random.default_rng(0).normal(size=(200, DIM)))
+
+
+def test_float16_round_trip_error(rows):
+    data, scales = quantize(rows, "float16")
+    assert data.dtype == np.float16 and scales is None
+    error = np.abs(dequantize(data) - rows)
+    # Half precision keeps ~11 bits of mantissa: relative error <= 2**-11
+    assert (error <= np.abs(rows) * 2.0 ** -11 + 1e-7).all()
+
+
+def test_int8_round_trip_error(rows):
+    data, scales = quantize(rows, "int8")
+    assert data.dtype == np.int8 and scales.dtype == np.float32 and scales.shape == (len(rows),)
+    assert np.abs(data).max() <= 127
+    error = np.abs(dequantize(data, scales) - rows)
+    # Rounding to the nearest step is off by at most half a step per element
+    assert (error <= scales[:, None] / 2 + 1e-7).all()
+
+
+def test_zero_rows_survive_int8():
+    data, scales = quantize(np.zeros((2, 4)), "int8")
+    assert not data.any() and (scales == 1.0).all()
+
+
+@pytest.mark.parametrize("scheme, tolerance", [("float32", 1e-6), ("float16", 1e-3), ("int8", 2e-2)])
+def test_scores_close_to_exact(rows, scheme, tolerance):
+    queries = normalize_rows(np.random.default_rng(1).normal(size=(5, DIM)))
+    data, scales = quantize(rows, scheme)
+    np.testing.assert_allclose(scores(queries, data, scales), queries @ rows.T, atol=tolerance)
+
+
+def test_int8_rerank_restores_exact_distances(rows):
+    member_ids = [f"member-{i // 4}" for i in range(len(rows))]
+    exact = build_gallery_matrix(rows, member_ids)
+    quantized = build_gallery_matrix(rows, member_ids, quantization="int8",
+                                     exact_source=rows, source_rows=np.arange(len(rows)))
+    queries = rows[::40] + 0.01 * np.random.default_rng(2).normal(size=(5, DIM))
+
+    expected = match_members_batch(exact, queries)
+    approximate = match_members_batch(quantized, queries)
+    reranked = match_members_batch(quantized, queries, rerank=3)
+    assert not np.allclose(approximate, expected, atol=1e-6)
+    assert (approximate.argmin(axis=1) == expected.argmin(axis=1)).all()
+    # The best members per query get their float32 distance back
+    for q, best in enumerate(expected.argmin(axis=1)):
+        assert abs(reranked[q, best] - expected[q, best]) < 1e-5
+    assert quantized.matrix.nbytes == exact.matrix.nbytes // 4
@@ -0,0 +1,56 @@
+import numpy as np
+
+from result_cache import ResultCache, hamming, perceptual_hash
+
+RESULT = {"match": True, "name": "Ada"}
+
+
+def photo(seed=0, size=120):
+    rng = np.random.default_rng(seed)
+    return rng.integers(0, 256, size=(size, size, 3), dtype=np.uint8)
+
+
+def test_near_identical_images_share_a_hash():
+    image = photo()
+    noisy = np.clip(image.astype(int) + np.random.default_rng(1).integers(-2, 3, image.shape), 0, 255)
+    assert hamming(perceptual_hash(image), perceptual_hash(noisy.astype(np.uint8))) <= 2
+    assert hamming(perceptual_hash(image), perceptual_hash(photo(seed=2))) > 8
+
+
+def test_hit_within_max_distance_only():
+    cache = ResultCache(max_distance=2)
+    cache.put("p1", 0b0000, (1, 1), "single", RESULT)
+    hit = cache.get("p1", 0b0011, (1, 1), "single")
+    assert hit == {**RESULT, "cached": True, "cache_distance": 2}
+    assert cache.get("p1", 0b0111, (1, 1), "single") is None
+    assert cache.get("p1", 0b0000, (1, 1), "multi") is None
+    assert cache.get("p2", 0b0000, (1, 1), "single") is None
+
+
+def test_version_change_invalidates():
+    cache = ResultCache()
+    cache.put("p1", 42, (1, 1), "single", RESULT)
+    # New roster contents, then a newly enrolled photo
+    assert cache.get("p1", 42, (2, 1), "single") is None
+    assert cache.stats()["version_invalidations"] == 1
+    assert cache.get("p1", 42, (1, 1), "single") is None  # dropped, not kept beside the new version
+
+    cache.put("p1", 42, (2, 1), "single", RESULT)
+    assert cache.get("p1", 42, (2, 1), "single") is not None
+    assert cache.get("p1", 42, (2, 2), "single") is None
+    assert cache.stats()["patients"] == 0
+
+
+def test_explicit_invalidate_and_ttl():
+    cache = ResultCache(ttl_seconds=30)
+    cache.put("p1", 1, (1, 1), "single", RESULT)
+    cache.put("p2", 1, (1, 1), "single", RESULT)
+    cache.invalidate("p1")
+    assert cache.get("p1", 1, (1, 1), "single") is None
+    assert cache.get("p2", 1, (1, 1), "single") is not None
+    cache.invalidate()
+    assert cache.stats()["patients"] == 0
+
+    expired = ResultCache(ttl_seconds=-1)
+    expired.put("p1", 1, (1, 1), "single", RESULT)
+    assert expired.get("p1", 1, (1, 1), "single") is None
@@ -0,0 +1,88 @@
+import threading
+import time
+
+import pytest
+
+from roster_cache import RosterCache
+
+
+class SlowFetch:
+    """Roster fetch that blocks until released, counting calls."""
+
+    def __init__(self, rosters=None):
+        self.calls = 0
+        self.release = threading.Event()
+        self.rosters = rosters or {}
+        self._lock = threading.Lock()
+
+    def __call__(self, patient_id):
+        with self._lock:
+            self.calls += 1
+        self.release.wait(5)
+        return self.rosters.get(patient_id, [{"id": f"{patient_id}-member"}])
+
+
+def test_concurrent_misses_fetch_once():
+    fetch = SlowFetch()
+    cache = RosterCache(fetch, ttl_seconds=60)
+    results, callers = [], 16
+    threads = [threading.Thread(target=lambda: results.append(cache.get("p1"))) for _ in range(callers)]
+    for thread in threads:
+        thread.start()
+    # Every caller is parked on the leader's fetch before it returns
+    deadline = time.monotonic() + 5
+    while cache.stats()["coalesced"] < callers - 1 and time.monotonic() < deadline:
+        time.sleep(0.001)
+    fetch.release.set()
+    for thread in threads:
+        thread.join(5)
+
+    assert fetch.calls == 1
+    assert results == [[{"id": "p1-member"}]] * callers
+    stats = cache.stats()
+    assert stats["fetches"] == 1 and stats["coalesced"] == callers - 1
+
+
+def test_ttl_expiry_refetches():
+    fetch = SlowFetch()
+    fetch.release.set()
+    cache = RosterCache(fetch, ttl_seconds=0.05)
+    cache.get("p1")
+    cache.get("p1")
+    assert fetch.calls == 1
+    time.sleep(0.06)
+    cache.get("p1")
+    assert fetch.calls == 2
+    assert cache.stats()["stale"] == 1
+
+
+def test_version_changes_only_with_contents():
+    fetch = SlowFetch({"p1": [{"id": "a"}]})
+    fetch.release.set()
+    cache = RosterCache(fetch, ttl_seconds=0)
+    cache.get("p1")
+    first = cache.version("p1")
+    cache.get("p1")
+    assert cache.version("p1") == first
+    fetch.rosters["p1"] = [{"id": "a"}, {"id": "b"}]
+    cache.get("p1")
+    assert cache.version("p1") == first + 1
+    cache.invalidate("p1")
+    assert cache.version("p1") == first + 2
+
+
+def test_failed_refresh_serves_stale():
+    rosters = iter([[{"id": "a"}]])
+
+    def fetch(patient_id):
+        try:
+            return next(rosters)
+        except StopIteration:
+            raise IOError("Supabase down")
+
+    cache = RosterCache(fetch, ttl_seconds=0)
+    assert cache.get("p1") == [{"id": "a"}]
+    assert cache.get("p1") == [{"id": "a"}]
+    assert cache.stats()["stale_served"] == 1
+    with pytest.raises(IOError):
+        cache.get("p2")
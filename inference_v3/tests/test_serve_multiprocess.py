@@ -0,0 +1,223 @@
+import asyncio
+import json
+import os
+import threading
+import time
+import uuid
+from collections import Counter
+
+import httpx
+import pytest
+
+from roster_cache import InvalidationLog
+from serve_multiprocess import (Supervisor, WorkerState, new_invalidations, pick_worker, probe, route,
+                                unavailable)
+
+
+def make_workers(count, healthy=True):
+    workers = [WorkerState(i) for i in range(count)]
+    for worker in workers:
+        worker.healthy = healthy
+    return workers
+
+
+def test_route_is_stable_and_ignores_whitespace():
+    patient_id = str(uuid.UUID(int=42))
+    assert route(patient_id, 4) == route(patient_id, 4)
+    assert route(f"  {patient_id}\n", 4) == route(patient_id, 4)
+
+
+def test_route_spreads_patients():
+    counts = Counter(route(str(uuid.UUID(int=i)), 4) for i in range(4000))
+    assert set(counts) == {0, 1, 2, 3}
+    assert min(counts.values()) > 800
+
+
+def test_pick_worker_returns_owner_when_healthy():
+    workers = make_workers(4)
+    patient_id = "patient-a"
+    assert pick_worker(workers, patient_id).index == route(patient_id, 4)
+
+
+def test_pick_worker_without_patient_uses_worker_zero():
+    assert pick_worker(make_workers(4), None).index == 0
+
+
+def test_pick_worker_fails_over_to_next_healthy():
+    workers = make_workers(4)
+    patient_id = "patient-a"
+    home = route(patient_id, 4)
+    workers[home].healthy = False
+    workers[(home + 1) % 4].healthy = False
+    assert pick_worker(workers, patient_id).index == (home + 2) % 4
+
+
+def test_pick_worker_skips_tried_workers():
+    workers = make_workers(3)
+    patient_id = "patient-a"
+    home = route(patient_id, 3)
+    tried = {home}
+    second = pick_worker(workers, patient_id, tried)
+    assert second.index == (home + 1) % 3
+    tried.add(second.index)
+    assert pick_worker(workers, patient_id, tried).index == (home + 2) % 3
+    tried.add((home + 2) % 3)
+    assert pick_worker(workers, patient_id, tried) is None
+
+
+@pytest.mark.parametrize("tried, expected", [((), "home"), (("home",), None)])
+def test_pick_worker_with_none_healthy(tried, expected):
+    workers = make_workers(4, healthy=False)
+    home = route("patient-a", 4)
+    picked = pick_worker(workers, "patient-a", {home for _ in tried})
+    assert (picked.index if picked else None) == (home if expected else None)
+
+
+def test_unavailable_reports_overloaded():
+    body = unavailable("no worker")
+    assert body["error_type"] == "overloaded"
+    assert body["match"] is False
+
+
+# --- enrollment invalidations ---
+
+def test_new_invalidations_first_probe_replays_nothing():
+    log = InvalidationLog()
+    log.record("patient-a")
+    assert new_invalidations(log.snapshot(), None) == ([], 1)
+
+
+def test_new_invalidations_returns_entries_after_seen():
+    log = InvalidationLog()
+    for patient_id in ("patient-a", "patient-b", "patient-a", "patient-c"):
+        log.record(patient_id)
+    assert new_invalidations(log.snapshot(), 1) == (["patient-b", "patient-a", "patient-c"], 4)
+    assert new_invalidations(log.snapshot(), 4) == ([], 4)
+
+
+def test_new_invalidations_gap_invalidates_everyone():
+    log = InvalidationLog(keep=2)
+    for patient_id in ("patient-a", "patient-b", "patient-c"):
+        log.record(patient_id)
+    assert new_invalidations(log.snapshot(), 0) == ([None], 3)
+
+
+def test_new_invalidations_after_worker_restart():
+    log = InvalidationLog()
+    log.record("patient-z")
+    assert new_invalidations(log.snapshot(), 7) == (["patient-z"], 1)
+
+
+class FakeWorkers:
+    """httpx MockTransport handler answering like app_optimized's /v1/health and /v1/invalidate."""
+
+    def __init__(self, workers):
+        self.logs = {w.url: InvalidationLog() for w in workers}
+        self.pids = {w.url: 1000 + w.index for w in workers}
+        self.invalidated = []
+        self.down = set()
+
+    def __call__(self, request):
+        base = f"{request.url.scheme}://{request.url.host}:{request.url.port}"
+        if base in self.down:
+            raise httpx.ConnectError("refused", request=request)
+        if request.url.path == "/v1/health":
+            return httpx.Response(200, json={"ready": True, "pid": self.pids[base],
+                                             "invalidations": self.logs[base].snapshot()})
+        if request.url.path == "/v1/invalidate":
+            body = json.loads(request.content)
+            self.invalidated.append((base, None if body.get("all") else body["patientId"]))
+            return httpx.Response(200, json={})
+        return httpx.Response(404)
+
+
+def probe_all(client, workers):
+    async def run():
+        await asyncio.gather(*(probe(client, w, workers) for w in workers))
+    asyncio.run(run())
+
+
+def test_enrollment_on_one_worker_invalidates_every_other_healthy_worker():
+    workers = make_workers(4, healthy=False)
+    fake = FakeWorkers(workers)
+    client = httpx.AsyncClient(transport=httpx.MockTransport(fake))
+    probe_all(client, workers)
+    assert all(w.healthy for w in workers)
+    assert fake.invalidated == []
+
+    fake.down.add(workers[3].url)
+    fake.logs[workers[0].url].record("patient-a")  # worker 0 enrolled a member of patient-a
+    probe_all(client, workers)
+
+    assert not workers[3].healthy
+    assert sorted(fake.invalidated) == [(workers[1].url, "patient-a"), (workers[2].url, "patient-a")]
+
+    fake.invalidated.clear()
+    probe_all(client, workers)
+    assert fake.invalidated == []  # replayed once only
+
+
+def test_gap_in_invalidation_log_invalidates_all_patients():
+    workers = make_workers(2, healthy=False)
+    fake = FakeWorkers(workers)
+    client = httpx.AsyncClient(transport=httpx.MockTransport(fake))
+    probe_all(client, workers)
+
+    fake.logs[workers[0].url] = InvalidationLog(keep=1)
+    for patient_id in ("patient-a", "patient-b", "patient-c"):
+        fake.logs[workers[0].url].record(patient_id)  # only patient-c is still in the log
+    probe_all(client, workers)
+
+    assert fake.invalidated == [(workers[1].url, None)]
+
+
+def test_restarted_worker_invalidations_are_replayed():
+    workers = make_workers(2, healthy=False)
+    fake = FakeWorkers(workers)
+    client = httpx.AsyncClient(transport=httpx.MockTransport(fake))
+    probe_all(client, workers)
+
+    fake.pids[workers[0].url] += 1  # new process, log counting from 1 again
+    fake.logs[workers[0].url] = InvalidationLog()
+    fake.logs[workers[0].url].record("patient-b")
+    probe_all(client, workers)
+
+    assert workers[0].restarts == 1
+    assert fake.invalidated == [(workers[1].url, "patient-b")]
+
+
+# --- supervisor ---
+
+def crash_once(marker):
+    """Child target: exit with an error on the first start, then stay up."""
+    first = not os.path.exists(marker)
+    with open(marker, "a") as f:
+        f.write(f"{os.getpid()}\n")
+    if first:
+        raise RuntimeError("first start fails")
+    time.sleep(30)
+
+
+class OneChildSupervisor(Supervisor):
+    def __init__(self, marker):
+        super().__init__(workers=1)
+        self.marker = marker
+
+    def roles(self, startup_notes):
+        return {"worker:0": (crash_once, (self.marker,))}
+
+
+@pytest.mark.skipif(not hasattr(os, "fork"), reason="needs fork")
+def test_supervisor_restarts_a_crashed_child(tmp_path):
+    marker = str(tmp_path / "starts")
+    supervisor = OneChildSupervisor(marker)
+    stopper = threading.Timer(2.5, supervisor.stop)  # first crash is restarted after 1s
+    stopper.start()
+    try:
+        supervisor.run({})
+    finally:
+        stopper.cancel()
+    starts = open(marker).read().split()
+    assert len(starts) == 2
+    assert supervisor.backoff["worker:0"] == 1.0
+    assert not supervisor.children
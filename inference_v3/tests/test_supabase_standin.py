@@ -0,0 +1,76 @@
+import pytest
+
+from benchmarks.supabase_standin import FaultProfile, SupabaseStandIn
+from http_client import AsyncHTTP
+
+ROSTER_COLUMNS = "id,name,relationship,photoUrls,updatedAt"  # as app_optimized.ROSTER_COLUMNS
+
+
+def fetch_roster(http, base_url, patient_id):
+    """app_optimized.fetch_roster's request, without the app (it needs deepface and gradio)."""
+    params = {"select": ROSTER_COLUMNS, "patientId": f"eq.{patient_id}"}
+    rows = http.get_json(f"{base_url}/rest/v1/FamilyMember", headers={"apikey": "test"}, params=params)
+    if rows is None:
+        raise IOError(f"Roster fetch failed for patient {patient_id}")
+    return rows
+
+
+@pytest.fixture
+def standin():
+    server = SupabaseStandIn(seed=0).start()
+    url = server.add_object("photos", "p1/m1/0.jpg", b"jpeg bytes")
+    server.add_rows("FamilyMember", [
+        {"id": "m1", "patientId": "p1", "name": "Ada", "relationship": "daughter",
+         "photoUrls": [url], "updatedAt": "2026-01-02"},
+        {"id": "m2", "patientId": "p2", "name": "Bo", "relationship": "son",
+         "photoUrls": [], "updatedAt": "2026-01-01"},
+    ])
+    yield server
+    server.stop()
+
+
+@pytest.fixture
+def http():
+    client = AsyncHTTP(timeout=2.0)
+    yield client
+    client.close()
+
+
+def test_fetch_roster_filters_and_selects(standin, http):
+    rows = fetch_roster(http, standin.url, "p1")
+    assert [row["id"] for row in rows] == ["m1"]
+    assert set(rows[0]) == set(ROSTER_COLUMNS.split(","))
+    assert rows[0]["photoUrls"][0].startswith(standin.url)
+    assert fetch_roster(http, standin.url, "nobody") == []
+
+
+def test_etag_revalidation_200_then_304(standin, http):
+    url = fetch_roster(http, standin.url, "p1")[0]["photoUrls"][0]
+    first = http.get(url)
+    assert first.ok and first.content == b"jpeg bytes" and first.etag
+
+    second = http.get(url, etag=first.etag)
+    assert second.status == 304 and second.not_modified and second.content is None
+    assert second.etag == first.etag
+    assert standin.counters["not_modified"] == 1
+
+    stale = http.get(url, etag='"something-else"')
+    assert stale.ok and stale.content == b"jpeg bytes"
+
+
+def test_error_rate_injects_5xx(standin, http):
+    standin.set_faults("rest", FaultProfile(error_rate=1.0, error_statuses=(503,)))
+    with pytest.raises(IOError):
+        fetch_roster(http, standin.url, "p1")
+    assert standin.counters["injected_errors"] == 1
+    assert standin.counters["rest"] == 0
+
+    # Storage has its own profile and is unaffected
+    url = standin.add_object("photos", "p1/m1/1.jpg", b"more")
+    assert http.get(url).ok
+
+    standin.set_faults("rest", FaultProfile(error_rate=0.5))
+    outcomes = [http.get(f"{standin.url}/rest/v1/FamilyMember").status for _ in range(40)]
+    errors = sum(status >= 500 for status in outcomes)
+    assert 5 < errors < 35
+    assert errors + 1 == standin.counters["injected_errors"]
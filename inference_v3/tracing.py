@@ -0,0 +1,381 @@
+"""
+Memora Tracing
+Lightweight request spans for the recognition pipeline.
+
+    with TRACER.trace("recognize_face", patientId=pid):   # root span, sampled here
+        with span("detection"):                           # child (metrics.stage does this)
+            ...
+
+Sampling is decided once per root span. Unsampled requests carry no span at
+all: span() sees no current span and hands back a shared no-op, so the cost
+is one context-variable lookup. Attributes set on the root (patientId) are
+copied onto every finished span of the trace. Finished spans are queued to
+a background exporter, which is either:
+
+    jsonl:<path>                  one JSON object per span
+    otlp:<http://host:4318/v1/traces>  OTLP/HTTP JSON (any OpenTelemetry collector)
+
+For local work without a real collector, run a stand-in that accepts OTLP
+JSON and appends the spans to a JSONL file:
+
+    python tracing.py collector --port 4318 --out spans.jsonl
+"""
+
+import argparse
+import contextvars
+import json
+import os
+import queue
+import random
+import threading
+import time
+from typing import Dict, List, Optional
+
+# Root attributes copied onto every span of a trace
+INHERITED_ATTRIBUTES = ("patientId",)
+
+
+class _NoopSpan:
+    """Returned when the request is not sampled; every call is a no-op."""
+
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+    def set_attribute(self, key, value) -> None:
+        pass
+
+    def set_attributes(self, **attributes) -> None:
+        pass
+
+
+NOOP_SPAN = _NoopSpan()
+_CURRENT: contextvars.ContextVar[Optional["Span"]] = contextvars.ContextVar("memora_span", default=None)
+
+
+class Span:
+    __slots__ = ("tracer", "trace_id", "span_id", "parent_id", "root", "name", "attributes",
+                 "start_ns", "end_ns", "status", "_token")
+
+    def __init__(self, tracer: "Tracer", name: str, parent: Optional["Span"], attributes: Dict):
+        self.tracer = tracer
+        self.name = name
+        self.parent_id = parent.span_id if parent is not None else None
+        self.trace_id = parent.trace_id if parent is not None else f"{random.getrandbits(128):032x}"
+        self.span_id = f"{random.getrandbits(64):016x}"
+        self.root = parent.root if parent is not None else self
+        self.attributes = attributes
+        self.start_ns = time.time_ns()
+        self.end_ns = 0
+        self.status = "ok"
+        self._token = None
+
+    def set_attribute(self, key, value) -> None:
+        self.attributes[key] = value
+
+    def set_attributes(self, **attributes) -> None:
+        self.attributes.update(attributes)
+
+    def __enter__(self):
+        self._token = _CURRENT.set(self)
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        _CURRENT.reset(self._token)
+        if exc_type is not None:
+            self.status = "error"
+            self.attributes.setdefault("error.type", exc_type.__name__)
+        self.finish()
+        return False
+
+    def finish(self, end_ns: Optional[int] = None) -> None:
+        self.end_ns = end_ns or time.time_ns()
+        for key in INHERITED_ATTRIBUTES:
+            if key in self.root.attributes:
+                self.attributes.setdefault(key, self.root.attributes[key])
+        self.tracer.exporter.submit(self)
+
+    def as_dict(self) -> Dict:
+        return {
+            "trace_id": self.trace_id,
+            "span_id": self.span_id,
+            "parent_id": self.parent_id,
+            "name": self.name,
+            "start_unix_nano": self.start_ns,
+            "end_unix_nano": self.end_ns,
+            "duration_ms": round((self.end_ns - self.start_ns) / 1e6, 3),
+            "status": self.status,
+            "attributes": self.attributes,
+        }
+
+
+# --- exporters ---
+
+class BatchExporter:
+    """Drains finished spans on a daemon thread; drops (and counts) spans when the queue is full."""
+
+    def __init__(self, max_queue: int = 10000, batch_size: int = 256, flush_seconds: float = 1.0):
+        self.batch_size = batch_size
+        self.flush_seconds = flush_seconds
+        self.max_queue = max_queue
+        self._queue: "queue.Queue[Span]" = queue.Queue(maxsize=max_queue)
+        self.stats = {"exported": 0, "dropped": 0, "export_errors": 0}
+        self._flushing = threading.Event()
+        self._thread = threading.Thread(target=self._run, name=f"{type(self).__name__}", daemon=True)
+        self._thread.start()
+
+    def submit(self, span: Span) -> None:
+        try:
+            self._queue.put_nowait(span)
+        except queue.Full:
+            self.stats["dropped"] += 1
+
+    def _run(self) -> None:
+        while True:
+            batch = [self._queue.get()]
+            deadline = time.monotonic() + self.flush_seconds
+            while len(batch) < self.batch_size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0 or (self._flushing.is_set() and self._queue.empty()):
+                    break
+                try:
+                    batch.append(self._queue.get(timeout=min(remaining, 0.05)))
+                except queue.Empty:
+                    continue
+            try:
+                self.export([span.as_dict() for span in batch])
+                self.stats["exported"] += len(batch)
+            except Exception as e:
+                self.stats["export_errors"] += 1
+                print(f"⚠️ Span export failed: {e}")
+            for _ in batch:
+                self._queue.task_done()
+
+    def export(self, spans: List[Dict]) -> None:
+        raise NotImplementedError
+
+    def flush(self, timeout: float = 5.0) -> None:
+        """Wait (best effort) until queued spans have been handed to export()."""
+        deadline = time.monotonic() + timeout
+        self._flushing.set()
+        try:
+            while self._queue.unfinished_tasks and time.monotonic() < deadline:
+                time.sleep(0.01)
+        finally:
+            self._flushing.clear()
+
+
+class JsonlExporter(BatchExporter):
+    def __init__(self, path: str, **kwargs):
+        self.path = path
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        super().__init__(**kwargs)
+
+    def export(self, spans: List[Dict]) -> None:
+        with open(self.path, "a") as f:
+            for span in spans:
+                f.write(json.dumps(span, default=str) + "\n")
+
+
+def _otlp_value(value) -> Dict:
+    if isinstance(value, bool):
+        return {"boolValue": value}
+    if isinstance(value, int):
+        return {"intValue": str(value)}
+    if isinstance(value, float):
+        return {"doubleValue": value}
+    return {"stringValue": str(value)}
+
+
+def to_otlp(spans: List[Dict], service_name: str) -> Dict:
+    """OTLP/JSON ExportTraceServiceRequest for a batch of span dicts."""
+    return {"resourceSpans": [{
+        "resource": {"attributes": [{"key": "service.name", "value": {"stringValue": service_name}}]},
+        "scopeSpans": [{
+            "scope": {"name": "memora.inference"},
+            "spans": [{
+                "traceId": span["trace_id"],
+                "spanId": span["span_id"],
+                **({"parentSpanId": span["parent_id"]} if span["parent_id"] else {}),
+                "name": span["name"],
+                "kind": 1,
+                "startTimeUnixNano": str(span["start_unix_nano"]),
+                "endTimeUnixNano": str(span["end_unix_nano"]),
+                "attributes": [{"key": k, "value": _otlp_value(v)} for k, v in span["attributes"].items()],
+                "status": {"code": 2 if span["status"] == "error" else 1},
+            } for span in spans],
+        }],
+    }]}
+
+
+def from_otlp(payload: Dict) -> List[Dict]:
+    """Flatten an OTLP/JSON request back into span dicts (used by the stand-in collector)."""
+    spans = []
+    for resource_spans in payload.get("resourceSpans", []):
+        for scope_spans in resource_spans.get("scopeSpans", []):
+            for span in scope_spans.get("spans", []):
+                attributes = {a["key"]: next(iter(a["value"].values())) for a in span.get("attributes", [])}
+                start, end = int(span["startTimeUnixNano"]), int(span["endTimeUnixNano"])
+                spans.append({
+                    "trace_id": span["traceId"],
+                    "span_id": span["spanId"],
+                    "parent_id": span.get("parentSpanId"),
+                    "name": span["name"],
+                    "start_unix_nano": start,
+                    "end_unix_nano": end,
+                    "duration_ms": round((end - start) / 1e6, 3),
+                    "status": "error" if span.get("status", {}).get("code") == 2 else "ok",
+                    "attributes": attributes,
+                })
+    return spans
+
+
+class OtlpHttpExporter(BatchExporter):
+    def __init__(self, endpoint: str, service_name: str = "memora-inference", timeout: float = 5.0, **kwargs):
+        self.endpoint = endpoint
+        self.service_name = service_name
+        self.timeout = timeout
+        super().__init__(**kwargs)
+
+    def export(self, spans: List[Dict]) -> None:
+        import urllib.request
+
+        body = json.dumps(to_otlp(spans, self.service_name)).encode()
+        request = urllib.request.Request(self.endpoint, data=body, method="POST",
+                                         headers={"Content-Type": "application/json"})
+        with urllib.request.urlopen(request, timeout=self.timeout) as resp:
+            resp.read()
+
+
+class NullExporter:
+    """Used when tracing is off."""
+
+    stats = {"exported": 0, "dropped": 0, "export_errors": 0}
+
+    def submit(self, span: Span) -> None:
+        pass
+
+    def flush(self, timeout: float = 0.0) -> None:
+        pass
+
+
+def create_exporter(target: str):
+    """"jsonl:<path>", "otlp:<url>" or "" (no export)."""
+    if not target:
+        return NullExporter()
+    kind, _, location = target.partition(":")
+    if kind == "jsonl":
+        return JsonlExporter(location)
+    if kind == "otlp":
+        return OtlpHttpExporter(location)
+    raise ValueError(f"Unknown trace exporter {target!r} (expected jsonl:<path> or otlp:<url>)")
+
+
+# --- tracer ---
+
+class Tracer:
+    def __init__(self, sample_rate: float = 0.0, exporter=None):
+        self.sample_rate = sample_rate
+        self.exporter = exporter or NullExporter()
+        self._sampled = 0
+        self._unsampled = 0
+
+    def trace(self, name: str, **attributes):
+        """Root span (sampled here), or a child when a trace is already active."""
+        parent = _CURRENT.get()
+        if parent is not None:
+            return Span(self, name, parent, attributes)
+        if self.sample_rate <= 0 or (self.sample_rate < 1 and random.random() >= self.sample_rate):
+            self._unsampled += 1
+            return NOOP_SPAN
+        self._sampled += 1
+        return Span(self, name, None, attributes)
+
+    def stats(self) -> Dict:
+        return {"sample_rate": self.sample_rate, "sampled": self._sampled,
+                "unsampled": self._unsampled, **self.exporter.stats}
+
+
+TRACER = Tracer()
+
+
+def configure(sample_rate: float, export_target: str) -> Tracer:
+    """Set up the process-wide tracer used by span() and metrics.stage()."""
+    TRACER.sample_rate = sample_rate
+    TRACER.exporter = create_exporter(export_target) if sample_rate > 0 else NullExporter()
+    return TRACER
+
+
+def current_span():
+    return _CURRENT.get() or NOOP_SPAN
+
+
+def span(name: str, **attributes):
+    """Child of the current span; no-op when the request is not being traced."""
+    parent = _CURRENT.get()
+    if parent is None:
+        return NOOP_SPAN
+    return Span(parent.tracer, name, parent, attributes)
+
+
+def record_span(name: str, duration_s: float, end_ns: Optional[int] = None, **attributes) -> None:
+    """Add a finished child span measured elsewhere (e.g. a download inside the event loop)."""
+    parent = _CURRENT.get()
+    if parent is None:
+        return
+    end_ns = end_ns or time.time_ns()
+    child = Span(parent.tracer, name, parent, attributes)
+    child.start_ns = end_ns - int(duration_s * 1e9)
+    child.finish(end_ns)
+
+
+# --- stand-in collector ---
+
+def serve_collector(port: int, out_path: str) -> None:
+    """Minimal OTLP/HTTP JSON receiver that appends spans to a JSONL file."""
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+    lock = threading.Lock()
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_POST(self):
+            if self.path.rstrip("/") != "/v1/traces":
+                self.send_error(404)
+                return
+            try:
+                payload = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))))
+                spans = from_otlp(payload)
+            except ValueError:
+                self.send_error(400)
+                return
+            with lock, open(out_path, "a") as f:
+                for item in spans:
+                    f.write(json.dumps(item) + "\n")
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.end_headers()
+            self.wfile.write(b"{}")
+
+        def log_message(self, fmt, *args):
+            pass
+
+    print(f"OTLP stand-in collector on :{port}/v1/traces -> {out_path}")
+    ThreadingHTTPServer(("0.0.0.0", port), Handler).serve_forever()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Tracing utilities")
+    sub = parser.add_subparsers(dest="command", required=True)
+    collector = sub.add_parser("collector", help="Run a local OTLP/HTTP JSON stand-in collector")
+    collector.add_argument("--port", type=int, default=4318)
+    collector.add_argument("--out", default="spans.jsonl")
+    args = parser.parse_args()
+    serve_collector(args.port, args.out)
+
+
+if __name__ == "__main__":
+    main()
@@ -9,6 +9,7 @@ export type RecognitionErrorType =
     | 'processing_error'  // Failed to process family photos
     | 'unknown_person'    // Face detected but doesn't match anyone
     | 'detection_error'   // General detection failure
+    | 'overloaded'        // Server busy, retry shortly
     | null;               // No error (successful match)
 
 export interface RecognitionResult {
@@ -49,6 +50,8 @@ export function getErrorMessage(result: RecognitionResult): string {
             return result.message || 'Face not recognized as a family member.';
         case 'detection_error':
             return result.error || 'Face detection failed. Please try again.';
+        case 'overloaded':
+            return result.suggestion || 'The server is busy. Please try again in a few seconds.';
         default:
             return result.error || 'Recognition failed.';
     }
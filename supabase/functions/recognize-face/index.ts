@@ -30,13 +30,7 @@ serve(async (req) => {
         // We need the root URL for the client
         const spaceUrl = HF_SPACE_URL.split('/call/')[0].split('/api/')[0].split('/run/')[0];
 
-        console.log(`Connecting to Space: ${spaceUrl} for patient ${patientId}`)
-
-        // 2. Connect to Gradio Client
-        // The client will automatically find the correct endpoint info
-        const app = await client(spaceUrl);
-
-        // Convert base64 to Blob for Gradio Client to handle upload
+        // Convert base64 to raw JPEG bytes
         // Remove header if present
         const base64Data = image.replace(/^data:image\/\w+;base64,/, "");
         const binaryString = atob(base64Data);
@@ -44,9 +38,42 @@ serve(async (req) => {
         for (let i = 0; i < binaryString.length; i++) {
             bytes[i] = binaryString.charCodeAt(i);
         }
+
+        // 2. Fast path: plain HTTP endpoint (no Gradio queue or client handshake)
+        const fastUrl = `${spaceUrl.replace(/\/$/, '')}/v1/recognize?patientId=${encodeURIComponent(patientId)}`;
+        let fastResponse: Response | null = null;
+        try {
+            fastResponse = await fetch(fastUrl, {
+                method: 'POST',
+                headers: { 'Content-Type': 'image/jpeg' },
+                body: bytes,
+            });
+        } catch (error) {
+            console.log(`Fast path connection failed (${error.message})`)
+        }
+
+        // Answered by the fast path: pass it through. A 503 means the backend is
+        // shedding load ("overloaded"); retrying through Gradio would only add to it.
+        const status = fastResponse ? fastResponse.status : 0;
+        const fallBack = !fastResponse || status === 404 || (status >= 500 && status !== 503);
+        if (fastResponse && !fallBack) {
+            const data = await fastResponse.json().catch(() => ({ error: `Recognition failed (${status})`, match: false }));
+            const headers: Record<string, string> = { ...corsHeaders, 'Content-Type': 'application/json' };
+            const retryAfter = fastResponse.headers.get('retry-after');
+            if (retryAfter) headers['Retry-After'] = retryAfter;
+            return new Response(JSON.stringify(data), { headers, status })
+        }
+
+        // Older Spaces without /v1/recognize (404), other 5xx, or no connection: fall back to the Gradio client
+        console.log(`Fast path unavailable (${status || 'no connection'}), connecting to Space: ${spaceUrl} for patient ${patientId}`)
+
+        // 3. Connect to Gradio Client
+        // The client will automatically find the correct endpoint info
+        const app = await client(spaceUrl);
+
         const blob = new Blob([bytes], { type: "image/jpeg" });
 
-        // 3. Make Prediction
+        // 4. Make Prediction
         // api_name is "predict" as set in app.py blocks
         const result = await app.predict("/predict", [
             blob,